@@ -1,8 +1,16 @@
+import contextlib
 import os
-import pkgutil
 import importlib
 import sys
-from app.commands import CommandHandler, Command
+import time
+from app.commands import CommandHandler, Command, LazyCommand
+from app.log_pipeline import CalculationSampler, start_queue_logging, stop_queue_logging
+from app.plugin_manifest import load_manifest
+from app.profiling import Profiler
+from app.session import SessionHistory
+from app.stats import Stats, instrument_handler, instrument_history
+from app.plugins.history_backends import convert_history
+from app.plugins.history_facade import HistoryFacade
 from dotenv import load_dotenv
 import logging
 import logging.config
@@ -16,7 +24,15 @@ class App:
         load_dotenv()
         self.settings = self.load_environment_variables()
         self.settings.setdefault('ENVIRONMENT', 'DEVELOPMENT')
+        self.log_listener = self.configure_log_pipeline()
         self.command_handler = CommandHandler()
+        self.history = self.create_history()
+        self.session = SessionHistory(int(self.settings.get('CALC_SESSION_SIZE', 100)))
+        self.command_handler.session = self.session
+        self.stats = self.create_stats()
+        self.profiler = Profiler(self.command_handler, self.settings['CALC_PROFILE_DIR'])
+        if self.setting_enabled('CALC_PROFILE'):
+            self.profiler.start()
     
     def configure_logging(self):
         """Configure logging using logging.conf if available; otherwise use basicConfig."""
@@ -27,37 +43,122 @@ class App:
             logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         logging.info("Logging configured.")
 
+    def configure_log_pipeline(self):
+        """Apply CALC_LOG_SAMPLE_RATE and, with CALC_LOG_QUEUE, start queue logging; return the listener or None."""
+        rate = float(self.settings.get('CALC_LOG_SAMPLE_RATE', 1))
+        if rate < 1:
+            logging.getLogger().addFilter(CalculationSampler(rate))
+        if not self.setting_enabled('CALC_LOG_QUEUE'):
+            return None
+        return start_queue_logging(batch_size=int(self.settings.get('CALC_LOG_BATCH_SIZE', 256)))
+
+    def stop_log_pipeline(self):
+        """Write out any queued log records; logging is synchronous again afterwards."""
+        if self.log_listener is not None:
+            stop_queue_logging(self.log_listener)
+            self.log_listener = None
+
     def load_environment_variables(self):
         """Load environment variables and log the action."""
         settings = {key: value for key, value in os.environ.items()}
+        settings.setdefault('CALC_HISTORY_BACKEND', 'csv')
+        settings.setdefault('CALC_PROFILE', 'false')
+        settings.setdefault('CALC_PROFILE_DIR', os.path.join('logs', 'profiles'))
         logging.info("Environment variables loaded.")
         return settings
 
+    def create_history(self):
+        """Create the application-wide history facade from the settings."""
+        return HistoryFacade(
+            self.settings.get('CALC_HISTORY_FILE', 'calc_history.csv'),
+            batch_size=int(self.settings.get('CALC_HISTORY_BATCH_SIZE', 50)),
+            flush_interval=float(self.settings.get('CALC_HISTORY_FLUSH_INTERVAL', 5)),
+            backend=self.settings.get('CALC_HISTORY_BACKEND'),
+            backend_options={
+                'max_rows': int(self.settings.get('CALC_HISTORY_SEGMENT_ROWS', 100000)),
+                'max_bytes': int(self.settings.get('CALC_HISTORY_SEGMENT_BYTES', 16 * 1024 * 1024)),
+            },
+            memory_budget=int(self.settings.get('CALC_HISTORY_MEMORY_BUDGET', 64 * 1024 * 1024)),
+        )
+
+    def create_stats(self):
+        """Instrument commands and history I/O when CALC_STATS is set; return the Stats or None."""
+        if not self.setting_enabled('CALC_STATS'):
+            return None
+        stats = Stats()
+        instrument_handler(self.command_handler, stats)
+        instrument_history(self.history, stats)
+        return stats
+
+    def close(self):
+        """Flush history and write the collected stats, if any, to CALC_STATS_FILE."""
+        self.history.close()
+        if self.stats is not None:
+            stats_file = self.settings.get('CALC_STATS_FILE', 'logs/stats.json')
+            self.stats.dump(stats_file)
+            logging.info("Stats written to %s.", stats_file)
+
+    def setting_enabled(self, name):
+        """Return True if a boolean setting is set to 1/true/yes/on."""
+        return self.settings.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
     def get_environment_variable(self, env_var: str = 'ENVIRONMENT'):
         """Return a specific environment variable."""
         return self.settings.get(env_var, None)
 
     def load_plugins(self):
-        """Dynamically load all plugins from the app.plugins package."""
+        """Register all plugins from the app.plugins package.
+
+        Plugins listed in the cached manifest are registered lazily and only
+        imported on first use; any plugin the manifest cannot describe is
+        imported straight away. Plugin loading is profiled in profiling mode.
+        """
+        if self.profiler.active:
+            return self.profiler.run('load_plugins', self._load_plugins)
+        return self._load_plugins()
+
+    def _load_plugins(self):
+        """Read the plugin manifest and register every plugin's commands."""
         plugins_package = 'app.plugins'
         plugins_path = plugins_package.replace('.', '/')
         if not os.path.exists(plugins_path):
             logging.warning(f"Plugins directory '{plugins_path}' not found.")
             return
-        for _, plugin_name, is_pkg in pkgutil.iter_modules([plugins_path]):
-            if is_pkg:
-                try:
-                    plugin_module = importlib.import_module(f'{plugins_package}.{plugin_name}')
-                    self.register_plugin_commands(plugin_module, plugin_name)
-                except ImportError as e:
-                    logging.error(f"Error importing plugin {plugin_name}: {e}")
+        manifest_path = self.settings.get('PLUGIN_MANIFEST_FILE', '.plugin_manifest.json')
+        manifest = load_manifest(manifest_path, plugins_path, plugins_package)
+        for plugin_name, entry in manifest['plugins'].items():
+            if entry['classes']:
+                self.register_lazy_plugin_commands(entry, plugin_name)
+                continue
+            try:
+                plugin_module = importlib.import_module(entry['module'])
+                self.register_plugin_commands(plugin_module, plugin_name)
+            except ImportError as e:
+                logging.error(f"Error importing plugin {plugin_name}: {e}")
+
+    def register_lazy_plugin_commands(self, entry, plugin_name):
+        """Register placeholders for the manifest's commands without importing the plugin."""
+        for class_name in entry['classes']:
+            command = LazyCommand(entry['module'], class_name, setup=self.setup_command)
+            self.command_handler.register_command(plugin_name, command)
+            logging.info("Command '%s' from plugin '%s' registered.", plugin_name, plugin_name)
+
+    def setup_command(self, command):
+        """Hand the application's shared services to a newly created command."""
+        command.history = self.history
+        command.stats = self.stats
+        command.profiler = self.profiler
+        command.session = self.session
+        command.configure(self.settings)
 
     def register_plugin_commands(self, plugin_module, plugin_name):
         """Register all Command subclasses found in a plugin module."""
         for item_name in dir(plugin_module):
             item = getattr(plugin_module, item_name)
             if isinstance(item, type) and issubclass(item, Command) and item is not Command:
-                self.command_handler.register_command(plugin_name, item())
+                command = item()
+                self.setup_command(command)
+                self.command_handler.register_command(plugin_name, command)
                 logging.info(f"Command '{plugin_name}' from plugin '{plugin_name}' registered.")
     
     def start(self):
@@ -79,7 +180,79 @@ class App:
             logging.info("Application interrupted and exiting gracefully.")
             sys.exit(0)
         finally:
+            self.close()
+            logging.info("Application shutdown.")
+            self.stop_log_pipeline()
+
+    def run_batch(self, source='-', output=None):
+        """Run commands from a file (or stdin for '-') without prompting.
+
+        Results and errors are written to ``output`` (stdout by default).
+        With CALC_WORKERS above 1 the lines are evaluated in a process pool,
+        CALC_CHUNK_SIZE lines per task. Returns the number of lines that failed.
+        """
+        # Imported here so starting the REPL does not pay for them.
+        from app.batch import run_batch, run_parallel
+        self.load_plugins()
+        output = output or sys.stdout
+        workers = int(self.settings.get('CALC_WORKERS', 1))
+        chunk_size = int(self.settings.get('CALC_CHUNK_SIZE', 10000))
+        logging.info("Batch mode started from %s.", source)
+        try:
+            with (open(source, encoding='utf-8') if source != '-' else contextlib.nullcontext(sys.stdin)) as lines:
+                if workers > 1:
+                    _, errors = run_parallel(lines, self.command_handler, self.history, output, workers, chunk_size)
+                else:
+                    _, errors = run_batch(lines, self.command_handler, self.history, output)
+        finally:
+            self.close()
+            self.stop_log_pipeline()
+        return errors
+
+    def convert_history(self, source, target):
+        """Copy the history at ``source`` into ``target`` (replacing it); return the exit status."""
+        start = time.perf_counter()
+        try:
+            rows = convert_history(source, target)
+        except (OSError, ValueError) as e:
+            logging.error("History conversion from %s to %s failed: %s", source, target, e)
+            print(f"Conversion failed: {e}")
+            return 1
+        finally:
+            self.close()
+            self.stop_log_pipeline()
+        elapsed = time.perf_counter() - start
+        logging.info("Converted %s history rows from %s to %s.", rows, source, target)
+        print(f"Converted {rows} rows from {source} to {target} in {elapsed:.2f} s "
+              f"({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+        return 0
+
+    def serve(self, address=None):
+        """Serve the registered commands to socket clients until interrupted.
+
+        ``address`` is ``HOST:PORT`` or ``unix:PATH``; it defaults to the
+        CALC_SERVER_ADDRESS setting.
+        """
+        # asyncio is slow to import, so only the server pays for it.
+        import asyncio
+        from app.server import CalculatorServer, DEFAULT_ADDRESS
+        self.load_plugins()
+        address = address or self.settings.get('CALC_SERVER_ADDRESS', DEFAULT_ADDRESS)
+        server = CalculatorServer(
+            self.command_handler,
+            self.history,
+            batch_size=int(self.settings.get('CALC_HISTORY_BATCH_SIZE', 50)),
+            flush_interval=float(self.settings.get('CALC_SERVER_FLUSH_INTERVAL', 0.05)),
+            session_size=int(self.settings.get('CALC_SESSION_SIZE', 100)),
+        )
+        try:
+            asyncio.run(server.serve_forever(address))
+        except KeyboardInterrupt:
+            logging.info("Server interrupted and exiting gracefully.")
+        finally:
+            self.close()
             logging.info("Application shutdown.")
+            self.stop_log_pipeline()
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,279 @@
+"""Non-interactive batch mode.
+
+A command file (or stdin) is streamed line by line through a generator
+pipeline: lines are parsed into calls, calculations are evaluated through the
+registered plugin commands, and each outcome is written to an output stream.
+Only one line is held in memory at a time and history rows go through the
+shared HistoryFacade, which writes them in batches.
+
+Lines use the REPL's syntax, e.g. ``division 10 4`` or
+``addition 3 4; division _ 2``: they are split with
+``CommandHandler.parse_line`` and operands are converted with each command's
+argument spec, so ``_``, ``last`` and ``!N`` work as they do interactively.
+Blank lines and lines starting with ``#`` are skipped.
+
+``run_parallel`` evaluates chunks of calculations in a process pool instead,
+and merges outputs and history rows back in input order.
+"""
+import contextlib
+import io
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from app.commands import CommandHandler, LazyCommand
+from app.session import RECALL
+
+
+class BatchError(Exception):
+    """A batch line that could not be evaluated."""
+
+
+def parse_lines(lines):
+    """Yield (line_number, steps) for every command line, with steps as ``CommandHandler.parse_line`` splits them."""
+    for line_number, line in enumerate(lines, start=1):
+        text = line.strip()
+        if not text or text.startswith('#'):
+            continue
+        yield line_number, CommandHandler.parse_line(text)
+
+
+def until_exit(calls):
+    """Pass calls through until an ``exit`` step, keeping the steps before it on its line."""
+    for line_number, steps in calls:
+        names = [command_name for command_name, _ in steps]
+        if 'exit' in names:
+            steps = steps[:names.index('exit')]
+            if steps:
+                yield line_number, steps
+            return
+        yield line_number, steps
+
+
+def evaluate(calls, command_handler, history):
+    """Run each parsed call and yield (line_number, output_text, error).
+
+    Calculations go straight to the command's ``calculate`` method and their
+    history rows are queued on ``history``. Other commands run through the
+    command handler with their printed output captured.
+    """
+    for line_number, steps in calls:
+        yield line_number, *_run(steps, command_handler, history.append_operations)
+
+
+def _run(steps, command_handler, record):
+    """Evaluate the steps of one line, passing each calculation's history row to ``record`` in a list.
+
+    Returns (text to write, error message or None). As in
+    ``CommandHandler.execute_command``, the line stops at the first step
+    that fails.
+    """
+    texts = []
+    try:
+        for command_name, tokens in steps:
+            command = _get_command(command_handler, command_name)
+            if not hasattr(command, 'calculate'):
+                text, completed = _run_captured(command_handler, command_name, tokens)
+                texts.append(text)
+                if not completed:
+                    break
+                continue
+            text, row = _calculate(command_handler, command, command_name, tokens)
+            record([row])
+            texts.append(text)
+    except BatchError as e:
+        return _join(texts), str(e)
+    return _join(texts), None
+
+
+def _join(texts):
+    return '\n'.join(text for text in texts if text)
+
+
+def _get_command(command_handler, command_name):
+    """Look up a command, turning an unknown name into a BatchError."""
+    try:
+        return command_handler.get_command(command_name)
+    except KeyError:
+        raise BatchError(f"No such command: {command_name}") from None
+
+
+def _run_captured(command_handler, command_name, tokens):
+    """Run a non-calculation step through the handler; return (what it printed, whether it completed)."""
+    with contextlib.redirect_stdout(io.StringIO()) as captured:
+        completed = command_handler.execute_step(command_name, tokens)
+    return captured.getvalue().strip('\n'), completed
+
+
+def _calculate(command_handler, command, command_name, tokens):
+    """Evaluate a calculation step and return (text, history row).
+
+    The result becomes the handler's ``_`` and is recorded in its session.
+    """
+    try:
+        args = command_handler.bind_arguments(command_name, command, tokens)
+    except ValueError as e:
+        raise BatchError(str(e)) from None
+    if len(args) != 2:
+        raise BatchError(f"{command_name} expects 2 operands, got {len(args)}")
+    a, b = args
+    try:
+        result = command.calculate(a, b)
+    except ZeroDivisionError:
+        raise BatchError("Division by zero is not allowed.") from None
+    command_handler.last_result = result
+    if command_handler.session is not None:
+        command_handler.session.record(command.operation, a, b, result)
+    return str(result), (command.operation, a, b, result)
+
+
+def _write_outcome(output, line_number, text, error):
+    """Write one line's output and error, if any; return 1 for an error, else 0."""
+    if text:
+        output.write(text + '\n')
+    if error is not None:
+        output.write(f"Error (line {line_number}): {error}\n")
+        return 1
+    return 0
+
+
+def run_batch(lines, command_handler, history, output):
+    """Stream ``lines`` through the registered commands, writing outcomes to ``output``.
+
+    Returns a (commands, errors) tuple. An ``exit`` line stops the batch.
+    """
+    commands = errors = 0
+    calls = until_exit(parse_lines(lines))
+    for line_number, text, error in evaluate(calls, command_handler, history):
+        commands += 1
+        errors += _write_outcome(output, line_number, text, error)
+    history.flush()
+    logging.info("Batch finished: %s commands, %s errors.", commands, errors)
+    return commands, errors
+
+
+def chunked(calls, chunk_size):
+    """Group calls into lists of at most ``chunk_size``."""
+    chunk = []
+    for call in calls:
+        chunk.append(call)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Command handler of a pool worker process; _init_worker registers the commands.
+_worker_handler = CommandHandler()
+
+
+def _init_worker(command_classes):
+    """Register the parent's commands in a pool worker, without building an App.
+
+    ``command_classes`` maps command names to (module, class name). Workers
+    only call ``calculate``, so the commands get no history, stats or
+    session, and each module is imported on first use.
+    """
+    for command_name, (module_name, class_name) in command_classes.items():
+        _worker_handler.register_command(command_name, LazyCommand(module_name, class_name))
+
+
+def _command_classes(command_handler):
+    """Return {command name: (module, class name)} for every command of ``command_handler``."""
+    classes = {}
+    for command_name, command in command_handler.commands.items():
+        if isinstance(command, LazyCommand):
+            classes[command_name] = (command.module_name, command.class_name)
+        else:
+            classes[command_name] = (type(command).__module__, type(command).__name__)
+    return classes
+
+
+def evaluate_chunk(chunk):
+    """Evaluate a chunk of calls in a worker and return one outcome per call.
+
+    Outcomes are ('ok', line_number, text, error, rows) or ('defer',
+    line_number, steps). Lines with a command other than a calculation, or
+    that recall the result of an earlier line, are deferred to the parent
+    process, which runs them in input order.
+    """
+    outcomes = []
+    for line_number, steps in chunk:
+        if _needs_parent(_worker_handler, steps):
+            outcomes.append(('defer', line_number, steps))
+            continue
+        # Each line starts afresh; ``_`` only refers to earlier steps of it.
+        _worker_handler.last_result = None
+        rows = []
+        text, error = _run(steps, _worker_handler, rows.extend)
+        outcomes.append(('ok', line_number, text, error, rows))
+    return outcomes
+
+
+def _needs_parent(command_handler, steps):
+    """Return True if a line runs a command other than a calculation or recalls an earlier line's result."""
+    for position, (command_name, tokens) in enumerate(steps):
+        try:
+            command = command_handler.get_command(command_name)
+        except KeyError:
+            # Reported by the worker when the line reaches it.
+            return False
+        if not hasattr(command, 'calculate'):
+            return True
+        if (position == 0 and '_' in tokens) or any(token == 'last' or RECALL.fullmatch(token) for token in tokens):
+            return True
+    return False
+
+
+def _follow(command_handler, rows):
+    """Bring the handler's ``_`` and session up to date with calculations a worker made."""
+    for row in rows:
+        if command_handler.session is not None:
+            command_handler.session.record(*row)
+    if rows:
+        command_handler.last_result = rows[-1][3]
+
+
+def _ordered_results(executor, function, items, window):
+    """Submit items to ``executor`` and yield results in submission order.
+
+    At most ``window`` items are in flight, so the input is never read far
+    ahead of the output.
+    """
+    in_flight = deque()
+    for item in items:
+        in_flight.append(executor.submit(function, item))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def run_parallel(lines, command_handler, history, output, workers, chunk_size):
+    """Like ``run_batch``, but evaluate chunks of ``chunk_size`` calls on ``workers`` processes.
+
+    Outputs are written and history rows appended in the original input
+    order, one bulk append per chunk.
+    """
+    commands = errors = 0
+    chunks = chunked(until_exit(parse_lines(lines)), chunk_size)
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(_command_classes(command_handler),)) as executor:
+        for outcomes in _ordered_results(executor, evaluate_chunk, chunks, workers * 2):
+            rows = []
+            for kind, line_number, *details in outcomes:
+                commands += 1
+                if kind == 'ok':
+                    text, error, line_rows = details
+                    rows.extend(line_rows)
+                    _follow(command_handler, line_rows)
+                else:
+                    # Earlier rows must be visible to the deferred line.
+                    history.append_operations(rows)
+                    rows = []
+                    text, error = _run(details[0], command_handler, history.append_operations)
+                errors += _write_outcome(output, line_number, text, error)
+            history.append_operations(rows)
+    history.flush()
+    logging.info("Parallel batch finished: %s commands, %s errors, %s workers.", commands, errors, workers)
+    return commands, errors
@@ -1,23 +1,209 @@
+import importlib
+import logging
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Callable, NamedTuple
+from app.session import current_session
+
+class Argument(NamedTuple):
+    """An optional inline argument: its name and the type its token is converted to.
+
+    A ``variadic`` argument must come last and takes every remaining token.
+    """
+    name: str
+    type: Callable = str
+    variadic: bool = False
+
+# Returned by ``Command.execute`` when the command failed, so that the rest
+# of a ';' chain does not run.
+FAILED = object()
 
 class Command(ABC):
+    # Shared HistoryFacade handed out by App when the command is registered.
+    history = None
+    # Shared Stats when CALC_STATS is enabled, otherwise None.
+    stats = None
+    # The App's Profiler, used by the profile command.
+    profiler = None
+    # The App's SessionHistory of recent calculations, or None; see the
+    # ``session`` property.
+    _session = None
+    # Inline arguments accepted after the command name, in order. Omitted
+    # arguments are not passed, so the command falls back to its defaults
+    # or prompts for them.
+    arguments = ()
+
+    @property
+    def session(self):
+        """The SessionHistory of the line being run, or else the one the command was set up with."""
+        session = current_session.get()
+        return self._session if session is None else session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
     @abstractmethod
     def execute(self):
-        """Execute the command."""
-        pass
+        """Execute the command.
+
+        Return ``FAILED`` if it could not run; any other value but None
+        becomes the handler's ``_``.
+        """
+
+    def configure(self, settings):
+        """Apply the App's settings; called once when the command is set up. Most commands need none."""
+
+    # Commands on a pair of operands may also define ``execute_batch(a, b)``
+    # to apply themselves element-wise to NumPy arrays; check with getattr.
+
+
+class LineState:
+    """The ``_`` result and the session that a sequence of lines shares."""
+    __slots__ = ('last_result', 'session')
+
+    def __init__(self, last_result=None, session=None):
+        self.last_result = last_result
+        self.session = session
+
+# The LineState of the lines being run in this context, e.g. by one server
+# client in a worker thread. Without one, CommandHandler uses its own.
+current_state = ContextVar('current_state', default=None)
+
+class LazyCommand(Command):
+    """Stand-in for a plugin command whose module is imported on first use."""
+    def __init__(self, module_name: str, class_name: str, setup=None):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.setup = setup
+
+    def load(self) -> Command:
+        """Import the plugin module and build the real command."""
+        module = importlib.import_module(self.module_name)
+        command = getattr(module, self.class_name)()
+        if self.setup is not None:
+            self.setup(command)
+        return command
+
+    def execute(self, *args):
+        return self.load().execute(*args)
 
 class CommandHandler:
-    """Registers and executes commands by name."""
+    """Registers and executes commands by name.
+
+    A line may chain several commands with ``;``. Each command's inline
+    arguments are converted using its argument spec, and a ``_`` argument
+    stands for the result of the previous command. With a ``session``,
+    ``last`` and ``!N`` arguments stand for the newest and the Nth newest
+    calculation result of the session.
+
+    ``last_result`` and ``session`` belong to the ``current_state`` LineState
+    when one is set, so several clients can share one handler.
+    """
     def __init__(self):
         self.commands = {}
+        self._state = LineState()
+
+    @property
+    def state(self) -> LineState:
+        """The LineState of the lines being run in this context."""
+        return current_state.get() or self._state
+
+    @property
+    def last_result(self):
+        return self.state.last_result
+
+    @last_result.setter
+    def last_result(self, value):
+        self.state.last_result = value
+
+    @property
+    def session(self):
+        return self.state.session
+
+    @session.setter
+    def session(self, session):
+        self.state.session = session
 
     def register_command(self, command_name: str, command: Command):
         """Register a command under the given name."""
         self.commands[command_name] = command
 
-    def execute_command(self, command_name: str):
-        """Attempt to execute a registered command using EAFP."""
+    def get_command(self, command_name: str) -> Command:
+        """Return a registered command, loading it first if it is still lazy."""
+        command = self.commands[command_name]
+        if isinstance(command, LazyCommand):
+            command = command.load()
+            self.commands[command_name] = command
+        return command
+
+    @staticmethod
+    def parse_line(command_line: str):
+        """Split a line into (command_name, tokens) pairs, one per ``;``-separated step."""
+        steps = []
+        for segment in command_line.split(';'):
+            command_name, *tokens = segment.split() or [""]
+            steps.append((command_name, tokens))
+        return steps
+
+    def execute_command(self, command_line: str):
+        """Attempt to execute each command on the line using EAFP, stopping at the first failure."""
+        token = current_session.set(self.session)
+        try:
+            for command_name, tokens in self.parse_line(command_line):
+                if not self.execute_step(command_name, tokens):
+                    return
+        finally:
+            current_session.reset(token)
+
+    def execute_step(self, command_name: str, tokens) -> bool:
+        """Run one command with its inline tokens; return False if it could not run."""
         try:
-            self.commands[command_name].execute()
+            command = self.get_command(command_name)
         except KeyError:
             print(f"No such command: {command_name}")
+            return False
+        except (ImportError, AttributeError) as e:
+            logging.error("Error loading command %s: %s", command_name, e)
+            print(f"Command unavailable: {command_name}")
+            return False
+        try:
+            args = self.bind_arguments(command_name, command, tokens)
+        except ValueError as e:
+            print(e)
+            return False
+        result = command.execute(*args)
+        if result is FAILED:
+            return False
+        if result is not None:
+            self.last_result = result
+        return True
+
+    def bind_arguments(self, command_name: str, command: Command, tokens):
+        """Convert a step's inline tokens with the command's argument spec and return the values.
+
+        ``_``, ``last`` and ``!N`` tokens are resolved first. Raises
+        ValueError with the message to show if the tokens do not fit.
+        """
+        arguments = command.arguments
+        if arguments and arguments[-1].variadic:
+            arguments = arguments + arguments[-1:] * (len(tokens) - len(arguments))
+        if len(tokens) > len(arguments):
+            names = ' '.join(f"[{argument.name}]" for argument in arguments)
+            raise ValueError(f"Usage: {command_name} {names}".rstrip())
+        args = []
+        for argument, token in zip(arguments, tokens):
+            if token == '_':
+                if self.last_result is None:
+                    raise ValueError("No previous result for '_'.")
+                token = self.last_result
+            elif self.session is not None and (token == 'last' or token.startswith('!')):
+                try:
+                    token = self.session.recall(token)
+                except LookupError as e:
+                    raise ValueError(str(e)) from None
+            try:
+                args.append(argument.type(token))
+            except ValueError:
+                raise ValueError(f"Invalid value for {argument.name}: {token}") from None
+        return args
@@ -0,0 +1,126 @@
+"""Queue-based logging and sampling of per-calculation records.
+
+In queue mode the root logger's handlers are moved behind a
+``QueueHandler``: callers only put records on a queue, and a background
+``BatchingQueueListener`` formats and writes them, flushing each handler
+once per batch instead of once per record.
+"""
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Argument types that cannot change between logging a record and the
+# listener formatting it.
+IMMUTABLE_ARGS = (int, float, str, bool, type(None))
+
+# Passed as ``extra`` by the arithmetic plugins so their per-calculation
+# INFO records can be sampled.
+CALCULATION = {'calculation': True}
+
+
+class CalculationSampler(logging.Filter):
+    """Keep a fraction ``rate`` of per-calculation INFO records, evenly spaced.
+
+    Every other record passes. With a rate of 0.1 the first calculation
+    record is kept, then every tenth one.
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._credit = 1.0
+
+    def filter(self, record):
+        if not getattr(record, 'calculation', False) or record.levelno != logging.INFO:
+            return True
+        if self._credit >= 1.0:
+            self._credit -= 1.0
+            keep = True
+        else:
+            keep = False
+        self._credit += self.rate
+        return keep
+
+
+class DeferredQueueHandler(QueueHandler):
+    """A QueueHandler that leaves message formatting to the listener when it is safe.
+
+    ``QueueHandler.prepare`` formats and copies every record on the logging
+    thread. Records whose arguments are all immutable are queued as they
+    are, so that cost moves to the listener too.
+    """
+    def prepare(self, record):
+        args = record.args
+        if record.exc_info is None and isinstance(args, tuple) and all(type(arg) in IMMUTABLE_ARGS for arg in args):
+            return record
+        return super().prepare(record)
+
+
+class BatchingQueueListener(QueueListener):
+    """A QueueListener that handles up to ``batch_size`` queued records at a time.
+
+    Handlers are flushed once per batch rather than after every record, so
+    a burst of records costs one write to each stream.
+    """
+    def __init__(self, log_queue, *handlers, batch_size=256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+
+    def _monitor(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            record = self.dequeue(True)
+            while True:
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.dequeue(False)
+                except queue.Empty:
+                    break
+            self.handle_batch(batch)
+
+    def handle_batch(self, records):
+        """Pass each record to every handler, then flush each handler once."""
+        for handler in self.handlers:
+            # Handlers only flush after each record through their own flush
+            # method, so shadow it on the instance for the duration of the batch.
+            handler.flush = _no_flush
+            try:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            finally:
+                del handler.flush
+                handler.flush()
+
+
+def _no_flush():
+    """Stand-in for Handler.flush while a batch is being written."""
+
+
+def start_queue_logging(logger=None, batch_size=256):
+    """Move ``logger``'s handlers (root by default) behind a queue; return the started listener."""
+    logger = logger or logging.getLogger()
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener = BatchingQueueListener(log_queue, *handlers, batch_size=batch_size)
+    listener.start()
+    return listener
+
+
+def stop_queue_logging(listener, logger=None):
+    """Write out every queued record and give the handlers back to ``logger``."""
+    logger = logger or logging.getLogger()
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler) and handler.queue is listener.queue:
+            logger.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        logger.addHandler(handler)
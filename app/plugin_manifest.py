@@ -0,0 +1,74 @@
+"""Cached manifest of the commands each plugin package defines.
+
+The manifest maps a plugin name to its module and the Command subclasses found
+in its ``__init__.py``. It is built by parsing the plugin sources (nothing is
+imported) and reused for as long as the plugin files' modification times are
+unchanged.
+"""
+import ast
+import json
+import logging
+import os
+import pkgutil
+
+MANIFEST_VERSION = 1
+
+
+def plugin_signature(plugins_path):
+    """Return {plugin_name: mtime_ns of its __init__.py} for every plugin package."""
+    signature = {}
+    for _, plugin_name, is_pkg in pkgutil.iter_modules([plugins_path]):
+        if is_pkg:
+            try:
+                signature[plugin_name] = os.stat(os.path.join(plugins_path, plugin_name, '__init__.py')).st_mtime_ns
+            except OSError:
+                signature[plugin_name] = None
+    return signature
+
+
+def find_command_classes(source_path):
+    """Return the names of classes in a plugin source that subclass Command."""
+    try:
+        with open(source_path, encoding='utf-8') as handle:
+            tree = ast.parse(handle.read(), source_path)
+    except (OSError, SyntaxError):
+        return []
+    classes = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bases = {base.id if isinstance(base, ast.Name) else getattr(base, 'attr', None) for base in node.bases}
+            if 'Command' in bases:
+                classes.append(node.name)
+    # dir() order, so the class registered last matches eager loading.
+    return sorted(classes)
+
+
+def build_manifest(plugins_path, plugins_package, signature):
+    """Parse every plugin package and return a fresh manifest."""
+    plugins = {}
+    for plugin_name in signature:
+        source_path = os.path.join(plugins_path, plugin_name, '__init__.py')
+        plugins[plugin_name] = {
+            'module': f'{plugins_package}.{plugin_name}',
+            'classes': find_command_classes(source_path),
+        }
+    return {'version': MANIFEST_VERSION, 'signature': signature, 'plugins': plugins}
+
+
+def load_manifest(manifest_path, plugins_path, plugins_package):
+    """Return the cached manifest, rebuilding and saving it when the plugins changed."""
+    signature = plugin_signature(plugins_path)
+    try:
+        with open(manifest_path, encoding='utf-8') as handle:
+            manifest = json.load(handle)
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('signature') == signature:
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    manifest = build_manifest(plugins_path, plugins_package, signature)
+    try:
+        with open(manifest_path, 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle, indent=2)
+    except OSError as e:
+        logging.warning("Could not save plugin manifest %s: %s", manifest_path, e)
+    return manifest
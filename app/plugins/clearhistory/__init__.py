@@ -9,8 +9,7 @@ class ClearHistoryCommand(Command):
     """
 
     def execute(self):
-        csv_file = os.getenv("CALC_HISTORY_FILE", "calc_history.csv")
-        facade = HistoryFacade(csv_file)
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
 
         facade.clear_history()
         print("History cleared.")
@@ -1,23 +1,53 @@
 import os
 import logging
-from app.commands import Command
+from app.commands import FAILED, Argument, Command
+from app.log_pipeline import CALCULATION
 from app.plugins.history_facade import HistoryFacade
 
 class DivideCommand(Command):
-    def execute(self):
+    arguments = (Argument("a", float), Argument("b", float))
+    operation = "division"
+
+    def calculate(self, a, b):
+        """Return a divided by b; raises ZeroDivisionError when b is 0."""
+        return a / b
+
+    def execute_batch(self, a, b):
+        """Divide array a by b element-wise.
+
+        Elements with a zero divisor follow the scalar rule: they are rejected
+        (their result is NaN) and are not recorded in history.
+        """
+        import numpy as np
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+        valid = b != 0
+        result = np.full(a.shape, np.nan)
+        np.divide(a, b, out=result, where=valid)
+        if not valid.all():
+            logging.error("DivideCommand: Division by zero attempted in %s of %s elements",
+                          np.count_nonzero(~valid), valid.size)
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+        facade.append_columns(self.operation, a[valid], b[valid], result[valid])
+        return result
+
+    def execute(self, a=None, b=None):
+        """Run the calculation, prompting for any operand not given inline; return the result, or FAILED."""
         try:
-            a = float(input("Enter first number: "))
-            b = float(input("Enter second number: "))
+            a = float(input("Enter first number: ")) if a is None else a
+            b = float(input("Enter second number: ")) if b is None else b
             if b == 0:
                 logging.error("DivideCommand: Division by zero attempted")
                 print("Error: Division by zero is not allowed.")
-                return
-            result = a / b
-            logging.info("DivideCommand: %s / %s = %s", a, b, result)
+                return FAILED
+            result = self.calculate(a, b)
+            logging.info("DivideCommand: %s / %s = %s", a, b, result, extra=CALCULATION)
             print(f"Result: {result}")
-            csv_file = os.getenv("CALC_HISTORY_FILE", "calc_history.csv")
-            facade = HistoryFacade(csv_file)
-            facade.append_operation("division", a, b, result)
+            facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+            facade.append_operation(self.operation, a, b, result)
+            if self.session is not None:
+                self.session.record(self.operation, a, b, result)
+            return result
         except ValueError:
             logging.error("DivideCommand: Invalid input encountered")
             print("Invalid input. Please enter numeric values.")
+            return FAILED
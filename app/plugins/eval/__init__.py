@@ -0,0 +1,62 @@
+import re
+import logging
+from app.commands import FAILED, Argument, Command
+from app.log_pipeline import CALCULATION
+from app.plugins.expressions import DEFAULT_CACHE_SIZE, cached_compiler, compile_expression
+
+BINDING = re.compile(r"([A-Za-z]\w*)=(.+)")
+
+class EvalCommand(Command):
+    """
+    Evaluate an arithmetic expression with +, -, *, / and parentheses, binding variables inline.
+
+    Usage: eval EXPRESSION [name=value...], e.g. eval 2 * (x + 3) / y x=4 y=2
+    """
+    arguments = (Argument("tokens", str, True),)
+    # Shared cache, until ``configure`` gives the command one of the configured size.
+    compile = staticmethod(compile_expression)
+
+    def configure(self, settings):
+        """Size the compiled-expression cache from CALC_EVAL_CACHE_SIZE."""
+        self.compile = cached_compiler(int(settings.get('CALC_EVAL_CACHE_SIZE', DEFAULT_CACHE_SIZE)))
+
+    def evaluate(self, expression, **variables):
+        """Return the value of ``expression`` with the given variable bindings."""
+        return self.compile(expression).evaluate(**variables)
+
+    def execute(self, *tokens):
+        """Evaluate the expression, prompting for it if none is given inline; return the result, or FAILED."""
+        try:
+            expression, variables = parse_tokens(tokens or input("Enter expression: ").split())
+            result = self.evaluate(expression, **variables)
+            logging.info("EvalCommand: %s = %s", expression, result, extra=CALCULATION)
+            print(f"Result: {result}")
+            return result
+        except ZeroDivisionError:
+            logging.error("EvalCommand: Division by zero attempted")
+            print("Error: Division by zero is not allowed.")
+            return FAILED
+        except OverflowError as e:
+            logging.error("EvalCommand: %s", e)
+            print("Error: The result is too large.")
+            return FAILED
+        except ValueError as e:
+            logging.error("EvalCommand: %s", e)
+            print(f"Invalid input. {e}")
+            return FAILED
+
+
+def parse_tokens(tokens):
+    """Split command tokens into the expression and its ``name=value`` variable bindings."""
+    expression, variables = [], {}
+    for token in tokens:
+        match = BINDING.fullmatch(token)
+        if match is None:
+            expression.append(token)
+            continue
+        name, value = match.groups()
+        try:
+            variables[name] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for {name}: {value}") from None
+    return " ".join(expression), variables
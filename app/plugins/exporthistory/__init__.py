@@ -0,0 +1,42 @@
+import os
+import time
+import logging
+from app.commands import Argument, Command
+from app.plugins.history_export import export_format, export_records
+from app.plugins.history_facade import HistoryFacade
+from app.plugins.queryhistory import parse_filters
+
+class ExportHistoryCommand(Command):
+    """
+    Export the history, or the calculations matching filters, to a file for analysis.
+
+    Usage: exporthistory OUTPUT [filters...], e.g. exporthistory divisions.jsonl operation=division result>=2
+    The extension picks the format: .jsonl, .csv.gz, .npy or .npz. Filters are those of queryhistory,
+    without limit. Rows are streamed, so memory does not grow with the history.
+    """
+    arguments = (Argument("output", str), Argument("filters", str, True))
+
+    def execute(self, *args):
+        if not args:
+            print("Usage: exporthistory OUTPUT [filters...]")
+            return
+        output, *filters = args
+        try:
+            export_format(output)
+            operation, conditions, _ = parse_filters(filters, allow_limit=False)
+        except ValueError as e:
+            logging.error("ExportHistoryCommand: %s", e)
+            print(e)
+            return
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+
+        start = time.perf_counter()
+        try:
+            rows = export_records(facade.iter_records(operation, conditions), output)
+        except (OSError, ValueError) as e:
+            logging.error("ExportHistoryCommand: exporting to %s failed: %s", output, e)
+            print(f"Export failed: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        logging.info("ExportHistoryCommand: exported %s rows to %s.", rows, output)
+        print(f"Exported {rows} rows to {output} in {elapsed:.2f} s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -0,0 +1,139 @@
+"""Safe compilation of arithmetic expressions for the eval command.
+
+An expression such as ``2 * (x + 3) / y`` is parsed with Python's own
+parser and validated against a whitelist: numbers, variable names, unary
+``+``/``-``, the four operations of the arithmetic plugins and parentheses.
+Anything else (calls, attributes, subscripts, ``**``, strings...) is
+rejected before the expression is compiled to a code object, which runs
+without builtins.
+
+Compiled expressions are kept in a bounded LRU cache, so a formula that is
+evaluated again skips parsing and validation. ``compile_expression`` holds
+``DEFAULT_CACHE_SIZE`` expressions; ``cached_compiler`` makes one with
+another size, as the eval command does for ``CALC_EVAL_CACHE_SIZE``.
+"""
+import ast
+import functools
+import operator
+
+DEFAULT_CACHE_SIZE = 256
+# Longest expression accepted; deeply nested input could exhaust the parser.
+MAX_LENGTH = 1000
+BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+# Divisions are compiled to calls of this name so that arrays and scalars
+# can follow the division plugin's rules; variables may not start with '_'.
+DIVIDE = "_divide"
+
+
+class Expression:
+    """A validated, compiled arithmetic expression."""
+    __slots__ = ("source", "variables", "code")
+
+    def __init__(self, source, variables, code):
+        self.source = source
+        self.variables = variables
+        self.code = code
+
+    def evaluate(self, **values):
+        """Return the value for float variable bindings; raises ZeroDivisionError on a zero divisor."""
+        # The code was compiled from a validated tree and sees no builtins.
+        return eval(self.code, {"__builtins__": {}, DIVIDE: operator.truediv}, self._bind(values))  # pylint: disable=eval-used
+
+    def evaluate_arrays(self, **arrays):
+        """Evaluate element-wise over NumPy arrays (or scalars) bound to the variables.
+
+        The bindings are broadcast against each other. As in the division
+        plugin, elements divided by zero are NaN instead of an error.
+        """
+        import numpy as np
+        values = {name: np.asarray(value, dtype=np.float64) for name, value in self._bind(arrays).items()}
+        result = eval(self.code, {"__builtins__": {}, DIVIDE: _divide_arrays}, values)  # pylint: disable=eval-used
+        shape = np.broadcast_shapes(*(value.shape for value in values.values()))
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), shape)
+
+    def _bind(self, values):
+        """Return the bindings of the expression's variables; raise ValueError if any is missing."""
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ValueError(f"Unbound variables: {', '.join(missing)}")
+        return {name: values[name] for name in self.variables}
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+def _divide_arrays(a, b):
+    """Divide element-wise, with NaN where the divisor is zero."""
+    import numpy as np
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    result = np.full(a.shape, np.nan)
+    np.divide(a, b, out=result, where=b != 0)
+    return result
+
+
+class _Validator(ast.NodeTransformer):
+    """Reject any node outside the arithmetic whitelist and collect variable names.
+
+    Numbers become floats, like the calculator's operands, and divisions
+    become calls to ``_divide``.
+    """
+    def __init__(self):
+        self.variables = []
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, BINARY_OPERATORS):
+            raise ValueError(f"Unsupported syntax: {ast.unparse(node)}")
+        left, right = self.visit(node.left), self.visit(node.right)
+        if isinstance(node.op, ast.Div):
+            return ast.Call(ast.Name(DIVIDE, ast.Load()), [left, right], [])
+        node.left, node.right = left, right
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, UNARY_OPERATORS):
+            raise ValueError(f"Unsupported syntax: {ast.unparse(node)}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ValueError(f"Unsupported value: {node.value!r}")
+        return ast.Constant(float(node.value))
+
+    def visit_Name(self, node):
+        if node.id.startswith("_"):
+            raise ValueError(f"Invalid variable name: {node.id}")
+        if node.id not in self.variables:
+            self.variables.append(node.id)
+        return node
+
+    def generic_visit(self, node):
+        raise ValueError(f"Unsupported syntax: {ast.unparse(node)}")
+
+
+def _compile(source):
+    """Parse, validate and compile ``source``; raise ValueError if it is not a valid expression."""
+    if len(source) > MAX_LENGTH:
+        raise ValueError(f"Expression longer than {MAX_LENGTH} characters")
+    validator = _Validator()
+    try:
+        tree = ast.fix_missing_locations(validator.visit(ast.parse(source.strip(), mode="eval")))
+        code = compile(tree, "<expression>", "eval")
+    except OverflowError:
+        raise ValueError(f"Number too large in expression: {source}") from None
+    except (SyntaxError, RecursionError, MemoryError):
+        raise ValueError(f"Invalid expression: {source}") from None
+    return Expression(source, tuple(validator.variables), code)
+
+
+def cached_compiler(size=DEFAULT_CACHE_SIZE):
+    """Return a function that compiles expressions like ``_compile``, keeping ``size`` of them in an LRU cache."""
+    return functools.lru_cache(maxsize=size)(_compile)
+
+
+compile_expression = cached_compiler()
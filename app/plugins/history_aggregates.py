@@ -0,0 +1,108 @@
+"""Running per-operation aggregates of the history results.
+
+HistoryFacade keeps one RunningStats per operation and persists them in a
+JSON sidecar next to the history, stamped with the backend's fingerprint so
+a stale sidecar (e.g. after a crash or a write by another process) is
+detected and rebuilt.
+"""
+import json
+import math
+import os
+
+AGGREGATES_VERSION = 1
+
+
+class RunningStats:
+    """Count, sum, min, max, mean and variance of a stream of values.
+
+    The mean and variance are updated with Welford's algorithm, and whole
+    columns are folded in with Chan et al.'s pairwise combination.
+    """
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'mean', 'm2')
+
+    def __init__(self, count=0, total=0.0, minimum=math.inf, maximum=-math.inf, mean=0.0, m2=0.0):
+        self.count = count
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        """Account for one value."""
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def add_many(self, values):
+        """Account for a list of values in two passes instead of one update per value."""
+        if not values:
+            return
+        count = len(values)
+        mean = math.fsum(values) / count
+        self.merge(RunningStats(count, math.fsum(values), min(values), max(values), mean,
+                                math.fsum((value - mean) ** 2 for value in values)))
+
+    def merge(self, other):
+        """Fold another RunningStats into this one."""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 denominator), as pandas computes it; NaN below two values."""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    def as_dict(self):
+        """Return the fields as a dict (for the sidecar)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def aggregate_rows(rows, aggregates=None):
+    """Fold (operation, operand1, operand2, result) rows into {operation: RunningStats}."""
+    aggregates = {} if aggregates is None else aggregates
+    for operation, _, _, result in rows:
+        stats = aggregates.get(operation)
+        if stats is None:
+            stats = aggregates[operation] = RunningStats()
+        stats.add(result)
+    return aggregates
+
+
+def load_aggregates(path):
+    """Return (aggregates, fingerprint) from a sidecar, or None if it is missing or unreadable."""
+    try:
+        with open(path, encoding='utf-8') as handle:
+            document = json.load(handle)
+        if document.get('version') != AGGREGATES_VERSION:
+            return None
+        aggregates = {operation: RunningStats(**fields) for operation, fields in document['operations'].items()}
+        return aggregates, document['fingerprint']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_aggregates(path, aggregates, fingerprint):
+    """Atomically write the aggregates and the fingerprint of the history they describe."""
+    document = {
+        'version': AGGREGATES_VERSION,
+        'fingerprint': fingerprint,
+        'operations': {operation: stats.as_dict() for operation, stats in aggregates.items()},
+    }
+    # A temporary name per process, as several may save the same sidecar.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        json.dump(document, handle)
+    os.replace(temp_path, path)
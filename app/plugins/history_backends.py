@@ -0,0 +1,819 @@
+"""Storage backends used by HistoryFacade.
+
+A backend stores (operation, operand1, operand2, result) rows. The CSV backend
+is the default; ``sqlite://`` locations (or ``CALC_HISTORY_BACKEND=sqlite``)
+select the SQLite backend.
+
+``segments://`` locations (or ``CALC_HISTORY_BACKEND=segments``) select a
+directory of bounded CSV segments, where sealed segments are gzip-compressed
+and summarised (``history_segments``).
+
+``binary://`` locations (or ``CALC_HISTORY_BACKEND=binary``) select a
+directory of fixed-width binary columns that are read through
+``numpy.memmap`` (``history_binary``); ``convert_history`` copies a history between locations.
+
+Stored records also carry a ``timestamp`` (seconds since the epoch, taken
+when the row is written, under the backend's write lock) and a ``sequence``
+number that counts the rows of one history. Both therefore follow the order
+of the rows even when several instances share a history, so histories can
+be merged in time order (``merge_histories``). Tail reads and queries still
+return (operation, operand1, operand2, result) rows; ``iter_records`` and
+``load_dataframe`` include the two extra columns. Files written before the
+columns existed are still read, with no timestamp and sequence numbers
+counted from their first row; new rows are appended to them with both.
+
+Appends, tail reads and clearing only use the standard library. pandas is
+imported lazily, the first time a caller asks for a DataFrame.
+``iter_chunks`` streams the history as DataFrames with declared column
+dtypes, a bounded number of rows at a time.
+"""
+import csv
+import gzip
+import importlib
+import io
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from heapq import merge
+from itertools import islice
+from app.plugins.history_aggregates import aggregate_rows
+from app.plugins.history_index import COMPARISONS, CONDITION_FIELDS, CsvIndex, row_matches
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no advisory flock
+    fcntl = None
+
+# Fields of the rows returned by tail reads and queries.
+FIELDNAMES = ["operation", "operand1", "operand2", "result"]
+# Fields of a stored record.
+RECORD_FIELDS = FIELDNAMES + ["timestamp", "sequence"]
+HEADER = (",".join(RECORD_FIELDS) + "\n").encode("utf-8")
+LEGACY_HEADER = (",".join(FIELDNAMES) + "\n").encode("utf-8")
+# Bytes per row the CSV parser needs besides the parsed columns: the raw
+# text, its tokenised fields and the parser's buffers (measured with pandas'
+# C parser on calculator histories, rounded up).
+PARSE_BYTES_PER_ROW = 160
+
+
+def history_dtypes(float_dtype="float64", usecols=None):
+    """Return the declared dtype of each history column (of ``usecols`` only, if given).
+
+    ``operation`` is categorical; the numbers are ``float_dtype``.
+    """
+    dtypes = {"operation": "category", "operand1": float_dtype, "operand2": float_dtype, "result": float_dtype}
+    unknown = [name for name in usecols or () if name not in dtypes]
+    if unknown:
+        raise ValueError(f"Unknown history columns: {', '.join(unknown)}")
+    return {name: dtypes[name] for name in FIELDNAMES if usecols is None or name in usecols}
+
+
+def rows_per_chunk(memory_budget, dtypes):
+    """Return how many rows of the given columns can be parsed within ``memory_budget`` bytes."""
+    import numpy as np
+    # Categories are parsed as one object pointer per row before they are encoded.
+    row_bytes = sum(8 if dtype == "category" else np.dtype(dtype).itemsize for dtype in dtypes.values())
+    return max(1, memory_budget // (row_bytes + PARSE_BYTES_PER_ROW))
+
+
+class HistoryBackend(ABC):
+    """Interface every history storage backend implements.
+
+    ``append_rows`` group-commits: rows handed over by concurrent threads are
+    queued, and whichever thread gets the commit lock passes every queued row
+    to ``_write`` at once.
+
+    Writes return the (before, after) fingerprints of the storage, read
+    while the write lock is held, so a caller can tell whether anyone else
+    wrote since it last looked; they return None if the call wrote nothing.
+    """
+
+    # Keyword options of open_backend that this backend's constructor accepts.
+    OPTIONS = ()
+
+    def __init__(self):
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+
+    def append_rows(self, rows):
+        """Append the given rows in order.
+
+        A row may carry its timestamp (or None) as a fifth value, e.g. when
+        it is copied from another history; other rows are stamped as they
+        are written. Returns the fingerprints around the commit that wrote
+        them, or None if another thread's commit did.
+        """
+        with self._queue_lock:
+            self._queue.extend(rows)
+        with self._commit_lock:
+            with self._queue_lock:
+                batch, self._queue = self._queue, []
+            if batch:
+                return self._write(batch)
+            return None
+
+    def append_columns(self, operation, operand1, operand2, result):
+        """Append one operation's operand/result columns (lists of floats) in order; return the fingerprints."""
+        return self.append_rows(zip([operation] * len(result), operand1, operand2, result))
+
+    @abstractmethod
+    def _write(self, rows):
+        """Durably store ``rows`` in a single write; return the (before, after) fingerprints."""
+
+    @abstractmethod
+    def tail(self, count, offset=0, operation=None):
+        """Return the newest ``count`` matching rows after skipping ``offset``, oldest first."""
+
+    @abstractmethod
+    def iter_rows(self):
+        """Yield every stored row, oldest first."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all stored rows."""
+
+    def query(self, operation=None, conditions=(), limit=None):
+        """Return the newest ``limit`` rows (all if None) matching the filters, oldest first.
+
+        ``conditions`` are (field, comparison, value) triples such as
+        ``("result", ">=", 2.0)``; see ``history_index.COMPARISONS``. This
+        default reads every row, skipping parts whose summary rules them out.
+        """
+        matches = deque(maxlen=limit)
+        for summary, rows in self.segments():
+            if summary is not None and operation is not None and not summary["operations"].get(operation):
+                continue
+            matches.extend(row for row in rows() if row_matches(row, operation, conditions))
+        return list(matches)
+
+    def aggregate(self):
+        """Return {operation: RunningStats} of the results over every stored row."""
+        return aggregate_rows(self.iter_rows())
+
+    def fingerprint(self):
+        """Return a cheap JSON-serialisable value that changes whenever stored rows change.
+
+        None means the backend cannot tell, so derived data is never trusted.
+        """
+        return None
+
+    def segments(self):
+        """Yield (summary, rows) for each part of the history, oldest first.
+
+        ``rows`` is a callable returning an iterator over the part's rows and
+        ``summary`` is a dict as built by ``history_segments.summarize``, or None when the part
+        has no summary and must be read. Backends without segments have a
+        single part.
+        """
+        yield None, self.iter_rows
+
+    def iter_records(self):
+        """Yield every stored record, oldest first, as (*row, timestamp, sequence).
+
+        ``timestamp`` is None for rows written before timestamps were
+        recorded. This default numbers the rows from 1 and has no timestamps.
+        """
+        for sequence, row in enumerate(self.iter_rows(), 1):
+            yield (*row, None, sequence)
+
+    def load_dataframe(self):
+        """Return the whole history as a DataFrame of records."""
+        import pandas as pd
+        return pd.DataFrame(list(self.iter_records()), columns=RECORD_FIELDS).astype({"timestamp": "float64"})
+
+    def iter_chunks(self, chunksize, dtypes):
+        """Yield the history, oldest rows first, as DataFrames of at most ``chunksize`` rows.
+
+        ``dtypes`` maps each wanted column to its dtype (see
+        ``history_dtypes``); other columns are not returned.
+        """
+        import pandas as pd
+        positions = [FIELDNAMES.index(name) for name in dtypes]
+        rows = self.iter_rows()
+        while True:
+            chunk = list(islice(rows, chunksize))
+            if not chunk:
+                return
+            yield pd.DataFrame({name: [row[position] for row in chunk] for name, position in zip(dtypes, positions)}
+                               ).astype(dtypes)
+
+    def save_dataframe(self, df):
+        """Replace the stored history with the rows of ``df``, keeping its timestamps if it has them."""
+        self.clear()
+        self.append_rows(_stamped_rows(df))
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class CsvHistoryBackend(HistoryBackend):
+    """History stored as an append-only CSV file.
+
+    Writers take an exclusive advisory lock on ``<path>.lock`` so several
+    processes can share one file, and each group commit is a single fsync'd
+    write. Timestamps and sequence numbers are given out under the lock,
+    so they follow the order of the rows in the file; the next sequence
+    number is read from the last row.
+
+    A file without the timestamp and sequence columns is not rewritten:
+    new rows are appended with them, and its older rows are read with no
+    timestamp and numbered from 1.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.index = CsvIndex(path)
+
+    def _locked(self, shared=False):
+        """Hold the cross-process advisory lock for the history file."""
+        return _file_lock(self.lock_path, shared)
+
+    def _write(self, rows):
+        def render(first):
+            return _format_rows([(*row[:4], "" if stamp is None else stamp, sequence)
+                                 for sequence, row, stamp in zip(range(first, first + len(rows)), rows,
+                                                                 _timestamps(rows))])
+        return self._append_text(render)
+
+    def append_columns(self, operation, operand1, operand2, result):
+        # Format the whole batch in one pass instead of row by row.
+        prefix = _format_rows([(operation,)]).rstrip("\n") + ","
+
+        def render(first):
+            now = time.time()
+            return "".join([f"{prefix}{a},{b},{r},{now},{sequence}\n"
+                            for sequence, a, b, r in zip(range(first, first + len(result)), operand1, operand2, result)])
+        if len(result):
+            with self._commit_lock:
+                return self._append_text(render)
+        return None
+
+    def _append_text(self, render):
+        """Append ``render(first sequence number)`` CSV text under the file lock in one write, then fsync.
+
+        ``render`` is called with the lock held, so the rows it stamps are in
+        time order. Returns the (before, after) fingerprints.
+        """
+        with self._locked():
+            before = self.fingerprint()
+            self._append_locked(render)
+            return before, self.fingerprint()
+
+    def _append_locked(self, render):
+        """Write the rows ``render`` returns to the end of the file; return its (start, end) offsets and row count.
+
+        The caller holds the file lock.
+        """
+        first = self._next_sequence()
+        data = render(first).encode("utf-8")
+        # Append mode leaves the file position at the end, so a zero offset
+        # means the file is new (or empty) and still needs its header. The
+        # batch is already encoded, so the file is opened unbuffered.
+        with open(self.path, "ab", buffering=0) as handle:
+            start = handle.tell()
+            rows = data.count(b"\n")
+            if start == 0:
+                data = HEADER + data
+            view = memoryview(data)
+            while view:
+                view = view[handle.write(view):]
+            os.fsync(handle.fileno())
+            end = handle.tell()
+        if self.index is not None:
+            self.index.appended(start, data)
+        return start, end, rows
+
+    def _next_sequence(self):
+        """Return the sequence number of the next row; call with the lock held.
+
+        It is read from the last row, so only the end of the file is read,
+        unless that row predates sequence numbers and the rows are counted.
+        """
+        try:
+            last = next(_reversed_lines(self.path), None)
+        except FileNotFoundError:
+            return self._initial_sequence()
+        if last is None or _is_header(last):
+            return self._initial_sequence()
+        values = _split_line(last.decode("utf-8").rstrip("\r"))
+        if len(values) >= len(RECORD_FIELDS):
+            return int(values[5]) + 1
+        # Only a file written before sequence numbers ends in a row without one.
+        return self._initial_sequence() + _count_lines(self.path) - 1
+
+    def _initial_sequence(self):
+        """Return the sequence number of the first row of a new file."""
+        return 1
+
+    def tail(self, count, offset=0, operation=None):
+        if count <= 0:
+            return []
+        with self._locked(shared=True):
+            rows = self._newest_rows(offset + count, operation)
+        rows = rows[offset:]
+        rows.reverse()
+        return rows
+
+    def _newest_rows(self, wanted, operation=None):
+        """Return up to ``wanted`` matching rows from the end of the file, newest first."""
+        rows = []
+        if not os.path.exists(self.path):
+            return rows
+        for line in _reversed_lines(self.path):
+            values = next(csv.reader([line.decode("utf-8")]))
+            if values[:4] == FIELDNAMES:
+                continue
+            if operation is not None and values[0] != operation:
+                continue
+            rows.append(_parse_row(values))
+            if len(rows) == wanted:
+                break
+        return rows
+
+    def query(self, operation=None, conditions=(), limit=None):
+        # Bring the index up to date, then answer from it.
+        with self._locked():
+            self.index.update()
+        with self._locked(shared=True):
+            return self.index.query(operation, conditions, limit)
+
+    def fingerprint(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return [0, 0]
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def iter_rows(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, newline="", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            next(reader, None)
+            for values in reader:
+                yield _parse_row(values)
+
+    def iter_records(self):
+        if os.path.exists(self.path):
+            yield from _read_records(self.path)
+
+    def clear(self):
+        # Writers hold the same lock, so no append can be cut in half.
+        with self._locked():
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.index.remove()
+
+    def load_dataframe(self):
+        import pandas as pd
+        with self._locked(shared=True):
+            if os.path.exists(self.path):
+                return _with_record_columns(_read_csv_records(self.path))
+        return pd.DataFrame(columns=RECORD_FIELDS)
+
+    def iter_chunks(self, chunksize, dtypes):
+        with self._locked(shared=True):
+            # Rows are written whole under the exclusive lock, so the size seen
+            # here ends on a row; anything appended later is left out.
+            try:
+                handle = open(self.path, "rb")
+            except FileNotFoundError:
+                return
+            size = os.fstat(handle.fileno()).st_size
+        with handle:
+            legacy = _has_legacy_header(handle)
+            yield from _read_csv_chunks(_BoundedReader(handle, size), chunksize, dtypes, legacy)
+
+    def save_dataframe(self, df):
+        # Write a sibling file and rename it so readers never see a partial rewrite.
+        temp_path = self.path + ".tmp"
+        df = _with_record_columns(df[[name for name in RECORD_FIELDS if name in df]].copy())
+        # The rows are renumbered, since they now make up a new history.
+        df["sequence"] = range(self._initial_sequence(), self._initial_sequence() + len(df))
+        with self._locked():
+            df.to_csv(temp_path, index=False)
+            os.replace(temp_path, self.path)
+            self.index.remove()
+
+
+class SqliteHistoryBackend(HistoryBackend):
+    """History stored in an SQLite database in WAL mode.
+
+    One connection is opened lazily and reused (guarded by a lock so threads
+    can share it); rows are ordered by an integer primary key and indexed by
+    operation so filtered tail reads stay cheap. The key is the row's
+    sequence number.
+    """
+
+    INSERT = "INSERT INTO history (operation, operand1, operand2, result, timestamp) VALUES (?, ?, ?, ?, ?)"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        """Return the shared connection, opening and initialising it on first use."""
+        if self._connection is None:
+            # The busy timeout lets writers from other processes wait for the lock.
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema()
+        return self._connection
+
+    def _create_schema(self):
+        """Create the history table, its operation index and the clear counter if missing; add columns older tables lack."""
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY, operation TEXT NOT NULL, "
+                "operand1 REAL, operand2 REAL, result REAL, timestamp REAL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS history_operation ON history (operation, id)"
+            )
+            # Counts the clears, since ids start again from 1 after one.
+            self._connection.execute("CREATE TABLE IF NOT EXISTS history_generation (generation INTEGER NOT NULL)")
+            self._connection.execute(
+                "INSERT INTO history_generation SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM history_generation)")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(history)")]
+            if "timestamp" not in columns:
+                self._connection.execute("ALTER TABLE history ADD COLUMN timestamp REAL")
+
+    def _write(self, rows):
+        with self._lock, self.connection:
+            # Take the write lock before stamping, so timestamps follow the ids.
+            self.connection.execute("BEGIN IMMEDIATE")
+            before = self.fingerprint()
+            self.connection.executemany(self.INSERT, [(*row[:4], stamp) for row, stamp in zip(rows, _timestamps(rows))])
+            return before, self.fingerprint()
+
+    def tail(self, count, offset=0, operation=None):
+        if count <= 0:
+            return []
+        with self._lock:
+            if operation is None:
+                cursor = self.connection.execute(
+                    "SELECT operation, operand1, operand2, result FROM history "
+                    "ORDER BY id DESC LIMIT ? OFFSET ?", (count, offset))
+            else:
+                cursor = self.connection.execute(
+                    "SELECT operation, operand1, operand2, result FROM history "
+                    "WHERE operation = ? ORDER BY id DESC LIMIT ? OFFSET ?", (operation, count, offset))
+            rows = cursor.fetchall()
+        rows.reverse()
+        return rows
+
+    def query(self, operation=None, conditions=(), limit=None):
+        clauses, parameters = [], []
+        if operation is not None:
+            clauses.append("operation = ?")
+            parameters.append(operation)
+        for field, comparison, value in conditions:
+            # Field names and comparisons are checked against fixed lists, never interpolated from input.
+            if field not in CONDITION_FIELDS or comparison not in COMPARISONS:
+                raise ValueError(f"Invalid condition: {field} {comparison} {value}")
+            clauses.append(f"{field} {comparison} ?")
+            parameters.append(value)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT operation, operand1, operand2, result FROM history "
+                f"{where}ORDER BY id DESC LIMIT ?", (*parameters, -1 if limit is None else limit)).fetchall()
+        rows.reverse()
+        return rows
+
+    def fingerprint(self):
+        # Ids only grow between clears, so the highest one and the number of
+        # clears identify the contents.
+        with self._lock:
+            return list(self.connection.execute(
+                "SELECT (SELECT generation FROM history_generation), max(id) FROM history").fetchone())
+
+    def iter_rows(self):
+        with self._lock:
+            cursor = self.connection.execute(
+                "SELECT operation, operand1, operand2, result FROM history ORDER BY id")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_records(self):
+        with self._lock:
+            cursor = self.connection.execute(
+                "SELECT operation, operand1, operand2, result, timestamp, id FROM history ORDER BY id")
+        while True:
+            with self._lock:
+                records = cursor.fetchmany(1000)
+            if not records:
+                return
+            yield from records
+
+    def clear(self):
+        # SQLite truncates the table for a DELETE without WHERE instead of
+        # deleting row by row. The table itself stays, so other processes'
+        # INSERTs keep working, and the generation changes in the same
+        # transaction.
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM history")
+            self.connection.execute("UPDATE history_generation SET generation = generation + 1")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+BACKENDS = {"csv": CsvHistoryBackend, "sqlite": SqliteHistoryBackend}
+# Backends defined in their own modules, which import this one, as
+# kind: (module, class name). They are imported on first use and can also
+# be imported from here.
+BACKEND_MODULES = {"segments": ("app.plugins.history_segments", "SegmentedHistoryBackend"),
+                   "binary": ("app.plugins.history_binary", "BinaryHistoryBackend")}
+
+
+def _backend_class(kind):
+    """Return the backend class registered for ``kind``; raise KeyError if there is none."""
+    if kind not in BACKENDS:
+        module_name, class_name = BACKEND_MODULES[kind]
+        BACKENDS[kind] = getattr(importlib.import_module(module_name), class_name)
+    return BACKENDS[kind]
+
+
+def __getattr__(name):
+    for kind, (_, class_name) in BACKEND_MODULES.items():
+        if name == class_name:
+            return _backend_class(kind)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def open_backend(location, kind=None, **options):
+    """Create the backend for ``location``.
+
+    A ``scheme://`` prefix on the location (``csv://``, ``sqlite://``,
+    ``segments://`` or ``binary://``) wins over ``kind``; without either the CSV backend is
+    used. ``options`` are passed on to backends that list them in
+    ``OPTIONS`` and ignored by the others.
+    """
+    scheme, separator, path = location.partition("://")
+    if separator:
+        kind, location = scheme, path
+    try:
+        backend_class = _backend_class((kind or "csv").lower())
+    except KeyError:
+        raise ValueError(f"Unknown history backend: {kind}") from None
+    accepted = {name: value for name, value in options.items() if name in backend_class.OPTIONS}
+    return backend_class(location, **accepted)
+
+
+@contextmanager
+def _file_lock(lock_path, shared=False):
+    """Hold an advisory lock on ``lock_path``, shared or exclusive, across processes."""
+    if fcntl is None:
+        yield
+        return
+    # A fresh descriptor per call keeps forked processes from sharing the
+    # lock; it is unbuffered because nothing is ever written to it.
+    with open(lock_path, "ab", buffering=0) as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def convert_history(source, target, batch_rows=100000):
+    """Replace the history at ``target`` with a copy of the one at ``source``; return the rows copied.
+
+    Both are backend locations, e.g. ``calc_history.csv`` and
+    ``binary://history``. Rows are copied ``batch_rows`` at a time, with
+    their timestamps; the target numbers them afresh.
+    """
+    if source == target:
+        raise ValueError("Cannot convert a history into itself")
+    reader, writer = open_backend(source), open_backend(target)
+    try:
+        writer.clear()
+        return _write_records(writer, reader.iter_records(), batch_rows)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def merge_histories(sources, target, batch_rows=10000):
+    """Write the records of every history in ``sources`` to the new history ``target`` in time order.
+
+    Returns the number of rows written. Each source is read as a stream
+    and ``heapq.merge`` keeps only the next record of each in memory, so
+    memory grows with the number of sources (plus one write batch of
+    ``batch_rows``), not with their size. A history written by one
+    instance is already in time order. Rows without a timestamp come
+    first, and rows with equal timestamps keep the order of ``sources``.
+    The target is numbered afresh; it must be empty and not a source.
+    """
+    if target in sources:
+        raise ValueError("Cannot merge a history into one of its inputs")
+    readers = [open_backend(source) for source in sources]
+    writer = open_backend(target)
+    try:
+        if writer.tail(1):
+            raise ValueError(f"{target} already holds history")
+        merged = merge(*(reader.iter_records() for reader in readers), key=_merge_key)
+        return _write_records(writer, merged, batch_rows)
+    finally:
+        for backend in readers + [writer]:
+            backend.close()
+
+
+def _merge_key(record):
+    """Order records by timestamp, those without one first."""
+    return -math.inf if record[4] is None else record[4]
+
+
+def _write_records(writer, records, batch_rows):
+    """Append records to ``writer`` with their timestamps, ``batch_rows`` at a time; return the count."""
+    written = 0
+    while True:
+        batch = [record[:5] for record in islice(records, batch_rows)]
+        if not batch:
+            return written
+        writer.append_rows(batch)
+        written += len(batch)
+
+
+def _count_lines(path, block_size=1024 * 1024):
+    """Return the number of lines in a file (0 if it does not exist)."""
+    try:
+        with open(path, "rb") as handle:
+            return sum(block.count(b"\n") for block in iter(lambda: handle.read(block_size), b""))
+    except FileNotFoundError:
+        return 0
+
+
+class _BoundedReader:
+    """Binary file wrapper that stops reading after ``size`` bytes."""
+
+    def __init__(self, handle, size):
+        self.handle = handle
+        self.remaining = size
+
+    def read(self, size=-1):
+        """Read up to ``size`` bytes without passing the bound."""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def _read_csv_chunks(source, chunksize, dtypes, legacy=False):
+    """Yield non-empty DataFrames of ``chunksize`` rows parsed from a history CSV file object.
+
+    ``legacy`` tells that the file has the header of a file without the
+    record columns (see ``_has_legacy_header``).
+    """
+    import pandas as pd
+    # A file begun before the timestamp and sequence columns existed may
+    # also hold rows without them, on which ``usecols`` fails, so all its
+    # columns are parsed.
+    reader = pd.read_csv(source, chunksize=chunksize, header=None, skiprows=1, names=RECORD_FIELDS,
+                         usecols=None if legacy else list(dtypes), dtype=dtypes, encoding="utf-8")
+    with reader:
+        for chunk in reader:
+            if len(chunk):
+                yield chunk[list(dtypes)]
+
+
+def _format_rows(rows):
+    """Render rows as CSV text in the same format pandas and the csv module write.
+
+    Plain rows are joined directly; only a row whose operation needs quoting
+    goes through csv.writer, which allocates a large record buffer per call.
+    """
+    lines = []
+    for row in rows:
+        if any(char in row[0] for char in ',"\r\n'):
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerow(row)
+            lines.append(buffer.getvalue())
+        else:
+            lines.append(",".join(map(str, row)) + "\n")
+    return "".join(lines)
+
+
+def _parse_row(values):
+    """Convert CSV string values into a typed history row."""
+    return (values[0], float(values[1]), float(values[2]), float(values[3]))
+
+
+def _split_line(text):
+    """Split one CSV line, using the csv module only when it is quoted."""
+    return next(csv.reader([text])) if '"' in text else text.split(",")
+
+
+def _is_header(line):
+    """Return True for the header line of a history file, with or without the record columns."""
+    return line.startswith(LEGACY_HEADER.rstrip(b"\n"))
+
+
+def _read_records(path, first=1):
+    """Yield the records of a history CSV file, which may be gzip-compressed.
+
+    Rows written before the timestamp and sequence columns existed have no
+    timestamp and are numbered on from the previous row, the first from
+    ``first``.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="", encoding="utf-8") as handle:
+        reader = csv.reader(handle)
+        next(reader, None)
+        sequence = first - 1
+        for values in reader:
+            if len(values) < len(RECORD_FIELDS):
+                sequence += 1
+                yield (*_parse_row(values), None, sequence)
+            else:
+                sequence = int(values[5])
+                yield (*_parse_row(values), float(values[4]) if values[4] else None, sequence)
+
+
+def _has_legacy_header(handle):
+    """Return True unless a history file, open in binary mode, starts with the full record header; rewind it."""
+    legacy = not handle.readline().startswith(HEADER.rstrip(b"\n"))
+    handle.seek(0)
+    return legacy
+
+
+def _read_csv_records(path):
+    """Read a history CSV file into a DataFrame of RECORD_FIELDS.
+
+    Rows written before the timestamp and sequence columns existed get NaN
+    in both, even though the file's header does not name them.
+    """
+    import pandas as pd
+    return pd.read_csv(path, header=None, skiprows=1, names=RECORD_FIELDS)
+
+
+def _timestamps(rows):
+    """Return the timestamp of each row to store: its fifth value if it has one, else the current time."""
+    now = time.time()
+    return [row[4] if len(row) > 4 else now for row in rows]
+
+
+def _stamped_rows(df):
+    """Yield a DataFrame's rows with their timestamps (None where it has none)."""
+    if "timestamp" not in df:
+        for row in df[FIELDNAMES].itertuples(index=False, name=None):
+            yield (*row, None)
+        return
+    for row in df[FIELDNAMES + ["timestamp"]].itertuples(index=False, name=None):
+        yield (*row[:4], None if row[4] is None or math.isnan(row[4]) else row[4])
+
+
+def _with_record_columns(df, first=1):
+    """Add the timestamp (NaN) and sequence (from ``first``) columns a DataFrame lacks; return it with RECORD_FIELDS."""
+    if "timestamp" not in df:
+        df["timestamp"] = math.nan
+    if "sequence" not in df:
+        df["sequence"] = range(first, first + len(df))
+    elif df["sequence"].isna().any():
+        # Rows without a sequence number come first, so their position gives it.
+        df["sequence"] = df["sequence"].where(df["sequence"].notna(), range(first, first + len(df))).astype("int64")
+    return df[RECORD_FIELDS]
+
+
+def _reversed_lines(path, block_size=65536):
+    """Yield the non-empty lines of a file as bytes, last line first.
+
+    The file is read in fixed-size blocks from its end, so the cost depends on
+    how many lines are consumed rather than on the size of the file.
+    """
+    with open(path, "rb") as handle:
+        position = handle.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            handle.seek(position)
+            lines = (handle.read(size) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
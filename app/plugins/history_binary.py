@@ -0,0 +1,283 @@
+"""The ``binary://`` history backend: fixed-width binary columns read through ``numpy.memmap``.
+
+NumPy is only imported when the backend first reads or writes rows.
+"""
+import math
+import os
+import struct
+import time
+from app.plugins.history_aggregates import RunningStats
+from app.plugins.history_backends import FIELDNAMES, RECORD_FIELDS, HistoryBackend, _file_lock, _timestamps
+from app.plugins.history_index import COMPARISONS, CONDITION_FIELDS, OperationNames
+
+
+class BinaryHistoryBackend(HistoryBackend):
+    """History stored as fixed-width binary columns that are read through ``numpy.memmap``.
+
+    The location is a directory with one little-endian file per column:
+    ``operation.u2`` (operation codes, named in ``operations.txt``),
+    ``operand1.f8``, ``operand2.f8``, ``result.f8`` and ``timestamp.f8``
+    (NaN for rows written before timestamps were stored; a row's sequence
+    number is its position plus one). ``length`` holds the number of
+    committed rows. A group commit writes and fsyncs the columns
+    before it moves ``length``, so rows left past it by a crash are never
+    read and are overwritten by the next commit. Files are only appended to
+    or replaced, never shrunk below ``length``, so a mapping stays valid
+    while other processes write.
+
+    Reads map the committed rows and work on the arrays without parsing or
+    copying them; only the rows returned become Python tuples.
+    """
+
+    COLUMNS = (("operation", "<u2"), ("operand1", "<f8"), ("operand2", "<f8"), ("result", "<f8"))
+    # Not part of COLUMNS, which describes the rows reads return.
+    TIMESTAMP = ("timestamp", "<f8")
+    LENGTH = struct.Struct("<q")
+    # Rows scanned at a time when reading backwards or iterating.
+    BLOCK_ROWS = 65536
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.lock_path = os.path.join(directory, "lock")
+        self.length_path = os.path.join(directory, "length")
+        self.operations = OperationNames(os.path.join(directory, "operations.txt"))
+        os.makedirs(directory, exist_ok=True)
+
+    def _locked(self, shared=False):
+        return _file_lock(self.lock_path, shared)
+
+    def _column_path(self, name, dtype):
+        return os.path.join(self.directory, f"{name}.{dtype[1:]}")
+
+    def _length(self):
+        """Return the number of committed rows; call with the lock held."""
+        try:
+            with open(self.length_path, "rb") as handle:
+                return self.LENGTH.unpack(handle.read(self.LENGTH.size))[0]
+        except (FileNotFoundError, struct.error):
+            return 0
+
+    def _write(self, rows):
+        # None (no timestamp) becomes NaN in the float column.
+        return self._append([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows],
+                            [row[3] for row in rows], lambda: _timestamps(rows))
+
+    def append_columns(self, operation, operand1, operand2, result):
+        if len(result):
+            with self._commit_lock:
+                return self._append(operation, operand1, operand2, result, lambda: [time.time()] * len(result))
+        return None
+
+    def _append(self, operations, operand1, operand2, result, stamp):
+        """Commit rows given as columns; ``operations`` is one name for all rows or a list of names.
+
+        ``stamp`` returns the timestamp column; it is called with the lock held.
+        Returns the (before, after) fingerprints.
+        """
+        import numpy as np
+        with self._locked():
+            before = self._fingerprint()
+            self.operations.load()
+            if isinstance(operations, str):
+                codes = np.full(len(result), self.operations.code(operations), dtype="<u2")
+            else:
+                codes = np.array([self.operations.code(operation) for operation in operations], dtype="<u2")
+            length = self._length()
+            for (name, dtype), column in zip(self.COLUMNS + (self.TIMESTAMP,),
+                                             (codes, operand1, operand2, result, stamp())):
+                data = np.ascontiguousarray(column, dtype=dtype).tobytes()
+                descriptor = os.open(self._column_path(name, dtype), os.O_WRONLY | os.O_CREAT, 0o644)
+                try:
+                    itemsize = np.dtype(dtype).itemsize
+                    offset = length * itemsize
+                    start = min(os.fstat(descriptor).st_size // itemsize * itemsize, offset)
+                    if start < offset:
+                        # A directory written before timestamps were stored:
+                        # its rows get NaN.
+                        data = np.full((offset - start) // itemsize, np.nan, dtype=dtype).tobytes() + data
+                    # Drop rows a crash left past the committed length, then append.
+                    os.ftruncate(descriptor, start)
+                    os.pwrite(descriptor, data, start)
+                    os.fsync(descriptor)
+                finally:
+                    os.close(descriptor)
+            descriptor = os.open(self.length_path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.pwrite(descriptor, self.LENGTH.pack(length + len(codes)), 0)
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+            return before, self._fingerprint()
+
+    def _mapped(self):
+        """Return {column: read-only memmap of the committed rows}, or None if there are none.
+
+        ``timestamp`` is left out if the rows predate it.
+        """
+        import numpy as np
+        with self._locked(shared=True):
+            length = self._length()
+            if not length:
+                return None
+            self.operations.load()
+            columns = {name: np.memmap(self._column_path(name, dtype), dtype=dtype, mode="r", shape=(length,))
+                       for name, dtype in self.COLUMNS}
+            path = self._column_path(*self.TIMESTAMP)
+            if os.path.exists(path) and os.path.getsize(path) >= length * 8:
+                columns["timestamp"] = np.memmap(path, dtype=self.TIMESTAMP[1], mode="r", shape=(length,))
+            return columns
+
+    def _rows(self, columns, positions):
+        """Return the rows at ``positions`` (an index array or slice) as tuples."""
+        names = self.operations.names
+        return list(zip([names[code] for code in columns["operation"][positions].tolist()],
+                        columns["operand1"][positions].tolist(), columns["operand2"][positions].tolist(),
+                        columns["result"][positions].tolist()))
+
+    def tail(self, count, offset=0, operation=None):
+        import numpy as np
+        columns = self._mapped()
+        if count <= 0 or columns is None:
+            return []
+        length = len(columns["result"])
+        wanted = offset + count
+        if operation is None:
+            return self._rows(columns, slice(max(length - wanted, 0), max(length - offset, 0)))
+        if operation not in self.operations.names:
+            return []
+        code = self.operations.names.index(operation)
+        # Scan backwards a block at a time, so the cost follows the rows wanted.
+        blocks, found, end = [], 0, length
+        while end > 0 and found < wanted:
+            start = max(end - self.BLOCK_ROWS, 0)
+            positions = np.flatnonzero(columns["operation"][start:end] == code) + start
+            blocks.append(positions)
+            found += len(positions)
+            end = start
+        positions = np.concatenate(blocks[::-1])[-wanted:]
+        return self._rows(columns, positions[:max(len(positions) - offset, 0)])
+
+    def query(self, operation=None, conditions=(), limit=None):
+        import numpy as np
+        columns = self._mapped()
+        if columns is None:
+            return []
+        mask = np.ones(len(columns["result"]), dtype=bool)
+        if operation is not None:
+            if operation not in self.operations.names:
+                return []
+            mask &= columns["operation"] == self.operations.names.index(operation)
+        for field, comparison, value in conditions:
+            if field not in CONDITION_FIELDS or comparison not in COMPARISONS:
+                raise ValueError(f"Invalid condition: {field} {comparison} {value}")
+            mask &= COMPARISONS[comparison](columns[field], value)
+        positions = np.flatnonzero(mask)
+        if limit is not None:
+            positions = positions[max(len(positions) - limit, 0):]
+        return self._rows(columns, positions)
+
+    def fingerprint(self):
+        with self._locked(shared=True):
+            return self._fingerprint()
+
+    def _fingerprint(self):
+        """Return the fingerprint; call with the lock held."""
+        # ``length`` is rewritten by every commit and recreated after a clear.
+        try:
+            stat = os.stat(self.length_path)
+        except FileNotFoundError:
+            return [0, 0]
+        return [self._length(), stat.st_mtime_ns]
+
+    def segments(self):
+        import numpy as np
+        columns = self._mapped()
+        if columns is None:
+            return
+        codes, result = columns["operation"], columns["result"]
+        counts = np.bincount(codes, minlength=len(self.operations.names)).tolist()
+        finite = result[~np.isnan(result)]
+        summary = {"rows": len(result), "operations": {name: count for name, count in zip(self.operations.names, counts)
+                                                       if count},
+                   "min_result": float(finite.min()) if len(finite) else None,
+                   "max_result": float(finite.max()) if len(finite) else None}
+        yield summary, lambda: self._iter_mapped(columns)
+
+    def iter_rows(self):
+        columns = self._mapped()
+        if columns is not None:
+            yield from self._iter_mapped(columns)
+
+    def _iter_mapped(self, columns):
+        """Yield the rows of mapped columns, a block at a time."""
+        for start in range(0, len(columns["result"]), self.BLOCK_ROWS):
+            yield from self._rows(columns, slice(start, start + self.BLOCK_ROWS))
+
+    def iter_records(self):
+        columns = self._mapped()
+        if columns is None:
+            return
+        for start in range(0, len(columns["result"]), self.BLOCK_ROWS):
+            block = slice(start, start + self.BLOCK_ROWS)
+            rows = self._rows(columns, block)
+            if "timestamp" in columns:
+                stamps = [None if math.isnan(stamp) else stamp for stamp in columns["timestamp"][block].tolist()]
+            else:
+                stamps = [None] * len(rows)
+            for sequence, row, stamp in zip(range(start + 1, start + len(rows) + 1), rows, stamps):
+                yield (*row, stamp, sequence)
+
+    def aggregate(self):
+        columns = self._mapped()
+        if columns is None:
+            return {}
+        aggregates = {}
+        codes, result = columns["operation"], columns["result"]
+        for code, name in enumerate(self.operations.names):
+            values = result[codes == code]
+            if len(values):
+                mean = float(values.mean())
+                aggregates[name] = RunningStats(len(values), float(values.sum()), float(values.min()),
+                                                float(values.max()), mean, float(((values - mean) ** 2).sum()))
+        return aggregates
+
+    def load_dataframe(self):
+        import numpy as np
+        import pandas as pd
+        columns = self._mapped()
+        if columns is None:
+            return pd.DataFrame(columns=RECORD_FIELDS)
+        length = len(columns["result"])
+        names = np.array(self.operations.names, dtype=object)
+        return pd.DataFrame({"operation": names[columns["operation"]],
+                             **{name: np.array(columns[name]) for name in FIELDNAMES[1:]},
+                             "timestamp": np.array(columns["timestamp"]) if "timestamp" in columns
+                             else np.full(length, np.nan),
+                             "sequence": np.arange(1, length + 1)})
+
+    def iter_chunks(self, chunksize, dtypes):
+        import pandas as pd
+        columns = self._mapped()
+        if columns is None:
+            return
+        for start in range(0, len(columns["result"]), chunksize):
+            chunk = slice(start, start + chunksize)
+            data = {}
+            for name, dtype in dtypes.items():
+                if name == "operation":
+                    # Every chunk shares the full list of names as its categories.
+                    data[name] = pd.Categorical.from_codes(columns[name][chunk], self.operations.names)
+                else:
+                    data[name] = columns[name][chunk].astype(dtype, copy=False)
+            yield pd.DataFrame(data, index=pd.RangeIndex(start, min(start + chunksize, len(columns["result"]))))
+
+    def clear(self):
+        # Files are removed rather than truncated so that mappings held by
+        # readers stay valid.
+        with self._locked():
+            columns = self.COLUMNS + (self.TIMESTAMP,)
+            for path in [self._column_path(name, dtype) for name, dtype in columns] + [self.length_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.operations.remove()
@@ -0,0 +1,187 @@
+"""Streaming export of history records for downstream analysis.
+
+``export_records`` writes (operation, operand1, operand2, result, timestamp,
+sequence) records, as ``HistoryFacade.iter_records`` yields them, in the
+format named by the output's extension:
+
+* ``.jsonl``: one JSON object per line; NaN, infinities and missing
+  timestamps are null;
+* ``.csv.gz``: gzip-compressed CSV in the history file's own layout;
+* ``.npy``: one structured array with a field per column;
+* ``.npz``: one array per column, as ``np.savez`` stores them.
+
+Records are consumed ``BLOCK_ROWS`` at a time, so memory does not grow with
+the history. The NumPy headers need the row count and the longest operation
+name, which are only known at the end, so those formats first spool the
+columns to temporary files as fixed-width binary and then copy them into
+the output a block at a time. The output is written under a temporary name
+and renamed when complete, so a failed export leaves no partial file.
+"""
+import csv
+import gzip
+import json
+import math
+import os
+import tempfile
+import zipfile
+from itertools import islice
+from app.plugins.history_backends import RECORD_FIELDS
+
+BLOCK_ROWS = 10000
+# Columns after ``operation``, with their dtypes in the NumPy formats; a
+# missing timestamp is NaN.
+NUMERIC_COLUMNS = (("operand1", "<f8"), ("operand2", "<f8"), ("result", "<f8"), ("timestamp", "<f8"),
+                   ("sequence", "<i8"))
+
+
+def export_format(path):
+    """Return the extension naming the export format of ``path``; raise ValueError if it names none."""
+    for extension in WRITERS:
+        if path.endswith(extension):
+            return extension
+    raise ValueError(f"Unknown export format: {path} (use {', '.join(WRITERS)})")
+
+
+def export_records(records, path):
+    """Write history records to ``path`` in the format its extension names; return the rows written."""
+    write = WRITERS[export_format(path)]
+    temp_path = path + ".tmp"
+    try:
+        rows = write(iter(records), temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return rows
+
+
+def _blocks(records):
+    """Yield lists of up to BLOCK_ROWS records."""
+    while True:
+        block = list(islice(records, BLOCK_ROWS))
+        if not block:
+            return
+        yield block
+
+
+def _write_jsonl(records, path):
+    encode = json.JSONEncoder(allow_nan=False).encode
+    rows = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        for block in _blocks(records):
+            handle.write("".join([encode({"operation": operation, "operand1": _finite(operand1),
+                                          "operand2": _finite(operand2), "result": _finite(result),
+                                          "timestamp": timestamp, "sequence": sequence}) + "\n"
+                                  for operation, operand1, operand2, result, timestamp, sequence in block]))
+            rows += len(block)
+    return rows
+
+
+def _finite(value):
+    """Return a float, or None for NaN and infinities (which JSON cannot represent)."""
+    return value if math.isfinite(value) else None
+
+
+def _write_csv_gz(records, path):
+    rows = 0
+    with gzip.open(path, "wt", newline="", encoding="utf-8", compresslevel=6) as handle:
+        writer = csv.writer(handle, lineterminator="\n")
+        writer.writerow(RECORD_FIELDS)
+        for block in _blocks(records):
+            writer.writerows(block)
+            rows += len(block)
+    return rows
+
+
+def _write_npy(records, path):
+    import numpy as np
+    with _ColumnSpool() as spool:
+        spool.extend(records)
+        dtype = np.dtype([("operation", spool.operation_dtype()), *NUMERIC_COLUMNS])
+        with open(path, "wb") as handle:
+            _write_header(handle, dtype, spool.rows)
+            for columns in spool.blocks():
+                block = np.empty(len(columns["operation"]), dtype=dtype)
+                for name, values in columns.items():
+                    block[name] = values
+                handle.write(block.tobytes())
+    return spool.rows
+
+
+def _write_npz(records, path):
+    with _ColumnSpool() as spool:
+        spool.extend(records)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for name, dtype in (("operation", spool.operation_dtype()), *NUMERIC_COLUMNS):
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    _write_header(member, dtype, spool.rows)
+                    for columns in spool.blocks(name):
+                        member.write(columns[name].astype(dtype, copy=False).tobytes())
+    return spool.rows
+
+
+def _write_header(handle, dtype, rows):
+    """Write the .npy header of a one-dimensional array of ``rows`` items."""
+    import numpy as np
+    np.lib.format.write_array_header_1_0(handle, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                  "fortran_order": False, "shape": (rows,)})
+
+
+class _ColumnSpool:
+    """The columns of a record stream in temporary files of fixed-width binary values.
+
+    Operations are stored as codes into ``names`` and turned back into
+    strings when the columns are read.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.names = {}
+        self.rows = 0
+
+    def __enter__(self):
+        for name in ["operation"] + [name for name, _ in NUMERIC_COLUMNS]:
+            self.files[name] = tempfile.TemporaryFile()
+        return self
+
+    def __exit__(self, *exc_info):
+        for handle in self.files.values():
+            handle.close()
+
+    def extend(self, records):
+        """Append records to the column files, a block at a time."""
+        import numpy as np
+        for block in _blocks(records):
+            operations, *columns = zip(*block)
+            codes = [self.names.setdefault(operation, len(self.names)) for operation in operations]
+            self.files["operation"].write(np.array(codes, dtype="<u4").tobytes())
+            for (name, dtype), values in zip(NUMERIC_COLUMNS, columns):
+                # None (no timestamp) becomes NaN.
+                self.files[name].write(np.array(values, dtype=dtype).tobytes())
+            self.rows += len(block)
+
+    def operation_dtype(self):
+        """Return the string dtype wide enough for every operation name."""
+        return f"<U{max(map(len, self.names), default=1) or 1}"
+
+    def blocks(self, *names):
+        """Yield {column: array} for up to BLOCK_ROWS rows at a time, of the given columns (default all)."""
+        import numpy as np
+        dtypes = {"operation": "<u4", **dict(NUMERIC_COLUMNS)}
+        names = names or tuple(dtypes)
+        strings = np.array(list(self.names), dtype=self.operation_dtype())
+        for name in names:
+            self.files[name].seek(0)
+        for start in range(0, self.rows, BLOCK_ROWS):
+            count = min(BLOCK_ROWS, self.rows - start)
+            columns = {}
+            for name in names:
+                itemsize = np.dtype(dtypes[name]).itemsize
+                columns[name] = np.frombuffer(self.files[name].read(count * itemsize), dtype=dtypes[name])
+            if "operation" in columns:
+                columns["operation"] = strings[columns["operation"]]
+            yield columns
+
+
+WRITERS = {".jsonl": _write_jsonl, ".csv.gz": _write_csv_gz, ".npy": _write_npy, ".npz": _write_npz}
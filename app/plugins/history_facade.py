@@ -1,39 +1,336 @@
-import os
-import pandas as pd
+import functools
+import threading
+import time
+from collections import deque
+from app.plugins.history_aggregates import RunningStats, aggregate_rows, load_aggregates, save_aggregates
+from app.plugins.history_backends import history_dtypes, open_backend, rows_per_chunk
+from app.plugins.history_index import row_matches
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
 
 class HistoryFacade:
-    """A facade to abstract loading/appending operations from/to a CSV file."""
-    def __init__(self, csv_file="calc_history.csv"):
+    """A facade to abstract loading/appending operations from/to the history storage.
+
+    The storage backend is chosen from ``csv_file`` (a path, or a
+    ``sqlite://`` or ``segments://`` location) and ``backend`` (``"csv"``,
+    ``"sqlite"`` or ``"segments"``); ``backend_options`` such as the segment
+    bounds are passed on to it.
+    Appends are buffered and written in batches of ``batch_size`` rows, or once
+    ``flush_interval`` seconds have passed since the last write. The newest
+    ``cache_size`` rows are kept in memory so recent history can be shown
+    without reading the storage again.
+
+    ``flush`` may be called from another thread (e.g. a dedicated writer):
+    writes are serialised and queueing new rows never waits for one. Every
+    write the facade makes itself, including the flush before a read, goes
+    through ``run_write``, so a server can run them all on its writer task.
+
+    Rows are stamped with the time the backend writes them, which it stores
+    alongside its own sequence number.
+
+    Per-operation aggregates of the results are updated on every append and
+    kept in a ``<location>.aggregates.json`` sidecar, so ``aggregates`` does
+    not have to read the history. Without a valid sidecar they are stale
+    until ``aggregates`` rebuilds them, which appends never do.
+
+    ``iter_chunks`` streams the history as DataFrames sized to fit
+    ``memory_budget`` bytes, for analysis that must not load it all at once.
+    """
+    def __init__(self, csv_file="calc_history.csv", batch_size=1, flush_interval=None, cache_size=100,
+                 backend=None, backend_options=None, memory_budget=DEFAULT_MEMORY_BUDGET):
         self.csv_file = csv_file
+        self.backend = open_backend(csv_file, backend, **(backend_options or {}))
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self.memory_budget = memory_budget
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._recent = None
+        self._cache_complete = False
+        self._last_flush = time.monotonic()
+        self.aggregates_file = (csv_file.partition("://")[2] or csv_file) + ".aggregates.json"
+        self._aggregates = None
+        self._aggregates_fingerprint = None
+        self._aggregates_loaded = False
+        # Called with each write of the stored history; returns its result.
+        self.run_write = run_here
 
     def load_history(self):
-        """Load history from CSV if it exists; otherwise, return an empty DataFrame."""
-        if os.path.exists(self.csv_file):
-            return pd.read_csv(self.csv_file)
-        return pd.DataFrame(columns=["operation", "operand1", "operand2", "result"])
+        """Load the whole history as a DataFrame (empty if there is none yet)."""
+        self.run_write(self.flush)
+        return self.backend.load_dataframe()
+
+    def iter_chunks(self, usecols=None, float_dtype="float64", chunksize=None):
+        """Yield the history, oldest rows first, as DataFrames with declared dtypes.
+
+        ``operation`` is categorical and the numbers are ``float_dtype``
+        (``"float64"`` or ``"float32"``). Only the ``usecols`` columns are
+        parsed. Each chunk has ``chunksize`` rows, by default as many as fit
+        in ``memory_budget``. Categories differ between chunks, so combine
+        chunks with ``pd.api.types.union_categoricals`` or per-chunk aggregates.
+        """
+        dtypes = history_dtypes(float_dtype, usecols)
+        self.run_write(self.flush)
+        yield from self.backend.iter_chunks(chunksize or rows_per_chunk(self.memory_budget, dtypes), dtypes)
 
     def save_history(self, df):
-        """Save the given DataFrame to CSV, overwriting the file."""
-        df.to_csv(self.csv_file, index=False)
+        """Replace the stored history with the given DataFrame."""
+        self.run_write(functools.partial(self._save_history, df))
+
+    def _save_history(self, df):
+        with self._flush_lock:
+            self._discard_pending()
+            self._recent = None
+            self._aggregates, self._aggregates_loaded = None, True
+            self.backend.save_dataframe(df)
 
     def clear_history(self):
-        """Remove the CSV file if it exists."""
-        if os.path.exists(self.csv_file):
-            os.remove(self.csv_file)
+        """Drop pending rows and remove all stored history."""
+        self.run_write(self._clear_history)
+
+    def _clear_history(self):
+        with self._flush_lock:
+            self._discard_pending()
+            self._recent = deque(maxlen=self.cache_size)
+            self._cache_complete = True
+            self.backend.clear()
+            self._aggregates, self._aggregates_loaded = {}, True
+            self._aggregates_fingerprint = self.backend.fingerprint()
     
     def append_operation(self, operation, operand1, operand2, result):
-        """Appends a single operation row to the CSV."""
-        df = self.load_history()
+        """Queue a single operation row, writing the batch once a threshold is reached."""
+        self.append_operations([(operation, operand1, operand2, result)])
+
+    def append_operations(self, rows):
+        """Queue many (operation, operand1, operand2, result) rows at once."""
+        rows = list(rows)
+        if not self._aggregates_loaded:
+            self._load_aggregates()
+        with self._pending_lock:
+            if self._aggregates is not None:
+                aggregate_rows(rows, self._aggregates)
+            self._pending.extend(rows)
+            pending = len(self._pending)
+            if self._recent is not None:
+                if len(self._recent) + len(rows) > self.cache_size:
+                    self._cache_complete = False
+                self._recent.extend(rows)
+        if pending >= self.batch_size or self._interval_elapsed():
+            self.run_write(self.flush)
+
+    @property
+    def pending_count(self):
+        """Number of queued rows not yet written to the backend."""
+        return len(self._pending)
+
+    def append_columns(self, operation, operand1, operand2, result):
+        """Write one operation's equal-length operand/result columns in a single bulk append.
+
+        The columns may be lists or NumPy arrays; pending rows are flushed first
+        so the history stays in order.
+        """
+        columns = [_as_list(column) for column in (operand1, operand2, result)]
+        self.run_write(functools.partial(self._append_columns, operation, *columns))
+
+    def _append_columns(self, operation, *columns):
+        with self._flush_lock:
+            self.flush()
+            if not self._aggregates_loaded:
+                self._load_aggregates()
+            if self._aggregates is not None:
+                self._aggregates.setdefault(operation, RunningStats()).add_many(columns[2])
+            self._tracked_write(self.backend.append_columns, operation, *columns)
+        if self._recent is not None:
+            newest = zip(*(column[-self.cache_size:] for column in columns))
+            if len(self._recent) + len(columns[2]) > self.cache_size:
+                self._cache_complete = False
+            self._recent.extend((operation, *values) for values in newest)
+
+    def flush(self):
+        """Write all pending rows to the backend in a single append."""
+        with self._flush_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if rows:
+                self._tracked_write(self.backend.append_rows, rows)
+                self._last_flush = time.monotonic()
+
+    def _tracked_write(self, write, *args):
+        """Call a backend write, keeping the aggregates' fingerprint in step with the storage.
+
+        The backend reads the fingerprints around the write under its lock.
+        If the storage changed since the aggregates were last in step (another
+        process wrote to it), they are dropped and rebuilt when next needed.
+        """
+        fingerprints = write(*args)
+        if self._aggregates is None or fingerprints is None:
+            return
+        before, after = fingerprints
+        if before == self._aggregates_fingerprint:
+            self._aggregates_fingerprint = after
+        else:
+            self._aggregates = None
+
+    def _discard_pending(self):
+        """Forget queued rows without writing them."""
+        with self._pending_lock:
+            self._pending = []
+
+    def close(self):
+        """Flush pending rows, save the aggregates and release the backend."""
+        with self._flush_lock:
+            self.flush()
+            if self._aggregates is not None:
+                save_aggregates(self.aggregates_file, self._aggregates, self._aggregates_fingerprint)
+        self.backend.close()
+
+    def aggregates(self):
+        """Return {operation: RunningStats} over the whole history, pending rows included.
+
+        The aggregates are kept up to date as rows are appended, so this
+        normally costs a single fingerprint check. Without a valid sidecar
+        the history is read once to rebuild them.
+        """
+        self.run_write(self.flush)
+        with self._flush_lock:
+            if not self._aggregates_loaded:
+                self._load_aggregates()
+            fingerprint = self.backend.fingerprint()
+            if self._aggregates is None or fingerprint != self._aggregates_fingerprint:
+                self._aggregates = self.backend.aggregate()
+                self._aggregates_fingerprint = fingerprint
+                save_aggregates(self.aggregates_file, self._aggregates, fingerprint)
+            return self._aggregates
+
+    def _load_aggregates(self):
+        """Adopt the sidecar's aggregates if they describe the stored history.
+
+        Otherwise an empty history starts with empty aggregates, and any
+        other leaves them stale for ``aggregates`` to rebuild, so an append
+        never reads the history. Backends without a fingerprint are left to
+        ``aggregates``.
+        """
+        with self._flush_lock:
+            self._aggregates_loaded = True
+            fingerprint = self.backend.fingerprint()
+            if fingerprint is None:
+                return
+            loaded = load_aggregates(self.aggregates_file)
+            if loaded is not None and loaded[1] == fingerprint:
+                self._aggregates, self._aggregates_fingerprint = loaded
+            elif not self.backend.tail(1):
+                self._aggregates, self._aggregates_fingerprint = {}, fingerprint
+
+    def tail(self, count=5, offset=0, operation=None):
+        """Return up to ``count`` of the newest rows, skipping the ``offset`` newest matches.
+
+        Rows are (operation, operand1, operand2, result) tuples, oldest first.
+        ``operation`` restricts the result to a single operation name. Rows are
+        taken from the in-memory cache when it can answer the request;
+        otherwise they are read from the end of the stored history.
+        """
+        if count <= 0:
+            return []
+        if self._recent is None:
+            self.run_write(self.flush)
+            self._recent = deque(self.backend.tail(self.cache_size), maxlen=self.cache_size)
+            self._cache_complete = len(self._recent) < self.cache_size
+        wanted = offset + count
+        matches = [row for row in reversed(self._recent) if operation is None or row[0] == operation]
+        if len(matches) < wanted and not self._cache_complete:
+            self.run_write(self.flush)
+            return self.backend.tail(count, offset, operation)
+        page = matches[offset:wanted]
+        page.reverse()
+        return page
+
+    def iter_rows(self, operation=None, min_result=None, max_result=None):
+        """Lazily yield stored rows, oldest first, optionally filtered.
+
+        Segments whose summary shows they hold no matching row are skipped
+        without being read.
+        """
+        self.run_write(self.flush)
+        for summary, rows in self.backend.segments():
+            if summary is not None and not _may_match(summary, operation, min_result, max_result):
+                continue
+            for row in rows():
+                if operation is not None and row[0] != operation:
+                    continue
+                if min_result is not None and not row[3] >= min_result:
+                    continue
+                if max_result is not None and not row[3] <= max_result:
+                    continue
+                yield row
+
+    def iter_records(self, operation=None, conditions=()):
+        """Lazily yield stored (operation, operand1, operand2, result, timestamp, sequence) records, oldest first.
+
+        ``operation`` and ``conditions`` filter the records as in ``query``.
+        """
+        self.run_write(self.flush)
+        records = self.backend.iter_records()
+        if operation is None and not conditions:
+            yield from records
+            return
+        for record in records:
+            if row_matches(record, operation, conditions):
+                yield record
+
+    def query(self, operation=None, conditions=(), limit=None):
+        """Return the newest ``limit`` rows matching the filters, oldest first.
+
+        ``conditions`` are (field, comparison, value) triples on operand1,
+        operand2 or result, e.g. ``("result", ">=", 2.0)``. The CSV backend
+        answers from its on-disk index instead of reading every row.
+        """
+        self.run_write(self.flush)
+        return self.backend.query(operation, conditions, limit)
+
+    def count(self, operation=None):
+        """Return the number of stored rows, or of rows for one operation.
+
+        Summarised segments are counted from their summaries; only the rest
+        are read.
+        """
+        self.run_write(self.flush)
+        total = 0
+        for summary, rows in self.backend.segments():
+            if summary is not None:
+                total += summary['rows'] if operation is None else summary['operations'].get(operation, 0)
+            else:
+                total += sum(1 for row in rows() if operation is None or row[0] == operation)
+        return total
+
+    def _interval_elapsed(self):
+        """Return True when the time-based flush threshold has been reached."""
+        if self.flush_interval is None:
+            return False
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+
+def run_here(write):
+    """Run a write of the stored history in the calling thread; the default ``run_write``."""
+    return write()
+
 
-        new_row = {
-            "operation": operation,
-            "operand1": operand1,
-            "operand2": operand2,
-            "result": result
-        }
+def _may_match(summary, operation, min_result, max_result):
+    """Return False if a segment summary rules out any row matching the filters."""
+    if operation is not None and not summary['operations'].get(operation):
+        return False
+    if summary['rows'] == 0:
+        return False
+    if min_result is not None and (summary['max_result'] is None or summary['max_result'] < min_result):
+        return False
+    if max_result is not None and (summary['min_result'] is None or summary['min_result'] > max_result):
+        return False
+    return True
 
-        # Instead of df.append(...):
-        new_df = pd.DataFrame([new_row])
-        df = pd.concat([df, new_df], ignore_index=True)
 
-        self.save_history(df)
+def _as_list(column):
+    """Return a flat list of Python numbers from a list or NumPy array."""
+    if hasattr(column, 'ravel'):
+        return column.ravel().tolist()
+    return list(column)
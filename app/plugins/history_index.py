@@ -0,0 +1,216 @@
+"""On-disk index of a CSV history for filtered queries.
+
+``<history>.index`` starts with the byte offset of the CSV up to which rows
+are indexed, followed by one fixed-width record per row: the row's byte
+offset in the CSV, an operation code, operand1, operand2 and result.
+``<history>.index.ops`` lists the operation names, one per line; a name's
+line number is its code.
+
+The CSV backend adds records for each batch it appends. If the index falls
+behind (it is missing, or the CSV was written without it) appends leave it
+alone and the next query indexes the missing rows. Queries filter the
+columns with NumPy and then seek to the matching rows in the CSV.
+"""
+import csv
+import operator
+import os
+import struct
+
+HEADER = struct.Struct("<q")
+RECORD = struct.Struct("<qHddd")
+INDEX_DTYPE = [("offset", "<i8"), ("operation", "<u2"), ("operand1", "<f8"), ("operand2", "<f8"),
+               ("result", "<f8")]
+
+# Numeric fields a query condition may compare, and the comparisons allowed.
+CONDITION_FIELDS = ("operand1", "operand2", "result")
+COMPARISONS = {"<": operator.lt, "<=": operator.le, "=": operator.eq, ">=": operator.ge, ">": operator.gt}
+
+
+def row_matches(row, operation=None, conditions=()):
+    """Return True if a history row matches the operation and every (field, comparison, value) condition."""
+    if operation is not None and row[0] != operation:
+        return False
+    return all(COMPARISONS[comparison](row[1 + CONDITION_FIELDS.index(field)], value)
+               for field, comparison, value in conditions)
+
+
+class OperationNames:
+    """Append-only list of operation names in a text file; a name's line number is its code.
+
+    Used by the binary formats, which store a small integer per row instead
+    of the name. Writes need the owning history's exclusive lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.names = []
+        self._stamp = None
+
+    def load(self):
+        """Read the names again if another writer may have changed them."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.names, self._stamp = [], None
+            return
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp != self._stamp:
+            with open(self.path, encoding="utf-8") as names:
+                self.names = names.read().splitlines()
+            self._stamp = stamp
+
+    def code(self, operation):
+        """Return the code of an operation name, registering new names."""
+        try:
+            return self.names.index(operation)
+        except ValueError:
+            with open(self.path, "a", encoding="utf-8") as names:
+                names.write(operation.replace("\n", " ") + "\n")
+            self.names.append(operation)
+            self._stamp = None
+            return len(self.names) - 1
+
+    def remove(self):
+        """Delete the names file."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.names, self._stamp = [], None
+
+
+class CsvIndex:
+    """The index of one CSV history file.
+
+    Every method that writes must be called with the history's exclusive
+    file lock held; ``query`` needs at least the shared lock.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.path = csv_path + ".index"
+        self.operations = OperationNames(csv_path + ".index.ops")
+
+    def appended(self, start, data):
+        """Index rows just written as ``data`` at byte ``start`` of the CSV, if the index is up to date."""
+        if start != 0 and not os.path.exists(self.path):
+            return
+        with self._open() as index:
+            if start == 0:
+                # A new CSV: whatever was indexed before describes another file.
+                index.truncate(0)
+            end, _ = self._read_state(index)
+            if end != start:
+                return
+            self._write_records(index, start, data.splitlines(keepends=True))
+
+    def update(self):
+        """Index any rows of the CSV that are not indexed yet (all of them if the CSV was rewritten)."""
+        try:
+            size = os.path.getsize(self.csv_path)
+        except FileNotFoundError:
+            self.remove()
+            return
+        with self._open() as index:
+            end, _ = self._read_state(index)
+            if end > size:
+                # The CSV was replaced or truncated, so start over.
+                index.truncate(0)
+                end = 0
+            if end == size:
+                return
+            with open(self.csv_path, "rb") as history:
+                history.seek(end)
+                self._write_records(index, end, history)
+
+    def remove(self):
+        """Delete the index files."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.operations.remove()
+
+    def query(self, operation=None, conditions=(), limit=None):
+        """Return the newest ``limit`` rows matching the filters, oldest first."""
+        import numpy as np
+        self.operations.load()
+        try:
+            count = (os.path.getsize(self.path) - HEADER.size) // RECORD.size
+        except FileNotFoundError:
+            return []
+        if count <= 0:
+            return []
+        records = np.memmap(self.path, dtype=np.dtype(INDEX_DTYPE), mode="r", offset=HEADER.size, shape=(count,))
+        mask = np.ones(count, dtype=bool)
+        if operation is not None:
+            if operation not in self.operations.names:
+                return []
+            mask &= records["operation"] == self.operations.names.index(operation)
+        for field, comparison, value in conditions:
+            mask &= COMPARISONS[comparison](records[field], value)
+        positions = np.flatnonzero(mask)
+        if limit is not None:
+            positions = positions[max(len(positions) - limit, 0):]
+        offsets = records["offset"][positions].tolist()
+        del records
+        rows = []
+        with open(self.csv_path, "rb") as history:
+            for offset in offsets:
+                history.seek(offset)
+                rows.append(_parse_line(history.readline()))
+        return rows
+
+    def _open(self):
+        """Open the index for reading and writing in place, creating it if needed."""
+        return os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+
+    def _read_state(self, index):
+        """Return (indexed CSV end, record count), first dropping records past the indexed end.
+
+        Such records (or a torn one) are left by a crash between writing
+        records and moving the end; the rows are indexed again.
+        """
+        index.seek(0, os.SEEK_END)
+        size = index.tell()
+        if size < HEADER.size:
+            index.truncate(0)
+            index.seek(0)
+            index.write(HEADER.pack(0))
+            index.flush()
+            return 0, 0
+        index.seek(0)
+        end = HEADER.unpack(index.read(HEADER.size))[0]
+        count, torn = divmod(size - HEADER.size, RECORD.size)
+        valid = count
+        while valid:
+            index.seek(HEADER.size + (valid - 1) * RECORD.size)
+            if RECORD.unpack(index.read(RECORD.size))[0] < end:
+                break
+            valid -= 1
+        if torn or valid != count:
+            index.truncate(HEADER.size + valid * RECORD.size)
+        return end, valid
+
+    def _write_records(self, index, position, lines):
+        """Append records for CSV ``lines`` starting at byte ``position`` and move the indexed end past them."""
+        self.operations.load()
+        records = []
+        for line in lines:
+            if not line.endswith(b"\n"):
+                # A row still being written by another process; index it next time.
+                break
+            if position != 0 and line.strip():
+                operation, operand1, operand2, result = _parse_line(line)
+                records.append(RECORD.pack(position, self.operations.code(operation), operand1, operand2, result))
+            position += len(line)
+        index.seek(0, os.SEEK_END)
+        index.write(b"".join(records))
+        # The end is moved only after the records are written; see _read_state.
+        index.flush()
+        index.seek(0)
+        index.write(HEADER.pack(position))
+        index.flush()
+
+
+def _parse_line(line):
+    """Parse one CSV history line (bytes) into a typed row."""
+    text = line.decode("utf-8").rstrip("\r\n")
+    values = next(csv.reader([text])) if '"' in text else text.split(",")
+    return values[0], float(values[1]), float(values[2]), float(values[3])
@@ -0,0 +1,250 @@
+"""The ``segments://`` history backend: a directory of bounded CSV segments.
+
+Sealed segments are gzip-compressed and summarised (see ``summarize``), so
+tail reads and aggregates only open the segments they need. The active
+segment is a CSV history file like the one ``CsvHistoryBackend`` writes.
+"""
+import csv
+import gzip
+import json
+import math
+import os
+import re
+from contextlib import ExitStack
+from app.plugins.history_backends import (RECORD_FIELDS, CsvHistoryBackend, HistoryBackend, _BoundedReader,
+                                          _count_lines, _has_legacy_header, _is_header, _parse_row,
+                                          _read_csv_chunks, _read_csv_records, _read_records, _split_line,
+                                          _with_record_columns)
+
+
+class SegmentedHistoryBackend(CsvHistoryBackend):
+    """History stored in a directory of bounded CSV segments.
+
+    New rows go to ``current.csv``. Once it holds ``max_rows`` rows or
+    ``max_bytes`` bytes it is sealed: renamed to ``segment-NNNNNN.csv``,
+    compressed to ``segment-NNNNNN.csv.gz`` and summarised in
+    ``segment-NNNNNN.json`` (see ``summarize``). Tail reads start from the
+    newest segment and only open older ones when they need more rows.
+
+    A segment may overrun its bound by one batch, since batches are never
+    split. Sequence numbers run on across segments; each summary records
+    the last one of its segment.
+    """
+
+    OPTIONS = ("max_rows", "max_bytes")
+    ACTIVE = "current.csv"
+    SEGMENT = re.compile(r"segment-(\d+)\.(csv|csv\.gz|json)$")
+
+    def __init__(self, directory, max_rows=100000, max_bytes=16 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(os.path.join(directory, self.ACTIVE))
+        # Queries read the summaries and segments rather than an index.
+        self.index = None
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        # Size and row count of the active segment as last seen by this process.
+        self._active_end = None
+        self._active_rows = 0
+
+    def _append_text(self, render):
+        with self._locked():
+            before = self.fingerprint()
+            start, end, rows = self._append_locked(render)
+            if start == self._active_end:
+                self._active_rows += rows
+            else:
+                # First write, or another process wrote in between.
+                self._active_rows = _count_lines(self.path) - 1
+            self._active_end = end
+            if self._active_rows >= self.max_rows or end >= self.max_bytes:
+                self._seal()
+            return before, self.fingerprint()
+
+    def _seal(self):
+        """Turn the active segment into the next compressed, summarised segment; the caller holds the lock."""
+        number = max(self._segment_numbers(), default=0) + 1
+        base = os.path.join(self.directory, f"segment-{number:06d}")
+        sequence = self._initial_sequence() - 1
+        # Renaming first means a crash leaves a complete (if uncompressed)
+        # segment, and new rows start a fresh active file straight away.
+        os.replace(self.path, base + ".csv")
+        self._active_end, self._active_rows = None, 0
+        summary = summarize(())
+        summary["last_sequence"] = None
+        with open(base + ".csv", "rb") as source, gzip.open(base + ".csv.gz.tmp", "wb", compresslevel=6) as target:
+            for line in source:
+                target.write(line)
+                if not _is_header(line):
+                    values = _split_line(line.decode("utf-8").rstrip("\n"))
+                    _add_to_summary(summary, _parse_row(values))
+                    # Rows written before sequence numbers are numbered in order.
+                    sequence = int(values[5]) if len(values) >= len(RECORD_FIELDS) else sequence + 1
+                    summary["last_sequence"] = sequence
+        with open(base + ".json.tmp", "w", encoding="utf-8") as handle:
+            json.dump(summary, handle)
+        os.replace(base + ".json.tmp", base + ".json")
+        os.replace(base + ".csv.gz.tmp", base + ".csv.gz")
+        os.remove(base + ".csv")
+
+    def _initial_sequence(self):
+        # Continue from the newest sealed segment. Segments sealed before
+        # sequence numbers existed are numbered from the first row.
+        sealed = self._sealed()
+        if not sealed:
+            return 1
+        summary = _read_summary(sealed[-1][1])
+        if summary is not None and summary.get("last_sequence") is not None:
+            return summary["last_sequence"] + 1
+        rows = 0
+        for path, summary_path in sealed:
+            summary = _read_summary(summary_path)
+            rows += summary["rows"] if summary is not None else sum(1 for _ in _read_segment(path))
+        return rows + 1
+
+    def _segment_numbers(self):
+        """Return the numbers of every sealed segment, including partly written ones."""
+        numbers = set()
+        for name in os.listdir(self.directory):
+            match = self.SEGMENT.match(name)
+            if match:
+                numbers.add(int(match.group(1)))
+        return numbers
+
+    def _sealed(self):
+        """Return (data path, summary path) of each sealed segment, oldest first."""
+        sealed = []
+        for number in sorted(self._segment_numbers()):
+            base = os.path.join(self.directory, f"segment-{number:06d}")
+            for path in (base + ".csv.gz", base + ".csv"):
+                if os.path.exists(path):
+                    sealed.append((path, base + ".json"))
+                    break
+        return sealed
+
+    def tail(self, count, offset=0, operation=None):
+        if count <= 0:
+            return []
+        wanted = offset + count
+        with self._locked(shared=True):
+            rows = self._newest_rows(wanted, operation)
+            for path, summary_path in reversed(self._sealed()):
+                if len(rows) >= wanted:
+                    break
+                summary = _read_summary(summary_path)
+                if summary is not None and operation is not None and not summary["operations"].get(operation):
+                    continue
+                matches = [row for row in _read_segment(path) if operation is None or row[0] == operation]
+                rows.extend(reversed(matches[-(wanted - len(rows)):]))
+        rows = rows[offset:wanted]
+        rows.reverse()
+        return rows
+
+    # Segments have no index, so queries read them (using the summaries).
+    query = HistoryBackend.query
+
+    def fingerprint(self):
+        return [super().fingerprint(), sorted(self._segment_numbers())]
+
+    def segments(self):
+        with self._locked(shared=True):
+            sealed = self._sealed()
+        for path, summary_path in sealed:
+            yield _read_summary(summary_path), lambda path=path: _read_segment(path)
+        yield None, super().iter_rows
+
+    def iter_rows(self):
+        for _, rows in self.segments():
+            yield from rows()
+
+    def iter_records(self):
+        with self._locked(shared=True):
+            paths = [path for path, _ in self._sealed()] + [self.path]
+        sequence = 0
+        for path in paths:
+            if os.path.exists(path):
+                for record in _read_records(path, sequence + 1):
+                    sequence = record[5]
+                    yield record
+
+    def clear(self):
+        with self._locked():
+            for name in os.listdir(self.directory):
+                if self.SEGMENT.match(name) or name == self.ACTIVE:
+                    os.remove(os.path.join(self.directory, name))
+            self._active_end, self._active_rows = None, 0
+
+    def load_dataframe(self):
+        import pandas as pd
+        frames, first = [], 1
+        with self._locked(shared=True):
+            paths = [path for path, _ in self._sealed()]
+            if os.path.exists(self.path):
+                paths.append(self.path)
+            for path in paths:
+                frame = _with_record_columns(_read_csv_records(path), first)
+                frames.append(frame)
+                if len(frame):
+                    first = int(frame["sequence"].iloc[-1]) + 1
+        if not frames:
+            return pd.DataFrame(columns=RECORD_FIELDS)
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_chunks(self, chunksize, dtypes):
+        with ExitStack() as stack:
+            with self._locked(shared=True):
+                # Open every part up front so a concurrent seal or clear cannot
+                # remove files from under the iteration.
+                sources = []
+                for path, _ in self._sealed():
+                    opener = gzip.open if path.endswith(".gz") else open
+                    source = stack.enter_context(opener(path, "rb"))
+                    sources.append((source, _has_legacy_header(source)))
+                if os.path.exists(self.path):
+                    active = stack.enter_context(open(self.path, "rb"))
+                    sources.append((_BoundedReader(active, os.fstat(active.fileno()).st_size),
+                                    _has_legacy_header(active)))
+            for source, legacy in sources:
+                yield from _read_csv_chunks(source, chunksize, dtypes, legacy)
+
+    def save_dataframe(self, df):
+        HistoryBackend.save_dataframe(self, df)
+
+
+def summarize(rows):
+    """Return a segment summary: row count, rows per operation and the min/max result."""
+    summary = {"rows": 0, "operations": {}, "min_result": None, "max_result": None}
+    for row in rows:
+        _add_to_summary(summary, row)
+    return summary
+
+
+def _add_to_summary(summary, row):
+    """Account for one row in a summary built by ``summarize``."""
+    operation, result = row[0], row[3]
+    summary["rows"] += 1
+    summary["operations"][operation] = summary["operations"].get(operation, 0) + 1
+    if not math.isnan(result):
+        if summary["min_result"] is None or result < summary["min_result"]:
+            summary["min_result"] = result
+        if summary["max_result"] is None or result > summary["max_result"]:
+            summary["max_result"] = result
+
+
+def _read_summary(path):
+    """Return a segment's summary, or None if it has none (e.g. after a crash while sealing)."""
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def _read_segment(path):
+    """Yield the rows of a sealed segment, which may be gzip-compressed."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="", encoding="utf-8") as handle:
+        reader = csv.reader(handle)
+        next(reader, None)
+        for values in reader:
+            yield _parse_row(values)
@@ -5,12 +5,22 @@ class MenuCommand(Command):
     def execute(self):
         logging.info("MenuCommand: Displaying available commands")
         print("Available commands:")
-        print("  addition   -> Adds two numbers")
-        print("  subtraction   -> Subtracts two numbers")
-        print("  multplication   -> Multiplies two numbers")
-        print("  division   -> Divides two numbers")
+        print("  addition [a] [b]   -> Adds two numbers")
+        print("  subtraction [a] [b]   -> Subtracts two numbers")
+        print("  multplication [a] [b]   -> Multiplies two numbers")
+        print("  division [a] [b]   -> Divides two numbers")
+        print("  eval [expression] [name=value...]  -> Evaluates e.g. eval 2 * (x + 3) / y x=4 y=2")
         print("  exit  -> Exits the application")
         print("  menu  -> Displays this menu")
-        print("  showhistory  -> Shows history(last 5 calculations)")
+        print("  showhistory [count] [offset] [operation]  -> Shows history(last 5 calculations by default)")
+        print("  queryhistory [filters...]  -> Shows calculations matching e.g. operation=division result>=2 limit=10")
+        print("  mergehistory [output] [inputs...]  -> Merges history files into a new one in time order")
+        print("  exporthistory [output] [filters...]  -> Exports history to .jsonl, .csv.gz, .npy or .npz")
         print("  clearhistory  -> Clears history")
+        print("  recent [count]  -> Shows this session's last calculations from memory (10 by default)")
+        print("  summary [operation]  -> Shows count, sum, mean, std, min and max of the results")
+        print("  stats  -> Shows per-command latency stats (CALC_STATS=1)")
+        print("  profile [on|off]  -> Writes cProfile/tracemalloc reports per command to logs/profiles")
+        print("Chain commands with ';' and use '_' for the previous result, e.g. addition 3 4; division _ 2")
+        print("Use 'last' or '!N' for this session's newest or Nth newest result, e.g. multiplication !2 last")
 
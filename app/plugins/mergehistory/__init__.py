@@ -0,0 +1,33 @@
+import time
+import logging
+from app.commands import Argument, Command
+from app.plugins.history_backends import merge_histories
+
+class MergeHistoryCommand(Command):
+    """
+    Merge history files (e.g. written by calculators on several hosts) into a new one, in time order.
+
+    Usage: mergehistory OUTPUT INPUT..., e.g. mergehistory merged.csv host1.csv sqlite://host2.db
+    Inputs are streamed, so memory depends on their number rather than their size.
+    """
+    arguments = (Argument("output", str), Argument("inputs", str, True))
+
+    def execute(self, *args):
+        if len(args) < 2:
+            print("Usage: mergehistory OUTPUT INPUT...")
+            return
+        output, *inputs = args
+        if self.history is not None and self.history.csv_file in inputs:
+            # Include rows this session has not written yet.
+            self.history.run_write(self.history.flush)
+        start = time.perf_counter()
+        try:
+            rows = merge_histories(inputs, output)
+        except (OSError, ValueError) as e:
+            logging.error("MergeHistoryCommand: merging into %s failed: %s", output, e)
+            print(f"Merge failed: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        logging.info("MergeHistoryCommand: merged %s rows from %s files into %s.", rows, len(inputs), output)
+        print(f"Merged {rows} rows from {len(inputs)} files into {output} in {elapsed:.2f} s "
+              f"({rows / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -0,0 +1,25 @@
+import logging
+from app.commands import Argument, Command
+
+class ProfileCommand(Command):
+    """
+    Turn profiling mode on or off, or show whether it is on.
+
+    Usage: profile [on|off]
+    """
+    arguments = (Argument("mode"),)
+
+    def execute(self, mode=None):
+        if self.profiler is None:
+            print("Profiling is not available.")
+            return
+        if mode == "on":
+            self.profiler.start()
+        elif mode == "off":
+            self.profiler.stop()
+        elif mode is not None:
+            print("Usage: profile [on|off]")
+            return
+        state = "on" if self.profiler.active else "off"
+        print(f"Profiling is {state}. Reports are written to {self.profiler.directory}.")
+        logging.info("ProfileCommand: profiling is %s.", state)
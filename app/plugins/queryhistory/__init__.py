@@ -0,0 +1,62 @@
+import os
+import re
+import logging
+from app.commands import Argument, Command
+from app.plugins.history_facade import HistoryFacade
+from app.plugins.history_index import COMPARISONS
+from app.plugins.showhistory import format_rows
+
+FILTER = re.compile(r"(operation|operand1|operand2|result|limit)(>=|<=|=|>|<)(.+)")
+DEFAULT_LIMIT = 20
+
+class QueryHistoryCommand(Command):
+    """
+    Show the most recent calculations matching filters (the last 20 by default).
+
+    Usage: queryhistory [filters...]
+    Filters: operation=NAME, operand1/operand2/result with <, <=, =, >=, >, and limit=N,
+    e.g. queryhistory operation=division result>=2 limit=10
+    """
+    arguments = (Argument("filters", str, True),)
+
+    def execute(self, *filters):
+        try:
+            operation, conditions, limit = parse_filters(filters)
+        except ValueError as e:
+            logging.error("QueryHistoryCommand: %s", e)
+            print(e)
+            return
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+
+        rows = facade.query(operation, conditions, limit)
+        if not rows:
+            print("No matching calculations.")
+        else:
+            print(f"\n{len(rows)} Matching Calculations:\n" + format_rows(rows), "\n")
+
+        logging.info("QueryHistoryCommand: displayed %s calculations.", len(rows))
+
+
+def parse_filters(filters, allow_limit=True):
+    """Turn filter tokens into (operation, conditions, limit); raise ValueError on a bad token.
+
+    Without ``allow_limit`` a ``limit=N`` token is a bad token.
+    """
+    operation, conditions, limit = None, [], DEFAULT_LIMIT
+    for token in filters:
+        match = FILTER.fullmatch(token)
+        if match is None:
+            raise ValueError(f"Invalid filter: {token}")
+        field, comparison, value = match.groups()
+        try:
+            if field == "operation" and comparison == "=":
+                operation = value
+            elif field == "limit" and allow_limit and comparison == "=" and int(value) > 0:
+                limit = int(value)
+            elif field not in ("operation", "limit") and comparison in COMPARISONS:
+                conditions.append((field, comparison, float(value)))
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid filter: {token}") from None
+    return operation, conditions, limit
@@ -0,0 +1,27 @@
+import logging
+from app.commands import Argument, Command
+from app.plugins.history_backends import FIELDNAMES
+
+class RecentCommand(Command):
+    """
+    Show this session's most recent calculations from memory (the last 10 by default).
+
+    Each row is labelled with the !N token that recalls its result as an operand.
+
+    Usage: recent [count]
+    """
+    arguments = (Argument("count", int),)
+
+    def execute(self, count=10):
+        if self.session is None:
+            print("Session history is not available.")
+            return
+        entries = self.session.recent(max(count, 0))
+        if not entries:
+            print("No calculations in this session yet.")
+        else:
+            table = [["recall", *FIELDNAMES]] + [[f"!{n}", *(str(value) for value in entry)] for n, *entry in entries]
+            widths = [max(len(line[i]) for line in table) for i in range(len(table[0]))]
+            print("\n" + "\n".join("  ".join(value.rjust(width) for value, width in zip(line, widths))
+                                   for line in table), "\n")
+        logging.info("RecentCommand: displayed %s calculations.", len(entries))
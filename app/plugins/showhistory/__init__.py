@@ -1,23 +1,43 @@
 import os
 import logging
-from app.commands import Command
+from app.commands import Argument, Command
+from app.plugins.history_backends import FIELDNAMES
 from app.plugins.history_facade import HistoryFacade
 
 class ShowHistoryCommand(Command):
     """
-    Show the last 5 calculations from the CSV (if any).
+    Show the most recent calculations from the history (the last 5 by default).
+
+    Usage: showhistory [count] [offset] [operation]
     """
+    arguments = (Argument("count", int), Argument("offset", int), Argument("operation"))
 
-    def execute(self):
-        csv_file = os.getenv("CALC_HISTORY_FILE", "calc_history.csv")
-        facade = HistoryFacade(csv_file)
+    def execute(self, count=5, offset=0, operation=None):
+        try:
+            count, offset = int(count), int(offset)
+        except ValueError:
+            logging.error("ShowHistoryCommand: Invalid count or offset")
+            print("Invalid input. Count and offset must be whole numbers.")
+            return
+        if count <= 0 or offset < 0:
+            logging.error("ShowHistoryCommand: Count %s or offset %s out of range", count, offset)
+            print("Invalid input. Count must be at least 1 and offset at least 0.")
+            print("Usage: showhistory [count] [offset] [operation]")
+            return
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
 
-        df = facade.load_history()
-        if df.empty:
+        rows = facade.tail(count, offset, operation)
+        if not rows:
             print("No history yet.")
         else:
-            # Display only the last 5 rows
-            last_five = df.tail(5)
-            print("\nLast 5 Calculations:\n", last_five, "\n")
+            title = f"Last {len(rows)} Calculations" + (f" ({operation})" if operation else "")
+            print(f"\n{title}:\n" + format_rows(rows), "\n")
+
+        logging.info("ShowHistoryCommand: displayed %s calculations.", len(rows))
+
 
-        logging.info("ShowHistoryCommand: displayed last 5 calculations.")
+def format_rows(rows):
+    """Render history rows as a right-aligned text table."""
+    table = [FIELDNAMES] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(FIELDNAMES))]
+    return "\n".join("  ".join(value.rjust(width) for value, width in zip(line, widths)) for line in table)
@@ -0,0 +1,30 @@
+import logging
+from app.commands import Command
+
+COLUMNS = ('calls', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+
+class StatsCommand(Command):
+    """
+    Show call counts, error counts and latency percentiles per command and per history operation.
+
+    Stats are only collected when CALC_STATS is enabled.
+    """
+
+    def execute(self):
+        if self.stats is None:
+            print("Stats are disabled. Set CALC_STATS=1 to collect them.")
+            return
+        snapshot = self.stats.snapshot()
+        print("\n" + format_table("command", snapshot['commands']))
+        print("\n" + format_table("history", snapshot['history']), "\n")
+        logging.info("StatsCommand: displayed stats for %s commands.", len(snapshot['commands']))
+
+
+def format_table(title, summaries):
+    """Render {name: summary} as a right-aligned text table."""
+    table = [[title, *COLUMNS]]
+    for name, summary in summaries.items():
+        table.append([name] + [f"{summary[column]:.3f}" if column.endswith('_ms') else str(summary[column])
+                               for column in COLUMNS])
+    widths = [max(len(line[i]) for line in table) for i in range(len(table[0]))]
+    return "\n".join("  ".join(value.rjust(width) for value, width in zip(line, widths)) for line in table)
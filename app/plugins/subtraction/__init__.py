@@ -1,19 +1,40 @@
 import os
 import logging
-from app.commands import Command
+from app.commands import FAILED, Argument, Command
+from app.log_pipeline import CALCULATION
 from app.plugins.history_facade import HistoryFacade
 
 class SubtractCommand(Command):
-    def execute(self):
+    arguments = (Argument("a", float), Argument("b", float))
+    operation = "subtraction"
+
+    def calculate(self, a, b):
+        """Return a minus b."""
+        return a - b
+
+    def execute_batch(self, a, b):
+        """Subtract array b from a element-wise and record every result in history."""
+        import numpy as np
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+        result = self.calculate(a, b)
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+        facade.append_columns(self.operation, a, b, result)
+        return result
+
+    def execute(self, a=None, b=None):
+        """Run the calculation, prompting for any operand not given inline; return the result, or FAILED."""
         try:
-            a = float(input("Enter first number: "))
-            b = float(input("Enter second number: "))
-            result = a - b
-            logging.info("SubtractCommand: %s - %s = %s", a, b, result)
+            a = float(input("Enter first number: ")) if a is None else a
+            b = float(input("Enter second number: ")) if b is None else b
+            result = self.calculate(a, b)
+            logging.info("SubtractCommand: %s - %s = %s", a, b, result, extra=CALCULATION)
             print(f"Result: {result}")
-            csv_file = os.getenv("CALC_HISTORY_FILE", "calc_history.csv")
-            facade = HistoryFacade(csv_file)
-            facade.append_operation("subtraction", a, b, result)
+            facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+            facade.append_operation(self.operation, a, b, result)
+            if self.session is not None:
+                self.session.record(self.operation, a, b, result)
+            return result
         except ValueError:
             logging.error("SubtractCommand: Invalid input encountered")
             print("Invalid input. Please enter numeric values.")
+            return FAILED
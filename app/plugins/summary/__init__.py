@@ -0,0 +1,39 @@
+import os
+import logging
+from app.commands import Argument, Command
+from app.plugins.history_facade import HistoryFacade
+
+COLUMNS = ("operation", "count", "sum", "mean", "std", "min", "max")
+
+class SummaryCommand(Command):
+    """
+    Show the count, sum, mean, standard deviation, min and max of the results per operation.
+
+    Usage: summary [operation]
+    """
+    arguments = (Argument("operation"),)
+
+    def execute(self, operation=None):
+        facade = self.history or HistoryFacade(os.getenv("CALC_HISTORY_FILE", "calc_history.csv"))
+
+        aggregates = facade.aggregates()
+        if operation is not None:
+            aggregates = {name: stats for name, stats in aggregates.items() if name == operation}
+        aggregates = {name: stats for name, stats in aggregates.items() if stats.count}
+        if not aggregates:
+            print("No history yet.")
+        else:
+            total = sum(stats.count for stats in aggregates.values())
+            print(f"\nSummary of {total} calculations:\n" + format_summary(aggregates), "\n")
+
+        logging.info("SummaryCommand: summarised %s operations.", len(aggregates))
+
+
+def format_summary(aggregates):
+    """Render {operation: RunningStats} as a right-aligned text table."""
+    table = [COLUMNS]
+    for name, stats in sorted(aggregates.items()):
+        values = (stats.total, stats.mean, stats.variance ** 0.5, stats.minimum, stats.maximum)
+        table.append((name, str(stats.count), *(f"{value:.6g}" for value in values)))
+    widths = [max(len(line[i]) for line in table) for i in range(len(COLUMNS))]
+    return "\n".join("  ".join(value.rjust(width) for value, width in zip(line, widths)) for line in table)
@@ -0,0 +1,104 @@
+"""Profiling mode: cProfile and tracemalloc reports for each command line.
+
+While a Profiler is running, ``CommandHandler.execute_command`` is replaced
+on that handler instance by a wrapper that profiles the call and writes a
+report of the top functions and top allocation sites to its directory.
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import re
+import time
+import tracemalloc
+
+
+class Profiler:
+    """Write a hotspot and allocation report per profiled call."""
+    def __init__(self, command_handler, directory='logs/profiles', top=20):
+        self.command_handler = command_handler
+        self.directory = directory
+        self.top = top
+        self.reports = 0
+        self._started_tracemalloc = False
+
+    @property
+    def active(self):
+        """True while command lines are being profiled."""
+        return 'execute_command' in vars(self.command_handler)
+
+    def start(self):
+        """Profile every command line run by the handler from now on."""
+        if self.active:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        execute_command = self.command_handler.execute_command
+
+        @functools.wraps(execute_command)
+        def profiled(command_line):
+            return self.run(command_line, execute_command, command_line)
+
+        self.command_handler.execute_command = profiled
+        logging.info("Profiling enabled, reports in %s.", self.directory)
+
+    def stop(self):
+        """Stop profiling and restore the handler's own execute_command."""
+        if not self.active:
+            return
+        del self.command_handler.execute_command
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        logging.info("Profiling disabled.")
+
+    def run(self, label, function, *args):
+        """Call ``function(*args)`` under cProfile and tracemalloc and write a report named after ``label``."""
+        # Allocations are only reported if tracemalloc was tracing when the call began.
+        before = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            before = _snapshot()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            allocations = None
+            # A 'profile off' line stops tracemalloc before its own report is written.
+            if before is not None and tracemalloc.is_tracing():
+                _, peak = tracemalloc.get_traced_memory()
+                allocations = (peak, _snapshot().compare_to(before, 'lineno'))
+            self.write_report(label, elapsed, profile, allocations)
+
+    def write_report(self, label, elapsed, profile, allocations):
+        """Write one report file and return its path."""
+        self.reports += 1
+        name = re.sub(r'[^\w.-]+', '_', label.split(';')[0].strip())[:40] or 'empty'
+        path = os.path.join(self.directory, f"{self.reports:05d}-{name}.txt")
+        report = io.StringIO()
+        report.write(f"command: {label}\nwall time: {elapsed * 1000:.3f} ms\n")
+        if allocations is not None:
+            peak, differences = allocations
+            report.write(f"peak traced memory: {peak / 1024:.1f} KiB\n")
+        report.write(f"\nTop {self.top} functions by cumulative time:\n")
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(self.top)
+        if allocations is not None:
+            report.write(f"Top {self.top} allocation sites:\n")
+            for difference in differences[:self.top]:
+                report.write(f"  {difference}\n")
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(report.getvalue())
+        return path
+
+
+def _snapshot():
+    """Take a tracemalloc snapshot without tracemalloc's own allocations."""
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
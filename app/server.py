@@ -0,0 +1,233 @@
+"""Asyncio socket server sharing one CommandHandler between many clients.
+
+Clients send one command line at a time (the same syntax as the REPL,
+including ``;`` chains) and receive the command's printed output followed by
+a line holding a single ``.``. Output lines that start with a ``.`` are sent
+with an extra leading ``.``, as in SMTP. Sending ``exit`` closes the
+connection.
+
+Each line runs in a worker thread, so a slow command does not hold up other
+clients. Its output is captured through a ``sys.stdout`` stand-in that writes
+to the buffer of the line running in the current context. Each client has
+its own LineState: its own ``_`` and its own SessionHistory for ``last``,
+``!N`` and ``recent``. Calculations only queue history rows in memory. A
+single writer task runs every write of the history: batched flushes, and
+the flushes that reads and other writes hand it through the facade's
+``run_write``. Disk I/O therefore never blocks the loop and all writes are
+serialised.
+"""
+import asyncio
+import builtins
+import concurrent.futures
+import contextlib
+import io
+import logging
+import os
+import signal
+import sys
+from contextvars import ContextVar
+from app.commands import LineState, current_state
+from app.plugins.history_facade import run_here
+from app.session import SessionHistory
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+
+
+class PromptUnavailable(EOFError):
+    """Raised when a command asks for interactive input over the socket."""
+
+
+# The output buffer of the client line running in this context, if any.
+_line_output = ContextVar('line_output', default=None)
+
+
+class _LineStdout:
+    """Stand-in for ``sys.stdout`` that writes to the running client line's buffer."""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, text):
+        """Write to the current line's buffer, or to stdout outside of one."""
+        buffer = _line_output.get()
+        return (self.stdout if buffer is None else buffer).write(text)
+
+    def flush(self):
+        """Flush stdout; line buffers are flushed when their line finishes."""
+        if _line_output.get() is None:
+            self.stdout.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+
+def _line_input(original_input):
+    """Return an ``input`` that raises PromptUnavailable inside a client line."""
+    def prompt_input(prompt=''):
+        if _line_output.get() is not None:
+            raise PromptUnavailable(prompt)
+        return original_input(prompt)
+    return prompt_input
+
+
+def parse_address(address):
+    """Return ('unix', path) for ``unix:PATH`` or ('tcp', (host, port)) for ``HOST:PORT``."""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+class CalculatorServer:
+    """Serve a CommandHandler to concurrent socket clients."""
+
+    def __init__(self, command_handler, history, batch_size=500, flush_interval=0.05, session_size=100):
+        self.command_handler = command_handler
+        self.history = history
+        self.session_size = session_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._writes = None
+        self._loop = None
+        self._executor = None
+        self._server = None
+        self._writer_task = None
+        self._originals = None
+
+    async def start(self, address=DEFAULT_ADDRESS):
+        """Start listening on ``address`` and start the history writer task."""
+        # Only the writer task may write history; disable the facade's own thresholds.
+        self.history.batch_size = float('inf')
+        self.history.flush_interval = None
+        self._loop = asyncio.get_running_loop()
+        self._writes = asyncio.Queue()
+        # Its own thread, so writes never wait behind client lines that wait for them.
+        self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='history-writer')
+        self.history.run_write = self._run_in_writer
+        self._originals = sys.stdout, builtins.input
+        sys.stdout, builtins.input = _LineStdout(sys.stdout), _line_input(builtins.input)
+        kind, target = parse_address(address)
+        if kind == 'unix':
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(target)
+            self._server = await asyncio.start_unix_server(self.handle_client, path=target, backlog=1024)
+        else:
+            self._server = await asyncio.start_server(self.handle_client, *target, backlog=1024)
+        self._writer_task = asyncio.create_task(self.history_writer())
+        logging.info("Server listening on %s.", address)
+        return self._server
+
+    async def serve_forever(self, address=DEFAULT_ADDRESS):
+        """Serve until cancelled or sent SIGTERM, then flush history and stop."""
+        await self.start(address)
+        serving = asyncio.current_task()
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        try:
+            await self._server.serve_forever()
+        except asyncio.CancelledError:
+            logging.info("Server shutting down.")
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stop accepting clients, stop the writer and write any remaining history."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.history.run_write = run_here
+        if self._writer_task is not None:
+            # The writer runs what is already queued before the sentinel.
+            self._writes.put_nowait(None)
+            await self._writer_task
+            while not self._writes.empty():
+                item = self._writes.get_nowait()
+                if item is not None:
+                    await self._write(*item)
+        if self._originals is not None:
+            sys.stdout, builtins.input = self._originals
+            self._originals = None
+        await self._write(self.history.flush)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        logging.info("Server stopped.")
+
+    async def history_writer(self):
+        """Run queued history writes and flush queued rows in batches; the only task that writes history."""
+        while True:
+            try:
+                item = await asyncio.wait_for(self._writes.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                if self.history.pending_count:
+                    await self._write(self.history.flush)
+                continue
+            if item is None:
+                return
+            await self._write(*item)
+
+    async def _write(self, write, done=None):
+        """Run one write in the writer thread, passing its outcome to ``done`` if given."""
+        try:
+            if self._executor is None:
+                result = await asyncio.to_thread(write)
+            else:
+                result = await self._loop.run_in_executor(self._executor, write)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Whatever the backend raises must reach the waiting client.
+            if done is None:
+                logging.error("History write failed: %s", e)
+            else:
+                done.set_exception(e)
+        else:
+            if done is not None:
+                done.set_result(result)
+
+    def _run_in_writer(self, write):
+        """Run ``write`` on the writer task and wait for its result; the facade's ``run_write`` while serving."""
+        with contextlib.suppress(RuntimeError):
+            if asyncio.get_running_loop() is self._loop:
+                # Waiting here would block the writer; this only happens outside client lines.
+                return write()
+        done = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(self._writes.put_nowait, (write, done))
+        return done.result()
+
+    async def handle_client(self, reader, writer):
+        """Run each line a client sends and reply with its output."""
+        peer = writer.get_extra_info('peername') or 'unix client'
+        state = LineState(session=SessionHistory(self.session_size))
+        try:
+            while line := await reader.readline():
+                command_line = line.decode('utf-8').strip()
+                if command_line.lower() == 'exit':
+                    break
+                output = await asyncio.to_thread(self.execute, command_line, state)
+                if self.history.pending_count >= self.batch_size:
+                    self._writes.put_nowait((self.history.flush, None))
+                writer.write(output.encode('utf-8'))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+            logging.debug("Client %s disconnected.", peer)
+
+    def execute(self, command_line, state):
+        """Execute one line for a client with its LineState and return the framed output."""
+        captured = io.StringIO()
+        state_token, token = current_state.set(state), _line_output.set(captured)
+        try:
+            self.command_handler.execute_command(command_line)
+        except PromptUnavailable:
+            print("Missing arguments: give every operand inline, e.g. addition 3 4")
+        except SystemExit:
+            print("Exit is not available over the socket; send 'exit' to disconnect.")
+        finally:
+            _line_output.reset(token)
+            current_state.reset(state_token)
+        lines = [('.' + text if text.startswith('.') else text)
+                 for text in captured.getvalue().splitlines() if text.strip()]
+        return '\n'.join(lines + ['.']) + '\n'
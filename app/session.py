@@ -0,0 +1,78 @@
+"""In-memory ring buffer of the calculations made in this session.
+
+The arithmetic plugins record every result here as well as in the history,
+and ``CommandHandler`` resolves ``last`` and ``!N`` operands from it, so
+recent results can be reused without reading the history file. Storage is
+preallocated ``array`` columns of fixed capacity, so memory stays flat
+however long the session runs.
+"""
+import re
+from array import array
+from contextvars import ContextVar
+
+# An operand recalling the Nth most recent result: !1 is the newest.
+RECALL = re.compile(r"!([1-9][0-9]*)")
+
+# The session of the command line being run. CommandHandler sets it, so a
+# command records into (and reads) the session of whoever sent the line,
+# e.g. a server client, rather than the one it was set up with.
+current_session = ContextVar('current_session', default=None)
+
+
+class SessionHistory:
+    """The last ``capacity`` calculations, overwriting the oldest when full."""
+    __slots__ = ('capacity', 'operations', 'operands1', 'operands2', 'results', 'codes', 'count', '_next')
+
+    def __init__(self, capacity=100):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        # Operation names, indexed by the codes stored per entry.
+        self.operations = []
+        self.operands1 = array('d', bytes(8 * capacity))
+        self.operands2 = array('d', bytes(8 * capacity))
+        self.results = array('d', bytes(8 * capacity))
+        self.codes = array('H', bytes(2 * capacity))
+        self.count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self.count
+
+    def record(self, operation, operand1, operand2, result):
+        """Add a calculation, replacing the oldest one if the buffer is full."""
+        try:
+            code = self.operations.index(operation)
+        except ValueError:
+            code = len(self.operations)
+            self.operations.append(operation)
+        slot = self._next
+        self.codes[slot] = code
+        self.operands1[slot] = operand1
+        self.operands2[slot] = operand2
+        self.results[slot] = result
+        self._next = (slot + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def entry(self, n):
+        """Return the ``n``th most recent calculation (1 is the newest) as (operation, operand1, operand2, result)."""
+        if not 1 <= n <= self.count:
+            raise IndexError(n)
+        slot = (self._next - n) % self.capacity
+        return self.operations[self.codes[slot]], self.operands1[slot], self.operands2[slot], self.results[slot]
+
+    def recall(self, token):
+        """Return the result a ``last`` or ``!N`` token refers to; raise LookupError if there is none."""
+        match = RECALL.fullmatch(token)
+        if token != 'last' and match is None:
+            raise LookupError(f"Not a recall token: {token}")
+        n = int(match.group(1)) if match else 1
+        if n > self.count:
+            raise LookupError(f"No result {token} in this session.")
+        return self.entry(n)[3]
+
+    def recent(self, count=None):
+        """Return up to ``count`` (default all) of the most recent calculations as (n, *entry), oldest first."""
+        count = self.count if count is None else min(count, self.count)
+        return [(n, *self.entry(n)) for n in range(count, 0, -1)]
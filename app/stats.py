@@ -0,0 +1,144 @@
+"""Per-command and history I/O latency statistics.
+
+Instrumentation is opt-in: ``instrument_handler`` and ``instrument_history``
+replace methods on a single instance with timing wrappers, so objects that
+are never instrumented run exactly the same code as before.
+"""
+import functools
+import json
+import threading
+import time
+
+# Histogram buckets keep the top SUB_BUCKET_BITS bits of a duration in
+# nanoseconds, so each bucket is at most 1/16 (about 6%) wide whatever the
+# magnitude and a histogram never holds more than a few hundred buckets.
+SUB_BUCKET_BITS = 5
+
+# History facade methods that touch the storage backend.
+HISTORY_METHODS = ('flush', 'load_history', 'save_history', 'clear_history', 'append_columns', 'tail')
+
+
+class Histogram:
+    """Call and error counts plus a log-bucketed latency histogram."""
+    __slots__ = ('buckets', 'calls', 'errors', 'total_ns', 'max_ns')
+
+    def __init__(self):
+        self.buckets = {}
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, elapsed_ns, failed=False):
+        """Add one call that took ``elapsed_ns`` nanoseconds."""
+        shift = max(elapsed_ns.bit_length() - SUB_BUCKET_BITS, 0)
+        bucket = elapsed_ns >> shift << shift
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.calls += 1
+        self.errors += failed
+        self.total_ns += elapsed_ns
+        self.max_ns = max(self.max_ns, elapsed_ns)
+
+    def percentile(self, percent):
+        """Return the latency in nanoseconds below which ``percent`` of calls fall."""
+        if not self.calls:
+            return 0
+        rank = self.calls * percent / 100
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(bucket, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        """Return counts and latencies in milliseconds as a dict."""
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'mean_ms': self.total_ns / self.calls / 1e6 if self.calls else 0.0,
+            'p50_ms': self.percentile(50) / 1e6,
+            'p95_ms': self.percentile(95) / 1e6,
+            'p99_ms': self.percentile(99) / 1e6,
+            'max_ms': self.max_ns / 1e6,
+        }
+
+
+class Stats:
+    """Histograms for commands and history I/O, keyed by name."""
+    def __init__(self):
+        self.commands = {}
+        self.history = {}
+        # Server clients record from several threads at once.
+        self._lock = threading.Lock()
+
+    def record(self, table, name, elapsed_ns, failed=False):
+        """Record one call in ``table`` (``self.commands`` or ``self.history``)."""
+        with self._lock:
+            histogram = table.get(name)
+            if histogram is None:
+                histogram = table[name] = Histogram()
+            histogram.record(elapsed_ns, failed)
+
+    def snapshot(self):
+        """Return all summaries as a JSON-serialisable dict."""
+        with self._lock:
+            return {
+                'commands': {name: histogram.summary() for name, histogram in sorted(self.commands.items())},
+                'history': {name: histogram.summary() for name, histogram in sorted(self.history.items())},
+            }
+
+    def dump(self, path):
+        """Write the snapshot to ``path`` as JSON."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+def instrument_handler(command_handler, stats):
+    """Time every command step run by ``command_handler``.
+
+    A step counts as an error when it does not run to completion, i.e. when
+    ``execute_step`` returns False or raises.
+    """
+    execute_step = command_handler.execute_step
+    record = stats.record
+    commands = stats.commands
+    clock = time.perf_counter_ns
+
+    @functools.wraps(execute_step)
+    def timed_step(command_name, tokens):
+        start = clock()
+        completed = False
+        try:
+            completed = execute_step(command_name, tokens)
+            return completed
+        finally:
+            record(commands, command_name, clock() - start, not completed)
+
+    command_handler.execute_step = timed_step
+
+
+def instrument_history(history, stats):
+    """Time the storage-facing methods of a HistoryFacade."""
+    for name in HISTORY_METHODS:
+        setattr(history, name, _timed(getattr(history, name), stats, name))
+
+
+def _timed(method, stats, name):
+    """Wrap ``method`` so each call is recorded under ``name`` in the history table."""
+    record = stats.record
+    history = stats.history
+    clock = time.perf_counter_ns
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = clock()
+        failed = True
+        try:
+            result = method(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            record(history, name, clock() - start, failed)
+
+    return timed
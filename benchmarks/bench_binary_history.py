@@ -0,0 +1,83 @@
+"""Compare reads of a binary columnar history with pd.read_csv on the same rows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_binary_history --rows 1000000
+
+It writes a synthetic CSV history, converts it with ``convert_history`` to
+``binary://`` columns, and times each read on both formats. Each timing is
+the best of ``--repeat`` runs.
+
+* ``load``: the whole history as a DataFrame (``pd.read_csv`` for CSV);
+* ``sum result``: the total of the result column (``usecols`` for CSV);
+* ``aggregates``: per-operation count/sum/min/max/mean/variance, as
+  ``summary`` rebuilds them without a sidecar;
+* ``query``: the 20 newest divisions with a result of at least 1000;
+* ``tail``: the 5 newest divisions.
+"""
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+from app.plugins.history_backends import convert_history, open_backend
+from benchmarks.suite import best_of, write_history
+
+
+def csv_reads(path):
+    """Return {name: callable} reading the CSV history with pandas."""
+    def aggregates():
+        return pd.read_csv(path).groupby("operation")["result"].agg(["count", "sum", "min", "max", "mean", "var"])
+
+    def query():
+        df = pd.read_csv(path)
+        return df[(df["operation"] == "division") & (df["result"] >= 1000)].tail(20)
+
+    def tail():
+        df = pd.read_csv(path)
+        return df[df["operation"] == "division"].tail(5)
+    return {
+        "load": lambda: pd.read_csv(path),
+        "sum result": lambda: pd.read_csv(path, usecols=["result"])["result"].sum(),
+        "aggregates": aggregates,
+        "query": query,
+        "tail": tail,
+    }
+
+
+def binary_reads(location):
+    """Return {name: callable} reading the binary history through memory maps."""
+    backend = open_backend(location)
+    return {
+        "load": backend.load_dataframe,
+        "sum result": lambda: sum(chunk["result"].sum() for chunk in backend.iter_chunks(1 << 20, {"result": "float64"})),
+        "aggregates": backend.aggregate,
+        "query": lambda: backend.query("division", [("result", ">=", 1000.0)], 20),
+        "tail": lambda: backend.tail(5, 0, "division"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.csv")
+        location = f"binary://{os.path.join(tmp, 'history')}"
+        write_history(path, args.rows)
+        start = time.perf_counter()
+        convert_history(path, location)
+        converted = time.perf_counter() - start
+        print(f"{args.rows:,} rows; CSV -> binary conversion took {converted:.2f} s")
+        print(f"{'read':<12} {'pd.read_csv':>14} {'binary':>14} {'speedup':>9}")
+        binary = binary_reads(location)
+        for name, read in csv_reads(path).items():
+            csv_ms = best_of(args.repeat, read) * 1e3
+            binary_ms = best_of(args.repeat, binary[name]) * 1e3
+            print(f"{name:<12} {csv_ms:>11,.2f} ms {binary_ms:>11,.3f} ms {csv_ms / binary_ms:>8,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measure eval throughput with and without the compiled-expression cache.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_eval --evaluations 100000
+
+It evaluates a rotating set of ``--formulas`` distinct formulas through
+``EvalCommand.evaluate``, once with the LRU cache and once compiling every
+expression again, and reports evaluations per second for both. It also
+reports the rows per second of one formula evaluated over NumPy arrays.
+"""
+import argparse
+import time
+import numpy as np
+from app.plugins.eval import EvalCommand
+from app.plugins.expressions import compile_expression
+
+FORMULA = "2 * (x + {}) / y - x * y"
+
+
+def evaluations_per_second(command, formulas, evaluations):
+    """Evaluate the formulas round-robin ``evaluations`` times and return evaluations per second."""
+    start = time.perf_counter()
+    for i in range(evaluations):
+        command.evaluate(formulas[i % len(formulas)], x=float(i), y=3.0)
+    return evaluations / (time.perf_counter() - start)
+
+
+def timed(function, **kwargs):
+    """Return the wall time of one call in seconds."""
+    start = time.perf_counter()
+    function(**kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--evaluations", type=int, default=100000)
+    parser.add_argument("--formulas", type=int, default=50, help="distinct formulas (keep below the cache size)")
+    parser.add_argument("--rows", type=int, default=1000000, help="array length for the NumPy run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    formulas = [FORMULA.format(i) for i in range(args.formulas)]
+    command = EvalCommand()
+    cached = uncached = 0.0
+    for _ in range(args.repeat):
+        compile_expression.cache_clear()
+        cached = max(cached, evaluations_per_second(command, formulas, args.evaluations))
+        compile_expression.cache_clear()
+        # Bypass the cache: every evaluation parses, validates and compiles again.
+        command.evaluate = lambda source, **variables: compile_expression.__wrapped__(source).evaluate(**variables)
+        uncached = max(uncached, evaluations_per_second(command, formulas, args.evaluations))
+        del command.evaluate
+
+    x, y = np.arange(args.rows, dtype=np.float64), np.full(args.rows, 3.0)
+    expression = compile_expression(formulas[0])
+    best = min(timed(expression.evaluate_arrays, x=x, y=y) for _ in range(args.repeat))
+
+    print(f"uncached: {uncached:,.0f} evaluations/s")
+    print(f"cached:   {cached:,.0f} evaluations/s ({cached / uncached:.1f}x)")
+    print(f"arrays:   {args.rows / best:,.0f} rows/s ({args.rows:,} rows in {best * 1e3:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare the scalar and NumPy-vectorised arithmetic paths.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_execute_batch --size 1000000
+
+For each arithmetic plugin it reports operations per second for the scalar
+``calculate`` + ``append_operation`` loop, for ``execute_batch`` including the
+bulk history write, and for the vectorised arithmetic alone.
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from app.plugins.addition import AddCommand
+from app.plugins.division import DivideCommand
+from app.plugins.history_facade import HistoryFacade
+from app.plugins.multiplication import MultiplyCommand
+from app.plugins.subtraction import SubtractCommand
+
+COMMANDS = (AddCommand, SubtractCommand, MultiplyCommand, DivideCommand)
+
+
+def scalar_ops_per_second(command, a, b):
+    """Run the one-pair-at-a-time path and return operations per second."""
+    start = time.perf_counter()
+    for x, y in zip(a.tolist(), b.tolist()):
+        try:
+            command.history.append_operation(command.operation, x, y, command.calculate(x, y))
+        except ZeroDivisionError:
+            pass
+    command.history.flush()
+    return len(a) / (time.perf_counter() - start)
+
+
+def batch_ops_per_second(command, a, b):
+    """Run execute_batch (arithmetic plus one bulk history write) and return operations per second."""
+    start = time.perf_counter()
+    command.execute_batch(a, b)
+    return len(a) / (time.perf_counter() - start)
+
+
+def compute_ops_per_second(command, a, b):
+    """Time the vectorised arithmetic alone and return operations per second."""
+    start = time.perf_counter()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        command.calculate(a, b)
+    return len(a) / (time.perf_counter() - start)
+
+
+def run(size, scalar_size, location):
+    """Return {command: {path: ops/s}} for every arithmetic command."""
+    rng = np.random.default_rng(0)
+    a = rng.uniform(-1000, 1000, size)
+    b = rng.integers(0, 10, size).astype(np.float64)
+    results = {}
+    for command_class in COMMANDS:
+        command = command_class()
+        command.history = HistoryFacade(location(command.operation + '-scalar'), batch_size=1000)
+        scalar = scalar_ops_per_second(command, a[:scalar_size], b[:scalar_size])
+        command.history = HistoryFacade(location(command.operation + '-batch'))
+        results[command.operation] = {
+            'scalar': scalar,
+            'execute_batch': batch_ops_per_second(command, a, b),
+            'compute_only': compute_ops_per_second(command, a, b),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1_000_000, help='operations per batch')
+    parser.add_argument('--scalar-size', type=int, default=100_000, help='operations timed on the scalar path')
+    parser.add_argument('--backend', choices=('csv', 'sqlite'), default='csv')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        suffix = '.db' if args.backend == 'sqlite' else '.csv'
+        location = lambda name: f"{args.backend}://{os.path.join(directory, name + suffix)}"
+        results = run(args.size, args.scalar_size, location)
+    print(f"{'command':<15}{'scalar':>14}{'execute_batch':>16}{'compute only':>16}   (ops/s, {args.backend})")
+    for operation, timings in results.items():
+        print(f"{operation:<15}{timings['scalar']:>14,.0f}{timings['execute_batch']:>16,.0f}"
+              f"{timings['compute_only']:>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Measure the per-calculation cost of logging in each logging mode.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_logging --operations 50000
+
+The root logger gets the same handlers as ``logging.conf`` (a rotating
+file in a temporary directory and a console stream, sent to /dev/null),
+and ``AddCommand.execute`` is run ``--operations`` times. The cost per
+operation is reported with logging disabled, synchronous (the default),
+queued, and both again with CALC_LOG_SAMPLE_RATE=0.1. For the queued modes
+the time to drain the queue at shutdown is shown separately.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from app.log_pipeline import CalculationSampler, start_queue_logging, stop_queue_logging
+from app.plugins.addition import AddCommand
+from app.plugins.history_facade import HistoryFacade
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+MODES = (
+    ('disabled', None, False),
+    ('sync', 1.0, False),
+    ('queue', 1.0, True),
+    ('sync, sample 0.1', 0.1, False),
+    ('queue, sample 0.1', 0.1, True),
+)
+
+
+def configure(directory, devnull):
+    """Give the root logger handlers equivalent to logging.conf."""
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.filters.clear()
+    root.setLevel(logging.INFO)
+    formatter = logging.Formatter(FORMAT)
+    for handler in (RotatingFileHandler(os.path.join(directory, 'app.log'), 'a', 1048576, 5),
+                    logging.StreamHandler(devnull)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+
+
+def measure(operations, rate, queued, directory, devnull):
+    """Return (microseconds per operation, drain milliseconds) for one mode."""
+    configure(directory, devnull)
+    logging.disable(logging.NOTSET if rate is not None else logging.CRITICAL)
+    if rate is not None and rate < 1:
+        logging.getLogger().addFilter(CalculationSampler(rate))
+    listener = start_queue_logging() if queued else None
+    command = AddCommand()
+    command.history = HistoryFacade(os.path.join(directory, 'history.csv'), batch_size=operations + 1)
+    with contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for i in range(operations):
+            command.execute(float(i), 1.0)
+        elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    if listener is not None:
+        stop_queue_logging(listener)
+    drain = time.perf_counter() - start
+    command.history._discard_pending()
+    logging.disable(logging.NOTSET)
+    return elapsed / operations * 1e6, drain * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operations', type=int, default=50000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        print(f"{'mode':<18} {'us/operation':>12} {'drain ms':>9}")
+        for name, rate, queued in MODES:
+            per_operation, drain = measure(args.operations, rate, queued, directory, devnull)
+            print(f"{name:<18} {per_operation:>12.2f} {drain:>9.1f}")
+        logging.getLogger().handlers.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Measure batch-mode throughput against the number of worker processes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parallel_batch --lines 200000 --max-workers 8
+
+It writes a command file of ``--lines`` calculations, runs it once
+sequentially and then with 2..``--max-workers`` workers, and reports lines
+per second and the speedup over the sequential run.
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+from app import App
+
+OPERATIONS = ("addition", "subtraction", "multiplication", "division")
+
+
+def write_commands(path, lines):
+    """Write ``lines`` calculations cycling through the four operations."""
+    with open(path, "w", encoding="utf-8") as commands:
+        for i in range(lines):
+            commands.write(f"{OPERATIONS[i % 4]} {i} {i % 97 + 1}\n")
+
+
+def lines_per_second(source, lines, workers, chunk_size):
+    """Run the command file through App.run_batch and return lines per second."""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CALC_HISTORY_FILE"] = os.path.join(tmp, "history.csv")
+        app = App()
+        app.settings["CALC_WORKERS"] = str(workers)
+        app.settings["CALC_CHUNK_SIZE"] = str(chunk_size)
+        app.settings["CALC_HISTORY_BATCH_SIZE"] = str(chunk_size)
+        start = time.perf_counter()
+        app.run_batch(source, io.StringIO())
+        return lines / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "commands.txt")
+        write_commands(source, args.lines)
+        print(f"{args.lines} lines, chunk size {args.chunk_size}, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'lines/s':>12} {'speedup':>8}")
+        baseline = None
+        for workers in range(1, max(args.max_workers, 1) + 1):
+            rate = lines_per_second(source, args.lines, workers, args.chunk_size)
+            baseline = baseline or rate
+            print(f"{workers:>7} {rate:>12,.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
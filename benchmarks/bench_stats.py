@@ -0,0 +1,60 @@
+"""Measure the cost of CALC_STATS instrumentation on command dispatch.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_stats --commands 200000
+
+It runs the same ``addition`` line through a CommandHandler with and
+without ``instrument_handler``/``instrument_history`` and reports the time
+per command for both.
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from app.commands import CommandHandler
+from app.plugins.addition import AddCommand
+from app.plugins.history_facade import HistoryFacade
+from app.stats import Stats, instrument_handler, instrument_history
+
+
+def microseconds_per_command(commands, instrumented, history_file):
+    """Dispatch ``commands`` additions and return the mean time per command in microseconds."""
+    handler = CommandHandler()
+    command = AddCommand()
+    command.history = HistoryFacade(history_file, batch_size=1000)
+    handler.register_command("addition", command)
+    if instrumented:
+        stats = Stats()
+        instrument_handler(handler, stats)
+        instrument_history(command.history, stats)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for _ in range(commands):
+            handler.execute_command("addition 1 2")
+        command.history.flush()
+        elapsed = time.perf_counter() - start
+    command.history.close()
+    return elapsed / commands * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for instrumented in (False, True) * args.repeat:
+            history_file = os.path.join(tmp, f"history-{instrumented}.csv")
+            timing = microseconds_per_command(args.commands, instrumented, history_file)
+            results[instrumented] = min(results.get(instrumented, timing), timing)
+    off, on = results[False], results[True]
+    print(f"stats off: {off:.3f} us/command")
+    print(f"stats on:  {on:.3f} us/command ({on - off:+.3f} us, {(on - off) / off:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Load test for the socket server using local clients.
+
+Run from the repository root:
+
+    python -m benchmarks.server_load --clients 50 --requests 200
+
+A server process (``main.py --serve``) is started on a temporary Unix socket
+with its own temporary history file. Every client then sends its requests
+one after another over its own connection, and the script reports overall
+throughput and the p50/p99 request latency.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+OPERATIONS = ('addition', 'subtraction', 'multiplication', 'division')
+
+
+async def client(path, requests, latencies):
+    """Send ``requests`` calculations over one connection, recording each latency."""
+    reader, writer = await asyncio.open_unix_connection(path)
+    for i in range(requests):
+        line = f"{OPERATIONS[i % 4]} {i + 1} {i % 7 + 1}\n".encode()
+        start = time.perf_counter()
+        writer.write(line)
+        await writer.drain()
+        while await reader.readline() != b".\n":
+            pass
+        latencies.append(time.perf_counter() - start)
+    writer.write(b"exit\n")
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def wait_for_socket(path, timeout=10.0):
+    """Wait until the server accepts connections on ``path``."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_unix_connection(path)
+            writer.close()
+            return
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run(path, clients, requests):
+    """Run all clients concurrently and return (elapsed seconds, latencies)."""
+    await wait_for_socket(path)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(path, requests, latencies) for _ in range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values, fraction):
+    """Return the value at ``fraction`` (0-1) of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help='requests per client')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'calc.sock')
+        env = dict(os.environ, CALC_HISTORY_FILE=os.path.join(directory, 'history.csv'),
+                   PLUGIN_MANIFEST_FILE=os.path.join(directory, 'manifest.json'))
+        server = subprocess.Popen([sys.executable, 'main.py', '--serve', f'unix:{path}'],
+                                  env=env, stderr=subprocess.DEVNULL)
+        try:
+            elapsed, latencies = asyncio.run(run(path, args.clients, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+        with open(env['CALC_HISTORY_FILE'], encoding='utf-8') as history:
+            rows = sum(1 for _ in history) - 1
+    total = len(latencies)
+    print(f"{args.clients} clients x {args.requests} requests = {total} requests in {elapsed:.2f} s")
+    print(f"throughput: {total / elapsed:,.0f} requests/s")
+    print(f"latency p50: {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p99: {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"history rows written: {rows}")
+
+
+if __name__ == '__main__':
+    main()
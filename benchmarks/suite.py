@@ -0,0 +1,211 @@
+"""Benchmark suite for history I/O, command dispatch and startup.
+
+Run from the repository root (no network needed):
+
+    python -m benchmarks.suite                       # measure and print
+    python -m benchmarks.suite --save                # store as the new baseline
+    python -m benchmarks.suite --compare             # fail on regressions
+    python -m benchmarks.suite --compare --metric 'load_history.*' --metric dispatch --threshold 0.1
+
+History metrics are measured at each ``--sizes`` row count (1k to 1M by
+default) on a synthetic CSV history:
+
+* ``append_operation.N``: microseconds per append to an N-row history,
+  with the App's default batch size of 50;
+* ``load_history.N``: milliseconds to load N rows as a DataFrame;
+* ``showhistory.N``: milliseconds for ``showhistory`` on a fresh facade,
+  i.e. with a cold cache.
+
+``dispatch`` is CommandHandler throughput in commands per second and
+``startup`` is the wall time of a fresh interpreter running ``App()`` and
+``load_plugins()``. With ``--compare`` the script exits with status 1 if
+any metric matching ``--metric`` is worse than the baseline by more than
+``--threshold`` (a fraction, 0.25 by default).
+
+Baselines are only comparable on the machine they were recorded on. The
+fsync-bound ``append_operation`` and the sub-millisecond ``showhistory``
+timings are the noisiest, so a strict gate is best set with ``--metric``
+on the metric under work.
+"""
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from app.commands import CommandHandler
+from app.plugins.addition import AddCommand
+from app.plugins.history_facade import HistoryFacade
+from app.plugins.showhistory import ShowHistoryCommand
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+OPERATIONS = ('addition', 'subtraction', 'multplication', 'division')
+STARTUP_SCRIPT = "from app import App; App().load_plugins()"
+
+
+def write_history(path, rows):
+    """Write a synthetic CSV history of ``rows`` rows to ``path``."""
+    with open(path, 'w', encoding='utf-8', newline='\n') as history:
+        history.write("operation,operand1,operand2,result\n")
+        for start in range(0, rows, 10000):
+            history.write("".join(f"{OPERATIONS[i % 4]},{float(i)},2.0,{i + 2.0}\n"
+                                  for i in range(start, min(start + 10000, rows))))
+
+
+def best_of(repeat, function, number=1):
+    """Time ``number`` calls of ``function()`` ``repeat`` times; return the best time per call in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def measure_history(directory, size, repeat):
+    """Return the history metrics for a ``size``-row history."""
+    path = os.path.join(directory, f'history-{size}.csv')
+    write_history(path, size)
+    metrics = {}
+
+    facade = HistoryFacade(path)
+    number = max(1, 100000 // size)
+    metrics[f'load_history.{size}'] = ('ms', 'lower', best_of(repeat, facade.load_history, number) * 1e3)
+    facade.close()
+
+    def showhistory():
+        command = ShowHistoryCommand()
+        command.history = HistoryFacade(path)
+        command.execute()
+        command.history.close()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        metrics[f'showhistory.{size}'] = ('ms', 'lower', best_of(repeat, showhistory, number=50) * 1e3)
+
+    # Appends grow the file, so they are measured after the reads.
+    appends = 5000
+    facade = HistoryFacade(path, batch_size=50)
+
+    def append():
+        for i in range(appends):
+            facade.append_operation('addition', float(i), 1.0, i + 1.0)
+        facade.flush()
+    metrics[f'append_operation.{size}'] = ('us', 'lower', best_of(repeat, append) / appends * 1e6)
+    facade.close()
+    os.remove(path)
+    return metrics
+
+
+def measure_dispatch(directory, commands, repeat):
+    """Return CommandHandler throughput in commands per second."""
+    handler = CommandHandler()
+    command = AddCommand()
+    command.history = HistoryFacade(os.path.join(directory, 'dispatch.csv'), batch_size=1000)
+    handler.register_command('addition', command)
+
+    def dispatch():
+        for _ in range(commands):
+            handler.execute_command('addition 1 2')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        elapsed = best_of(repeat, dispatch)
+    command.history.close()
+    return {'dispatch': ('commands/s', 'higher', commands / elapsed)}
+
+
+def measure_startup(directory, repeat):
+    """Return the wall time of App() + load_plugins() in a fresh interpreter, in milliseconds."""
+    env = dict(os.environ, CALC_HISTORY_FILE=os.path.join(directory, 'startup.csv'),
+               PLUGIN_MANIFEST_FILE=os.path.join(directory, 'manifest.json'))
+    # The first run builds the plugin manifest; later runs measure the cached path.
+    subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, check=True, stderr=subprocess.DEVNULL)
+
+    def startup():
+        subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, check=True, stderr=subprocess.DEVNULL)
+    return {'startup': ('ms', 'lower', best_of(repeat, startup) * 1e3)}
+
+
+def run_suite(sizes, repeat, commands):
+    """Run every benchmark and return {metric: {unit, better, value}}."""
+    metrics = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            metrics.update(measure_history(directory, size, repeat))
+        metrics.update(measure_dispatch(directory, commands, repeat))
+        metrics.update(measure_startup(directory, repeat))
+    return {name: {'unit': unit, 'better': better, 'value': value}
+            for name, (unit, better, value) in metrics.items()}
+
+
+def regressions(results, baseline, patterns, threshold):
+    """Return (metric, change) for each selected metric worse than the baseline by more than ``threshold``.
+
+    ``change`` is the relative slowdown, e.g. 0.25 for 25% worse. Metrics
+    missing from either side are ignored.
+    """
+    worse = []
+    for name, result in results.items():
+        if name not in baseline or not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+            continue
+        before, after = baseline[name]['value'], result['value']
+        change = (after - before) / before if result['better'] == 'lower' else (before - after) / after
+        if change > threshold:
+            worse.append((name, change))
+    return worse
+
+
+def print_results(results, baseline):
+    """Print each metric next to its baseline value."""
+    print(f"{'metric':<28} {'value':>14} {'baseline':>14} {'change':>8}  unit")
+    for name, result in results.items():
+        value = result['value']
+        before = baseline.get(name, {}).get('value')
+        change = f"{(value - before) / before:+.1%}" if before else ""
+        before = f"{before:,.3f}" if before else "-"
+        print(f"{name:<28} {value:>14,.3f} {before:>14} {change:>8}  {result['unit']} ({result['better']} is better)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='history sizes in rows')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per metric; the best one is kept')
+    parser.add_argument('--commands', type=int, default=20000, help='commands per dispatch run')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='exit with status 1 on a regression')
+    parser.add_argument('--metric', action='append', help='glob of metrics to compare (default: all)')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, as a fraction')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.repeat, args.commands)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['metrics']
+    print_results(results, baseline)
+
+    document = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'metrics': results,
+    }
+    for path in ([args.output] if args.output else []) + ([args.baseline] if args.save else []):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(document, file, indent=2)
+        print(f"results written to {path}")
+
+    if args.compare:
+        worse = regressions(results, baseline, args.metric or ['*'], args.threshold)
+        for name, change in worse:
+            print(f"REGRESSION {name}: {change:.1%} worse than baseline (threshold {args.threshold:.0%})")
+        sys.exit(1 if worse else 0)
+
+
+if __name__ == '__main__':
+    main()
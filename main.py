@@ -1,6 +1,28 @@
 # main.py
+import argparse
+import sys
 from app import App    
 
 # You must put this in your main.py because this forces the program to start when you run it from the command line.
 if __name__ == "__main__":
-    app = App().start()  # Instantiate an instance of App
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Advanced Python Calculator")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run commands from FILE ('-' for stdin) instead of the interactive prompt")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="with --batch, evaluate lines on N worker processes (default CALC_WORKERS)")
+    parser.add_argument("--serve", metavar="ADDRESS", nargs="?", const="",
+                        help="serve commands over a socket (HOST:PORT or unix:PATH, default CALC_SERVER_ADDRESS)")
+    parser.add_argument("--convert-history", nargs=2, metavar=("SOURCE", "TARGET"),
+                        help="copy the history at SOURCE into TARGET, e.g. calc_history.csv binary://history")
+    args = parser.parse_args()
+    if args.convert_history:
+        sys.exit(App().convert_history(*args.convert_history))
+    if args.serve is not None:
+        App().serve(args.serve or None)
+    elif args.batch:
+        app = App()
+        if args.workers:
+            app.settings['CALC_WORKERS'] = str(args.workers)
+        sys.exit(1 if app.run_batch(args.batch) else 0)
+    else:
+        app = App().start()  # Instantiate an instance of App
@@ -0,0 +1,42 @@
+"""Fixtures shared by the test modules."""
+
+import pytest
+from app import App
+
+
+@pytest.fixture(autouse=True)
+def temporary_files(monkeypatch, tmp_path):
+    """Keep the history, plugin manifest, stats and profiles of every test in a temporary directory, out of the repo."""
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(tmp_path / "history.csv"))
+    monkeypatch.setenv("PLUGIN_MANIFEST_FILE", str(tmp_path / "manifest.json"))
+    monkeypatch.setenv("CALC_STATS_FILE", str(tmp_path / "stats.json"))
+    monkeypatch.setenv("CALC_PROFILE_DIR", str(tmp_path / "profiles"))
+
+
+@pytest.fixture
+def make_app(monkeypatch):
+    """Return App, with no logging setup.
+
+    Settings are read when an App is built, so tests can set more of them first.
+    """
+    monkeypatch.setattr("app.App.configure_logging", lambda self: None)
+    return App
+
+
+@pytest.fixture
+def app(make_app):
+    """An App writing history to a temporary CSV; tests that need the plugins call ``load_plugins``."""
+    return make_app()
+
+
+@pytest.fixture
+def app_factory(make_app, monkeypatch):
+    """Build Apps with their plugins loaded, after setting the given settings, e.g. ``app_factory(CALC_STATS="1")``."""
+
+    def build(**settings):
+        for name, value in settings.items():
+            monkeypatch.setenv(name, value)
+        app = make_app()
+        app.load_plugins()
+        return app
+    return build
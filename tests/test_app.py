@@ -5,8 +5,11 @@ import posixpath
 import pkgutil
 import importlib
 import logging
+import subprocess
+import sys
 import pytest
-from app import App
+from app import App, plugin_manifest
+from app.commands import LazyCommand
 
 
 def test_app_get_environment_variable(monkeypatch):
@@ -151,3 +154,174 @@ def test_load_plugins_import_error(monkeypatch, caplog):
         assert "Error importing plugin fake_plugin: Test ImportError" in caplog.text, (
             "Expected error for plugin import failure not logged."
         )
+
+
+def test_plugins_share_app_history(app, monkeypatch, tmp_path):
+    """Every registered command gets the same HistoryFacade, flushed on shutdown."""
+    csv_file = tmp_path / "history.csv"
+    inputs = iter(['addition', '2', '3', 'showhistory', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+
+    app.load_plugins()
+    handler = app.command_handler
+    histories = {id(handler.get_command(name).history) for name in list(handler.commands)}
+    assert histories == {id(app.history)}
+
+    with pytest.raises(SystemExit):
+        app.start()
+    assert csv_file.read_text(encoding="utf-8").splitlines()[-1].startswith("addition,2.0,3.0,5.0,")
+
+
+def test_command_handler_passes_inline_arguments(capfd):
+    """CommandHandler splits the line and rejects extra arguments."""
+    from app.commands import Argument, CommandHandler, Command
+
+    class EchoCommand(Command):
+        arguments = (Argument("word"),)
+
+        def execute(self, word="none"):
+            print(f"echo {word}")
+
+    handler = CommandHandler()
+    handler.register_command("echo", EchoCommand())
+    handler.execute_command("echo hi")
+    handler.execute_command("echo")
+    handler.execute_command("echo a b")
+
+    out, _ = capfd.readouterr()
+    assert "echo hi" in out
+    assert "echo none" in out
+    assert "Usage: echo [word]" in out
+
+
+def test_command_handler_chain_stops_at_failed_step(capfd):
+    """A ';' chain stops at a step whose command returns FAILED, whatever kind of command it is."""
+    from app.commands import FAILED, CommandHandler, Command
+
+    class StepCommand(Command):
+        def __init__(self, name, outcome):
+            self.name, self.outcome = name, outcome
+
+        def execute(self):
+            print(self.name)
+            return self.outcome
+
+    handler = CommandHandler()
+    handler.register_command("quiet", StepCommand("quiet", None))
+    handler.register_command("fail", StepCommand("fail", FAILED))
+    handler.execute_command("quiet; fail; quiet")
+    assert capfd.readouterr()[0].splitlines() == ["quiet", "fail"]
+    assert handler.last_result is None
+
+
+def test_load_plugins_is_lazy(app, monkeypatch, tmp_path):
+    """Plugins are registered from the manifest and imported on first execution."""
+    manifest_file = tmp_path / "manifest.json"
+    imported = []
+    real_import_module = importlib.import_module
+    def tracking_import_module(name):
+        imported.append(name)
+        return real_import_module(name)
+    monkeypatch.setattr(importlib, "import_module", tracking_import_module)
+
+    app.load_plugins()
+    assert manifest_file.exists()
+    assert imported == []
+    assert isinstance(app.command_handler.commands["menu"], LazyCommand)
+
+    app.command_handler.execute_command("menu")
+    assert imported == ["app.plugins.menu"]
+    assert not isinstance(app.command_handler.commands["menu"], LazyCommand)
+
+
+def test_plugin_manifest_reused_until_plugins_change(monkeypatch, tmp_path):
+    """The manifest is rebuilt only when a plugin source's mtime changes."""
+    plugins_path = tmp_path / "plugins"
+    (plugins_path / "hello").mkdir(parents=True)
+    source = plugins_path / "hello" / "__init__.py"
+    source.write_text("from app.commands import Command\nclass HelloCommand(Command):\n    pass\n")
+    manifest_file = tmp_path / "manifest.json"
+
+    manifest = plugin_manifest.load_manifest(str(manifest_file), str(plugins_path), "plugins")
+    assert manifest["plugins"]["hello"] == {"module": "plugins.hello", "classes": ["HelloCommand"]}
+
+    calls = []
+    real_build = plugin_manifest.build_manifest
+    def counting_build(*args):
+        calls.append(args)
+        return real_build(*args)
+    monkeypatch.setattr(plugin_manifest, "build_manifest", counting_build)
+
+    plugin_manifest.load_manifest(str(manifest_file), str(plugins_path), "plugins")
+    assert calls == []
+
+    source.write_text("from app.commands import Command\nclass ByeCommand(Command):\n    pass\n")
+    os.utime(source, ns=(0, 0))
+    manifest = plugin_manifest.load_manifest(str(manifest_file), str(plugins_path), "plugins")
+    assert len(calls) == 1
+    assert manifest["plugins"]["hello"]["classes"] == ["ByeCommand"]
+
+
+def test_command_handler_inline_chaining_and_previous_result(app, capfd, monkeypatch):
+    """Inline operands run in one step, ';' chains commands and '_' reuses the last result."""
+    monkeypatch.setattr('builtins.input', lambda _: pytest.fail("unexpected prompt"))
+    app.load_plugins()
+    handler = app.command_handler
+
+    handler.execute_command("addition 3 4; multiplication _ 2; division _ 7")
+    out, _ = capfd.readouterr()
+    assert out.splitlines() == ["Result: 7.0", "Result: 14.0", "Result: 2.0"]
+    assert handler.last_result == 2.0
+
+    handler.execute_command("addition x 1; subtraction 9 1")
+    out, _ = capfd.readouterr()
+    assert out.splitlines() == ["Invalid value for a: x"]
+
+    handler.execute_command("division 1 0; addition _ 1")
+    out, _ = capfd.readouterr()
+    assert out.splitlines() == ["Error: Division by zero is not allowed."]
+
+    handler.execute_command("addition _ 1")
+    out, _ = capfd.readouterr()
+    assert out.splitlines() == ["Result: 3.0"]
+    assert [row[0] for row in app.history.tail(5)] == ["addition", "multplication", "division", "addition"]
+
+
+def test_command_handler_prompts_for_missing_arguments(app, capfd, monkeypatch):
+    """Omitted operands fall back to the interactive prompts."""
+    prompts = []
+    monkeypatch.setattr('builtins.input', lambda prompt: prompts.append(prompt) or "5")
+    app.load_plugins()
+
+    app.command_handler.execute_command("subtraction 8")
+    out, _ = capfd.readouterr()
+    assert prompts == ["Enter second number: "]
+    assert "Result: 3.0" in out
+
+
+def test_command_handler_recalls_session_results(app, capfd, monkeypatch):
+    """'last' and '!N' operands come from the session ring buffer without reading the history."""
+    monkeypatch.setattr('builtins.input', lambda _: pytest.fail("unexpected prompt"))
+    app.load_plugins()
+    handler = app.command_handler
+
+    handler.execute_command("addition 3 4; multiplication 2 5")
+    capfd.readouterr()
+    monkeypatch.setattr(app.history, "tail", lambda *args: pytest.fail("history read"))
+    handler.execute_command("subtraction last !2")
+    assert capfd.readouterr()[0].splitlines() == ["Result: 3.0"]
+
+    handler.execute_command("addition !4 1; addition 1 1")
+    assert capfd.readouterr()[0].splitlines() == ["No result !4 in this session."]
+
+    handler.execute_command("recent 2")
+    out, _ = capfd.readouterr()
+    assert [line.split()[:2] for line in out.strip().splitlines()[1:]] == [["!2", "multplication"],
+                                                                           ["!1", "subtraction"]]
+
+
+def test_importing_app_skips_server_and_batch_modules():
+    """Starting the REPL does not import asyncio or the process pool; serve and run_batch do."""
+    code = "import sys, app\nprint(sorted(name for name in ('asyncio', 'concurrent.futures') if name in sys.modules))\n"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,119 @@
+"""Tests for the non-interactive batch mode."""
+
+import io
+from app.batch import parse_lines, run_batch
+
+
+def test_parse_lines_skips_blanks_and_comments():
+    """Blank lines and comments are dropped; line numbers are kept."""
+    lines = ["addition 1 2\n", "\n", "# note\n", "  division 4 2; addition _ 1  \n"]
+    assert list(parse_lines(lines)) == [(1, [("addition", ["1", "2"])]),
+                                        (4, [("division", ["4", "2"]), ("addition", ["_", "1"])])]
+
+
+def test_run_batch_writes_results_errors_and_history(app, tmp_path):
+    """Each line's result or error goes to the output; calculations reach history."""
+    source = tmp_path / "commands.txt"
+    source.write_text("addition 1 2\ndivision 10 4\ndivision 1 0\nnope 1\nmultiplication x 2\nexit\naddition 9 9\n")
+    output = io.StringIO()
+
+    errors = app.run_batch(str(source), output)
+
+    assert errors == 3
+    assert output.getvalue().splitlines() == [
+        "3.0",
+        "2.5",
+        "Error (line 3): Division by zero is not allowed.",
+        "Error (line 4): No such command: nope",
+        "Error (line 5): Invalid value for a: x",
+    ]
+    # Rows end with their timestamp and sequence number.
+    rows = [row.rsplit(",", 2)[0] for row in (tmp_path / "history.csv").read_text().splitlines()]
+    assert rows[1:] == ["addition,1.0,2.0,3.0", "division,10.0,4.0,2.5"]
+
+
+def test_run_batch_uses_the_repl_syntax(app):
+    """Lines are parsed like REPL input: chained steps, ``_`` and ``last`` work."""
+    app.load_plugins()
+    output = io.StringIO()
+    lines = ["addition 3 4; division _ 2", "addition last 1", "subtraction 1 2 3", "addition"]
+    assert run_batch(lines, app.command_handler, app.history, output) == (4, 2)
+    assert output.getvalue().splitlines() == [
+        "7.0",
+        "3.5",
+        "4.5",
+        "Error (line 3): Usage: subtraction [a] [b]",
+        "Error (line 4): addition expects 2 operands, got 0",
+    ]
+
+
+def test_run_batch_runs_other_commands(app):
+    """Non-calculation commands run through the handler with their output captured."""
+    app.load_plugins()
+    output = io.StringIO()
+    run_batch(["subtraction 5 2", "showhistory 1"], app.command_handler, app.history, output)
+    assert "3.0" in output.getvalue()
+    assert "Last 1 Calculations" in output.getvalue()
+
+
+def test_run_batch_streams_lazily(app):
+    """Each line's result is written before the next line is read."""
+    app.load_plugins()
+    consumed = []
+
+    def lines():
+        for i in range(3):
+            consumed.append(i)
+            yield f"addition {i} 1"
+
+    class RecordingOutput(io.StringIO):
+        def __init__(self):
+            super().__init__()
+            self.seen = []
+
+        def write(self, text):
+            self.seen.append(len(consumed))
+            return super().write(text)
+
+    output = RecordingOutput()
+    assert run_batch(lines(), app.command_handler, app.history, output) == (3, 0)
+    assert output.seen == [1, 2, 3]
+
+
+def test_run_parallel_matches_sequential_order(app, tmp_path, monkeypatch):
+    """Parallel output and history rows come back in input order."""
+    source = tmp_path / "commands.txt"
+    source.write_text("".join(f"addition {i} 1\n" for i in range(7))
+                      + "division 1 0\nshowhistory 1\nsubtraction 9 1\nmultiplication last 2; addition _ 1\n"
+                      + "exit\naddition 5 5\n")
+    monkeypatch.setitem(app.settings, "CALC_WORKERS", "2")
+    monkeypatch.setitem(app.settings, "CALC_CHUNK_SIZE", "3")
+    output = io.StringIO()
+
+    errors = app.run_batch(str(source), output)
+
+    assert errors == 1
+    lines = output.getvalue().splitlines()
+    assert lines[:8] == [f"{i + 1}.0" for i in range(7)] + ["Error (line 8): Division by zero is not allowed."]
+    assert "addition       6.0       1.0     7.0" in lines[10]
+    assert lines[-3:] == ["8.0", "16.0", "17.0"]
+    rows = [row.rsplit(",", 2)[0] for row in (tmp_path / "history.csv").read_text().splitlines()]
+    assert rows[1:] == [f"addition,{i}.0,1.0,{i + 1}.0" for i in range(7)] + [
+        "subtraction,9.0,1.0,8.0", "multplication,8.0,2.0,16.0", "addition,16.0,1.0,17.0"]
+
+
+def test_parallel_workers_do_not_build_an_app(app, tmp_path, monkeypatch):
+    """Pool workers only register the parent's commands; no App, logging or profiler is set up."""
+    app.load_plugins()
+    source = tmp_path / "commands.txt"
+    source.write_text("".join(f"multiplication {i} 2\n" for i in range(4)))
+    monkeypatch.setitem(app.settings, "CALC_WORKERS", "2")
+    monkeypatch.setitem(app.settings, "CALC_CHUNK_SIZE", "2")
+
+    def no_app(self):
+        raise AssertionError("App built in a worker")
+    monkeypatch.setattr("app.App.__init__", no_app)
+    output = io.StringIO()
+
+    assert app.run_batch(str(source), output) == 0
+    assert output.getvalue().splitlines() == ["0.0", "2.0", "4.0", "6.0"]
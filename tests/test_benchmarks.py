@@ -0,0 +1,33 @@
+"""Tests for the benchmark suite's regression check."""
+
+from benchmarks.suite import regressions, write_history
+
+
+def test_regressions_respect_direction_threshold_and_patterns():
+    """Slower times and lower throughput beyond the threshold are reported for selected metrics only."""
+    baseline = {
+        'load_history.1000': {'value': 10.0},
+        'showhistory.1000': {'value': 1.0},
+        'dispatch': {'value': 1000.0},
+    }
+    results = {
+        'load_history.1000': {'better': 'lower', 'value': 13.0},
+        'showhistory.1000': {'better': 'lower', 'value': 1.1},
+        'dispatch': {'better': 'higher', 'value': 500.0},
+        'startup': {'better': 'lower', 'value': 99.0},
+    }
+    assert regressions(results, baseline, ['*'], 0.25) == [('load_history.1000', 0.3), ('dispatch', 1.0)]
+    assert [name for name, _ in regressions(results, baseline, ['showhistory.*', 'startup'], 0.05)] == ['showhistory.1000']
+    assert regressions(results, baseline, ['dispatch'], 1.5) == []
+
+
+def test_write_history_writes_header_and_rows(tmp_path):
+    """The synthetic history is a CSV the facade can read."""
+    path = tmp_path / "history.csv"
+    write_history(path, 3)
+    assert path.read_text().splitlines() == [
+        "operation,operand1,operand2,result",
+        "addition,0.0,2.0,2.0",
+        "subtraction,1.0,2.0,3.0",
+        "multplication,2.0,2.0,4.0",
+    ]
@@ -1,5 +1,6 @@
 """Tests for individual plugin commands (arithmetic, showhistory, clearhistory, exit, menu)."""
 
+import json
 import pytest
 import pandas as pd  # Only if you need it for some tests
 from app.plugins.addition import AddCommand
@@ -10,6 +11,12 @@ from app.plugins.exit import ExitCommand
 from app.plugins.menu import MenuCommand
 from app.plugins.showhistory import ShowHistoryCommand
 from app.plugins.clearhistory import ClearHistoryCommand
+from app.plugins.summary import SummaryCommand
+from app.plugins.queryhistory import QueryHistoryCommand
+from app.plugins.mergehistory import MergeHistoryCommand
+from app.plugins.exporthistory import ExportHistoryCommand
+from app.plugins.eval import EvalCommand
+from app.commands import FAILED, CommandHandler
 
 # If you actually need HistoryFacade in a test, uncomment:
 # from app.plugins.history_facade import HistoryFacade
@@ -173,3 +180,207 @@ def test_clearhistory_command(capfd, monkeypatch, tmp_path):
     out, _ = capfd.readouterr()
     assert "History cleared." in out
     assert not csv_file.exists()
+
+
+def test_showhistory_count_offset_and_filter(capfd, monkeypatch, tmp_path):
+    """Verify ShowHistoryCommand honours count, offset and operation arguments."""
+    csv_file = tmp_path / "test_history.csv"
+    data = [{"operation": op, "operand1": i, "operand2": 1, "result": i}
+            for i, op in enumerate(["addition", "division"] * 5)]
+    pd.DataFrame(data).to_csv(csv_file, index=False)
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(csv_file))
+
+    ShowHistoryCommand().execute("2", "1", "division")
+
+    out, _ = capfd.readouterr()
+    assert "Last 2 Calculations (division):" in out
+    assert "addition" not in out.split(":", 1)[1]
+    assert "5.0" in out and "7.0" in out and "9.0" not in out
+
+
+def test_showhistory_invalid_count(capfd):
+    """Verify ShowHistoryCommand rejects a non-numeric count."""
+    ShowHistoryCommand().execute("many")
+    out, _ = capfd.readouterr()
+    assert "Invalid input" in out
+
+
+@pytest.mark.parametrize("count, offset", [(0, 0), (-3, 0), (2, -1)])
+def test_showhistory_rejects_counts_out_of_range(capfd, count, offset):
+    """Verify ShowHistoryCommand rejects a count below 1 or a negative offset instead of reporting no history."""
+    AddCommand().execute(1, 2)
+    ShowHistoryCommand().execute(count, offset)
+    out, _ = capfd.readouterr()
+    assert "Usage: showhistory [count] [offset] [operation]" in out
+    assert "No history yet." not in out
+
+
+@pytest.mark.parametrize("command_class, expected", [
+    (AddCommand, [5.0, 7.0, 9.0]),
+    (SubtractCommand, [-3.0, -3.0, -3.0]),
+    (MultiplyCommand, [4.0, 10.0, 18.0]),
+])
+def test_execute_batch_arithmetic(command_class, expected, monkeypatch, tmp_path):
+    """Verify execute_batch computes element-wise and records every row in one bulk write."""
+    import numpy as np
+    csv_file = tmp_path / "test_history.csv"
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(csv_file))
+
+    result = command_class().execute_batch(np.array([1.0, 2.0, 3.0]), np.array([4.0, 5.0, 6.0]))
+
+    assert result.tolist() == expected
+    assert pd.read_csv(csv_file)["result"].tolist() == expected
+
+
+def test_execute_batch_division_masks_zero_divisors(monkeypatch, tmp_path):
+    """Verify DivideCommand.execute_batch rejects zero divisors per element instead of aborting."""
+    import numpy as np
+    csv_file = tmp_path / "test_history.csv"
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(csv_file))
+
+    result = DivideCommand().execute_batch(np.array([10.0, 1.0, 9.0]), np.array([4.0, 0.0, 3.0]))
+
+    assert result[0] == 2.5 and np.isnan(result[1]) and result[2] == 3.0
+    history = pd.read_csv(csv_file)
+    assert history["operand2"].tolist() == [4.0, 3.0]
+    assert history["result"].tolist() == [2.5, 3.0]
+
+
+def test_execute_batch_not_supported():
+    """Verify commands without operands do not implement execute_batch."""
+    assert getattr(MenuCommand(), "execute_batch", None) is None
+
+
+def test_summary_command(capfd, monkeypatch, tmp_path):
+    """Verify SummaryCommand prints per-operation aggregates, optionally for one operation."""
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(tmp_path / "test_history.csv"))
+    SummaryCommand().execute()
+    assert "No history yet." in capfd.readouterr()[0]
+
+    AddCommand().execute(1, 2)
+    AddCommand().execute(3, 4)
+    DivideCommand().execute(1, 4)
+    capfd.readouterr()
+    SummaryCommand().execute()
+    out, _ = capfd.readouterr()
+    assert "Summary of 3 calculations" in out
+    assert out.split("\n")[3].split() == ["addition", "2", "10", "5", "2.82843", "3", "7"]
+
+    SummaryCommand().execute("division")
+    out, _ = capfd.readouterr()
+    assert "Summary of 1 calculations" in out and "addition" not in out
+
+
+def test_queryhistory_command(capfd, monkeypatch, tmp_path):
+    """Verify QueryHistoryCommand filters by operation and ranges, and takes any number of inline filters."""
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(tmp_path / "test_history.csv"))
+    for a in range(1, 6):
+        AddCommand().execute(a, 1)
+        DivideCommand().execute(a, 2)
+    capfd.readouterr()
+
+    handler = CommandHandler()
+    handler.register_command("queryhistory", QueryHistoryCommand())
+    handler.execute_command("queryhistory operation=division result>=1.5 limit=2")
+    out, _ = capfd.readouterr()
+    assert "2 Matching Calculations" in out
+    lines = out.strip().split("\n")
+    assert lines[-2].split() == ["division", "4.0", "2.0", "2.0"]
+    assert lines[-1].split() == ["division", "5.0", "2.0", "2.5"]
+
+    QueryHistoryCommand().execute("operand1>4", "result<=6")
+    out, _ = capfd.readouterr()
+    assert "2 Matching Calculations" in out and "addition" in out
+
+    QueryHistoryCommand().execute("result>100")
+    assert "No matching calculations." in capfd.readouterr()[0]
+
+    for bad in ("result~1", "operation>division", "limit=0", "operand1<abc"):
+        QueryHistoryCommand().execute(bad)
+        assert f"Invalid filter: {bad}" in capfd.readouterr()[0]
+
+
+def test_mergehistory_command(capfd, monkeypatch, tmp_path):
+    """Verify MergeHistoryCommand merges inline history files into a new one and reports failures."""
+    for host, operands in (("host1.csv", (1, 3)), ("host2.csv", (2, 4))):
+        monkeypatch.setenv("CALC_HISTORY_FILE", str(tmp_path / host))
+        for a in operands:
+            AddCommand().execute(a, 1)
+    capfd.readouterr()
+
+    handler = CommandHandler()
+    handler.register_command("mergehistory", MergeHistoryCommand())
+    merged = str(tmp_path / "merged.csv")
+    handler.execute_command(f"mergehistory {merged} {tmp_path / 'host1.csv'} {tmp_path / 'host2.csv'}")
+    out, _ = capfd.readouterr()
+    assert f"Merged 4 rows from 2 files into {merged}" in out and "rows/s" in out
+    lines = [line.split(",") for line in (tmp_path / "merged.csv").read_text().splitlines()[1:]]
+    # host1's calculations were made first.
+    assert [line[1] for line in lines] == ["1.0", "3.0", "2.0", "4.0"]
+    assert [line[5] for line in lines] == ["1", "2", "3", "4"]
+
+    MergeHistoryCommand().execute(merged, str(tmp_path / "host1.csv"))
+    assert "Merge failed" in capfd.readouterr()[0]
+    MergeHistoryCommand().execute(merged)
+    assert "Usage: mergehistory OUTPUT INPUT..." in capfd.readouterr()[0]
+
+
+def test_exporthistory_command(capfd, monkeypatch, tmp_path):
+    """Verify ExportHistoryCommand exports filtered history, reports its rate and rejects bad input."""
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(tmp_path / "test_history.csv"))
+    for a in range(1, 6):
+        AddCommand().execute(a, 1)
+        DivideCommand().execute(a, 2)
+    capfd.readouterr()
+
+    handler = CommandHandler()
+    handler.register_command("exporthistory", ExportHistoryCommand())
+    output = tmp_path / "divisions.jsonl"
+    handler.execute_command(f"exporthistory {output} operation=division result>=1.5")
+    out, _ = capfd.readouterr()
+    assert f"Exported 3 rows to {output}" in out and "rows/s" in out
+    assert [json.loads(line)["operand1"] for line in output.read_text().splitlines()] == [3.0, 4.0, 5.0]
+
+    ExportHistoryCommand().execute(str(tmp_path / "all.npz"))
+    assert "Exported 10 rows" in capfd.readouterr()[0]
+
+    for output, bad in (("out.xlsx", "Unknown export format"), ("out.npy limit=2", "Invalid filter: limit=2")):
+        ExportHistoryCommand().execute(*output.split())
+        assert bad in capfd.readouterr()[0]
+    ExportHistoryCommand().execute()
+    assert "Usage: exporthistory OUTPUT [filters...]" in capfd.readouterr()[0]
+
+
+
+def test_exporthistory_writes_infinite_results_as_null(capfd, monkeypatch, tmp_path):
+    """Verify an overflowing result exports to JSONL as null instead of failing."""
+    monkeypatch.setenv("CALC_HISTORY_FILE", str(tmp_path / "test_history.csv"))
+    handler = CommandHandler()
+    handler.register_command("multiplication", MultiplyCommand())
+    handler.register_command("exporthistory", ExportHistoryCommand())
+    output = tmp_path / "out.jsonl"
+    handler.execute_command(f"multiplication 1e308 10; exporthistory {output}")
+    assert f"Exported 1 rows to {output}" in capfd.readouterr()[0]
+    assert json.loads(output.read_text())["result"] is None
+
+def test_eval_command(capfd, monkeypatch):
+    """Verify EvalCommand evaluates inline expressions with bindings and stops a chain on errors."""
+    assert EvalCommand().execute("2", "*", "(x", "+", "3)", "/", "y", "x=4", "y=2") == 7.0
+    assert "Result: 7.0" in capfd.readouterr()[0]
+
+    monkeypatch.setattr('builtins.input', lambda _: '1 + 2 * 3')
+    assert EvalCommand().execute() == 7.0
+
+    handler = CommandHandler()
+    handler.register_command("eval", EvalCommand())
+    handler.register_command("addition", AddCommand())
+    capfd.readouterr()
+    handler.execute_command("eval 1 / 0; addition 1 2")
+    out, _ = capfd.readouterr()
+    assert "Error: Division by zero is not allowed." in out and "Result: 3.0" not in out
+
+    for tokens, message in [(("x", "+", "1"), "Unbound variables: x"), (("2", "**", "3"), "Unsupported syntax"),
+                            (("x", "x=abc"), "Invalid value for x: abc"),
+                            (("1" * 400,), "Number too large in expression")]:
+        assert EvalCommand().execute(*tokens) is FAILED
+        assert message in capfd.readouterr()[0]
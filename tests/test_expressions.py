@@ -0,0 +1,56 @@
+"""Tests for the eval command's expression compiler."""
+
+import numpy as np
+import pytest
+from app.plugins.expressions import compile_expression
+
+
+def test_precedence_parentheses_and_variables():
+    """Operators follow the usual precedence and variables are bound by name."""
+    assert compile_expression("1 + 2 * 3").evaluate() == 7.0
+    assert compile_expression("(1 + 2) * 3").evaluate() == 9.0
+    assert compile_expression("-x - -2 / 4").evaluate(x=1.0) == -0.5
+    expression = compile_expression("2 * (x + 3) / y")
+    assert expression.variables == ("x", "y")
+    assert expression.evaluate(x=4.0, y=2.0) == 7.0
+    with pytest.raises(ValueError, match="Unbound variables: y"):
+        expression.evaluate(x=1.0)
+    with pytest.raises(ZeroDivisionError):
+        expression.evaluate(x=1.0, y=0.0)
+
+
+@pytest.mark.parametrize("source", [
+    "2 ** 3", "x % 2", "__import__('os')", "x.real", "x[0]", "'text'", "f(1)", "x == 1", "True",
+    "_divide(1, 0)", "lambda: 1", "1 +", "(" * 300 + "1" + ")" * 300, "1" * 2000, "1" * 400,
+])
+def test_unsafe_or_invalid_expressions_are_rejected(source):
+    """Only numbers, variables, + - * / and parentheses compile."""
+    with pytest.raises(ValueError):
+        compile_expression(source)
+
+
+def test_compiled_expressions_are_cached():
+    """Repeated formulas come from the LRU cache instead of being parsed again."""
+    compile_expression.cache_clear()
+    first = compile_expression("x * 2")
+    assert compile_expression("x * 2") is first
+    info = compile_expression.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    assert info.maxsize is not None
+
+
+def test_eval_cache_size_comes_from_app_settings(app_factory, capfd):
+    """The eval command sizes its cache from CALC_EVAL_CACHE_SIZE when the App sets it up."""
+    app = app_factory(CALC_EVAL_CACHE_SIZE="2")
+    app.command_handler.execute_command("eval x * 2 x=3")
+    assert capfd.readouterr()[0].splitlines() == ["Result: 6.0"]
+    assert app.command_handler.get_command("eval").compile.cache_info().maxsize == 2
+
+
+def test_evaluate_arrays_broadcasts_and_masks_zero_divisors():
+    """Array bindings are evaluated element-wise; division by zero gives NaN as in the division plugin."""
+    expression = compile_expression("(x + 1) / y")
+    result = expression.evaluate_arrays(x=np.arange(4.0), y=np.array([1.0, 0.0, 2.0, 4.0]))
+    np.testing.assert_array_equal(result, [1.0, np.nan, 1.5, 1.0])
+    assert expression.evaluate_arrays(x=[[1.0], [2.0]], y=2.0).shape == (2, 1)
+    assert compile_expression("3 * 2").evaluate_arrays().item() == 6.0
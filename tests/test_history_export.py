@@ -0,0 +1,82 @@
+"""Tests for the streaming history export."""
+import gzip
+import json
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from app.plugins import history_export
+from app.plugins.history_export import export_format, export_records
+from app.plugins.history_facade import HistoryFacade
+
+
+@pytest.fixture
+def facade(tmp_path):
+    """A history with a NaN result, a quoted operation name and a row without a timestamp."""
+    facade = HistoryFacade(str(tmp_path / "history.csv"))
+    facade.backend.append_rows([("addition", 1.0, 2.0, 3.0, None)])
+    facade.append_operations([("division", 1.0, 0.0, float("nan")), ("we,ird", 0.5, 0.25, 0.75)])
+    return facade
+
+
+def test_export_formats_round_trip(facade, tmp_path):
+    """Every format holds the same records as the history, in order."""
+    expected = pd.DataFrame(list(facade.iter_records()), columns=list(facade.load_history().columns))
+
+    export_records(facade.iter_records(), str(tmp_path / "out.jsonl"))
+    lines = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert lines[0] == {"operation": "addition", "operand1": 1.0, "operand2": 2.0, "result": 3.0,
+                        "timestamp": None, "sequence": 1}
+    assert lines[1]["result"] is None and lines[1]["timestamp"] == expected["timestamp"][1]
+    assert [line["operation"] for line in lines] == ["addition", "division", "we,ird"]
+
+    export_records(facade.iter_records(), str(tmp_path / "out.csv.gz"))
+    with gzip.open(tmp_path / "out.csv.gz", "rt") as handle:
+        pd.testing.assert_frame_equal(pd.read_csv(handle, float_precision="round_trip"), expected)
+
+    for name in ("out.npy", "out.npz"):
+        assert export_records(facade.iter_records(), str(tmp_path / name)) == 3
+    array = np.load(tmp_path / "out.npy")
+    archive = np.load(tmp_path / "out.npz")
+    for column in expected.columns:
+        np.testing.assert_array_equal(array[column], expected[column].to_numpy())
+        np.testing.assert_array_equal(archive[column], expected[column].to_numpy())
+    assert array.dtype["operation"] == np.dtype("<U8") and archive["sequence"].dtype == np.int64
+
+
+def test_export_filters_and_empty_history(facade, tmp_path):
+    """Filtered and empty exports write only the matching records."""
+    assert export_records(facade.iter_records("addition"), str(tmp_path / "add.npz")) == 1
+    assert np.load(tmp_path / "add.npz")["operation"].tolist() == ["addition"]
+    assert export_records(facade.iter_records(conditions=[("operand1", "<", 1.0)]), str(tmp_path / "small.jsonl")) == 1
+    assert export_records(facade.iter_records("subtraction"), str(tmp_path / "none.npy")) == 0
+    assert np.load(tmp_path / "none.npy").shape == (0,)
+
+
+def test_export_rejects_unknown_formats_and_leaves_no_partial_file(facade, tmp_path):
+    """An unknown extension is refused and a failed export removes its temporary file."""
+    assert export_format("out.csv.gz") == ".csv.gz"
+    with pytest.raises(ValueError):
+        export_records(facade.iter_records(), str(tmp_path / "out.csv"))
+
+    def failing():
+        yield ("addition", 1.0, 2.0, 3.0, None, 1)
+        raise OSError("disk full")
+    with pytest.raises(OSError):
+        export_records(failing(), str(tmp_path / "out.npz"))
+    assert list(tmp_path.glob("out.*")) == []
+
+
+@pytest.mark.parametrize("extension", [".jsonl", ".csv.gz", ".npy", ".npz"])
+def test_export_memory_does_not_grow_with_the_history(tmp_path, monkeypatch, extension):
+    """Exports hold one block of records at a time."""
+    monkeypatch.setattr(history_export, "BLOCK_ROWS", 1000)
+    records = (("addition", float(i), 1.0, float(i + 1), float(i), i + 1) for i in range(30000))
+    tracemalloc.start()
+    try:
+        assert export_records(records, str(tmp_path / f"out{extension}")) == 30000
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # The 30000 records alone would take about 6 MB.
+    assert peak < 1024 * 1024
@@ -0,0 +1,869 @@
+"""Tests for the HistoryFacade and its storage backends."""
+# pylint: disable=protected-access  # the race and segment tests drive backend internals
+
+import json
+import multiprocessing
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from app.plugins import history_backends, history_segments
+from app.plugins.history_aggregates import aggregate_rows
+from app.plugins.history_backends import (FIELDNAMES, CsvHistoryBackend, SqliteHistoryBackend, convert_history,
+                                          merge_histories, open_backend)
+from app.plugins.history_binary import BinaryHistoryBackend
+from app.plugins.history_segments import SegmentedHistoryBackend
+from app.plugins.history_facade import HistoryFacade
+
+
+@pytest.fixture(params=["csv", "sqlite", "segments", "binary"])
+def location(request, tmp_path):
+    """History location for each backend; every backend must pass the shared tests."""
+    if request.param == "sqlite":
+        return f"sqlite://{tmp_path / 'history.db'}"
+    if request.param in ("segments", "binary"):
+        return f"{request.param}://{tmp_path / 'history'}"
+    return str(tmp_path / "history.csv")
+
+
+def _median_append_seconds(facade, samples=50):
+    """Return the median wall time of a single append_operation call."""
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        facade.append_operation("addition", i, 1, i + 1)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _write_rows(csv_file, count):
+    """Write ``count`` rows of alternating addition/division history."""
+    with open(csv_file, "w", encoding="utf-8") as handle:
+        handle.write("operation,operand1,operand2,result\n")
+        for i in range(count):
+            operation = "addition" if i % 2 == 0 else "division"
+            handle.write(f"{operation},{float(i)},1.0,{float(i)}\n")
+
+
+def _fill(facade, count):
+    """Append ``count`` rows of alternating addition/division history."""
+    for i in range(count):
+        operation = "addition" if i % 2 == 0 else "division"
+        facade.append_operation(operation, float(i), 1.0, float(i))
+    facade.flush()
+
+
+# Shared backend suite
+
+
+def test_append_and_load_round_trip(location):
+    """Appended rows load back as a DataFrame in order."""
+    facade = HistoryFacade(location)
+    facade.append_operation("addition", 1.0, 2.0, 3.0)
+    facade.append_operation("division", 8.0, 4.0, 2.0)
+
+    df = HistoryFacade(location).load_history()
+    assert list(df.columns) == ["operation", "operand1", "operand2", "result", "timestamp", "sequence"]
+    assert df["operation"].tolist() == ["addition", "division"]
+    assert df["result"].tolist() == [3.0, 2.0]
+    assert df["sequence"].tolist() == [1, 2]
+    assert df["timestamp"].notna().all() and df["timestamp"].is_monotonic_increasing
+
+
+def test_load_history_empty(location):
+    """An empty history loads as an empty DataFrame with the expected columns."""
+    df = HistoryFacade(location).load_history()
+    assert df.empty
+    assert list(df.columns) == ["operation", "operand1", "operand2", "result", "timestamp", "sequence"]
+
+
+def test_appends_are_batched_until_threshold(location):
+    """Rows stay in memory until batch_size rows are pending."""
+    facade = HistoryFacade(location, batch_size=3)
+    facade.append_operation("addition", 1.0, 1.0, 2.0)
+    facade.append_operation("addition", 2.0, 2.0, 4.0)
+    assert HistoryFacade(location).tail(5) == []
+
+    facade.append_operation("addition", 3.0, 3.0, 6.0)
+    assert len(HistoryFacade(location).tail(5)) == 3
+
+
+def test_flush_interval_triggers_write(location):
+    """A pending batch is written once the flush interval has elapsed."""
+    facade = HistoryFacade(location, batch_size=100, flush_interval=0)
+    facade.append_operation("addition", 1.0, 1.0, 2.0)
+    assert HistoryFacade(location).tail(1) == [("addition", 1.0, 1.0, 2.0)]
+
+
+def test_load_history_includes_pending_rows(location):
+    """load_history flushes pending rows before reading the storage."""
+    facade = HistoryFacade(location, batch_size=100)
+    facade.append_operation("multplication", 2.0, 3.0, 6.0)
+    assert facade.load_history()["result"].tolist() == [6.0]
+
+
+def test_save_history_replaces_rows(location):
+    """save_history overwrites the stored rows with the DataFrame."""
+    facade = HistoryFacade(location)
+    _fill(facade, 3)
+    facade.save_history(pd.DataFrame([{"operation": "addition", "operand1": 1.0, "operand2": 1.0, "result": 2.0}]))
+    assert facade.tail(5) == [("addition", 1.0, 1.0, 2.0)]
+
+
+def test_clear_history_drops_pending_and_stored_rows(location):
+    """clear_history discards unwritten rows along with the stored ones."""
+    facade = HistoryFacade(location, batch_size=100)
+    _fill(facade, 3)
+    facade.append_operation("addition", 1.0, 1.0, 2.0)
+    facade.clear_history()
+    facade.flush()
+    assert facade.tail() == []
+    assert HistoryFacade(location).load_history().empty
+
+
+def test_tail_pages_and_filters(location):
+    """tail pages backwards through the history and filters by operation."""
+    _fill(HistoryFacade(location, batch_size=1000), 1000)
+    facade = HistoryFacade(location, cache_size=4)
+
+    assert [row[1] for row in facade.tail(3)] == [997.0, 998.0, 999.0]
+    assert [row[1] for row in facade.tail(2, offset=3)] == [995.0, 996.0]
+    assert [row[1] for row in facade.tail(3, operation="addition")] == [994.0, 996.0, 998.0]
+    assert [row[1] for row in facade.tail(5, offset=998)] == [0.0, 1.0]
+    assert facade.tail(3, operation="missing") == []
+
+
+def test_tail_includes_pending_rows(location):
+    """Rows that are still buffered are visible to tail."""
+    facade = HistoryFacade(location, batch_size=100, cache_size=2)
+    _fill(facade, 5)
+    facade.append_operation("subtraction", 9.0, 1.0, 8.0)
+    assert facade.tail(1) == [("subtraction", 9.0, 1.0, 8.0)]
+    assert [row[1] for row in facade.tail(3, operation="addition")] == [0.0, 2.0, 4.0]
+
+
+def _append_worker(location, worker, count):
+    """Append ``count`` uniquely numbered rows from one writer process."""
+    facade = HistoryFacade(location, batch_size=1 + worker % 4)
+    for i in range(count):
+        facade.append_operation("addition", float(worker), float(i), float(worker * count + i))
+    facade.close()
+
+
+def test_concurrent_processes_lose_no_rows(location):
+    """Many forked writers sharing one history never drop or tear a row."""
+    writers, count = 12, 150
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_append_worker, args=(location, worker, count))
+                 for worker in range(writers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    df = HistoryFacade(location).load_history()
+    assert len(df) == writers * count
+    assert sorted(df["result"].tolist()) == [float(i) for i in range(writers * count)]
+    # Sequence numbers are shared by all writers and follow the stored order.
+    assert df["sequence"].tolist() == list(range(1, writers * count + 1))
+
+
+def test_concurrent_threads_are_group_committed(location):
+    """Rows handed to one backend from many threads are all committed."""
+    facade = HistoryFacade(location)
+    backend = facade.backend
+
+    def worker(offset):
+        for i in range(100):
+            backend.append_rows([("addition", 0.0, 0.0, float(offset + i))])
+
+    threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(facade.load_history()["result"].tolist()) == [float(i) for i in range(800)]
+
+
+# CSV backend
+
+
+def test_append_creates_file_with_header(tmp_path):
+    """The first append writes the header; later appends only add rows."""
+    csv_file = tmp_path / "history.csv"
+    facade = HistoryFacade(str(csv_file))
+    facade.append_operation("addition", 1.0, 2.0, 3.0)
+    facade.append_operation("division", 8.0, 4.0, 2.0)
+
+    lines = [line.split(",") for line in csv_file.read_text(encoding="utf-8").splitlines()]
+    assert lines[0] == ["operation", "operand1", "operand2", "result", "timestamp", "sequence"]
+    assert [line[:4] + line[5:] for line in lines[1:]] == [
+        ["addition", "1.0", "2.0", "3.0", "1"],
+        ["division", "8.0", "4.0", "2.0", "2"],
+    ]
+
+
+def test_append_matches_pandas_format(tmp_path):
+    """Rows appended to a pandas-written file load back as one consistent DataFrame."""
+    csv_file = tmp_path / "history.csv"
+    pd.DataFrame([{"operation": "addition", "operand1": 1.5, "operand2": 2.0, "result": 3.5}]).to_csv(
+        csv_file, index=False
+    )
+    facade = HistoryFacade(str(csv_file))
+    facade.append_operation("subtraction", 5.0, 1.5, 3.5)
+
+    df = facade.load_history()
+    assert df["operation"].tolist() == ["addition", "subtraction"]
+    assert df["result"].tolist() == [3.5, 3.5]
+
+
+def test_append_latency_is_flat(tmp_path):
+    """Appending to a large history costs about the same as appending to a small one."""
+    small = HistoryFacade(str(tmp_path / "small.csv"))
+    small.append_operation("addition", 0, 0, 0)
+
+    large_file = tmp_path / "large.csv"
+    with open(large_file, "w", encoding="utf-8") as handle:
+        handle.write("operation,operand1,operand2,result\n")
+        handle.write("addition,1.0,2.0,3.0\n" * 200_000)
+    large = HistoryFacade(str(large_file))
+
+    small_median = _median_append_seconds(small)
+    large_median = _median_append_seconds(large)
+    # A read-concat-rewrite append is hundreds of times slower at this size.
+    assert large_median < small_median * 5 + 0.001
+
+
+def test_operation_names_are_quoted_when_needed(tmp_path):
+    """Operation names containing CSV delimiters still round-trip."""
+    csv_file = tmp_path / "history.csv"
+    facade = HistoryFacade(str(csv_file))
+    facade.append_operation('odd, "name"', 1.0, 2.0, 3.0)
+    assert HistoryFacade(str(csv_file)).tail(1) == [('odd, "name"', 1.0, 2.0, 3.0)]
+    assert facade.load_history()["operation"].tolist() == ['odd, "name"']
+
+
+def test_history_modules_do_not_import_pandas():
+    """Appending and tail reads never load pandas; only load_history does."""
+    code = (
+        "import sys, tempfile, os\n"
+        "from app.plugins.history_facade import HistoryFacade\n"
+        "facade = HistoryFacade(os.path.join(tempfile.mkdtemp(), 'h.csv'))\n"
+        "facade.append_operation('addition', 1.0, 2.0, 3.0)\n"
+        "facade.tail(5)\n"
+        "print('pandas' in sys.modules)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_tail_is_served_from_memory(tmp_path):
+    """Once cached, tail rows are answered without reading the file again."""
+    csv_file = tmp_path / "history.csv"
+    facade = HistoryFacade(str(csv_file), cache_size=3)
+    for i in range(5):
+        facade.append_operation("addition", float(i), 1.0, i + 1.0)
+    assert [row[3] for row in facade.tail(3)] == [3.0, 4.0, 5.0]
+
+    csv_file.unlink()
+    facade.append_operation("subtraction", 9.0, 1.0, 8.0)
+    assert facade.tail(2) == [("addition", 4.0, 1.0, 5.0), ("subtraction", 9.0, 1.0, 8.0)]
+
+
+def test_clear_history_removes_csv(tmp_path):
+    """Clearing a CSV history deletes the file."""
+    csv_file = tmp_path / "history.csv"
+    facade = HistoryFacade(str(csv_file))
+    facade.append_operation("addition", 1.0, 1.0, 2.0)
+    facade.clear_history()
+    assert not csv_file.exists()
+
+
+def test_clear_is_atomic_with_writers(tmp_path):
+    """clear_history waits for an in-flight locked write instead of deleting mid-write."""
+    csv_file = tmp_path / "history.csv"
+    backend = CsvHistoryBackend(str(csv_file))
+    backend.append_rows([("addition", 1.0, 1.0, 2.0)])
+    cleared = threading.Event()
+
+    with backend._locked():
+        thread = threading.Thread(target=lambda: (HistoryFacade(str(csv_file)).clear_history(), cleared.set()))
+        thread.start()
+        assert not cleared.wait(0.2)
+        assert csv_file.exists()
+    thread.join()
+    assert cleared.is_set() and not csv_file.exists()
+
+
+def test_reversed_lines_across_block_boundaries(tmp_path):
+    """Lines split across read blocks are reassembled in reverse order."""
+    csv_file = tmp_path / "history.csv"
+    _write_rows(csv_file, 50)
+    lines = list(history_backends._reversed_lines(str(csv_file), block_size=7))
+    assert lines == csv_file.read_bytes().splitlines()[::-1]
+
+
+def test_tail_latency_independent_of_file_size(tmp_path):
+    """Reading the last rows of a large file costs about as much as a small one."""
+    small_file, large_file = tmp_path / "small.csv", tmp_path / "large.csv"
+    _write_rows(small_file, 100)
+    _write_rows(large_file, 300_000)
+
+    def median_tail_seconds(csv_file):
+        timings = []
+        for _ in range(20):
+            facade = HistoryFacade(str(csv_file), cache_size=5)
+            start = time.perf_counter()
+            facade.tail(5)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2]
+
+    assert median_tail_seconds(large_file) < median_tail_seconds(small_file) * 5 + 0.001
+
+
+# SQLite backend and backend selection
+
+
+def test_open_backend_selection(tmp_path):
+    """The location scheme wins over the backend setting; CSV is the default."""
+    db_file = tmp_path / "history.db"
+    assert isinstance(open_backend(str(tmp_path / "h.csv")), CsvHistoryBackend)
+    assert isinstance(open_backend(str(db_file), "sqlite"), SqliteHistoryBackend)
+    backend = open_backend(f"sqlite://{db_file}", "csv")
+    assert isinstance(backend, SqliteHistoryBackend)
+    assert backend.path == str(db_file)
+    with pytest.raises(ValueError):
+        open_backend(str(db_file), "parquet")
+
+
+def test_backends_in_their_own_modules(tmp_path):
+    """Segmented and binary backends are opened by scheme and still importable from history_backends."""
+    assert isinstance(open_backend(f"segments://{tmp_path / 's'}"), SegmentedHistoryBackend)
+    assert isinstance(open_backend(str(tmp_path / "b"), "binary"), BinaryHistoryBackend)
+    assert history_backends.SegmentedHistoryBackend is SegmentedHistoryBackend
+    assert history_backends.BinaryHistoryBackend is BinaryHistoryBackend
+
+
+def test_sqlite_uses_wal_and_operation_index(tmp_path):
+    """The SQLite backend runs in WAL mode with an index on operation."""
+    backend = SqliteHistoryBackend(str(tmp_path / "history.db"))
+    backend.append_rows([("addition", 1.0, 1.0, 2.0)])
+    connection = backend.connection
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM history WHERE operation = ? ORDER BY id DESC LIMIT 5",
+        ("addition",)).fetchall()
+    assert "history_operation" in " ".join(str(step) for step in plan)
+    backend.close()
+
+
+
+def test_sqlite_clear_keeps_the_table_and_changes_the_fingerprint(tmp_path):
+    """Clearing empties the table in place, so other connections keep writing, and is never mistaken for no change."""
+    path = str(tmp_path / "history.db")
+    backend, other = SqliteHistoryBackend(path), SqliteHistoryBackend(path)
+    backend.append_rows([("addition", 1.0, 1.0, 2.0)])
+    other.append_rows([("addition", 2.0, 1.0, 3.0)])
+    before = backend.fingerprint()
+    backend.clear()
+    other.append_rows([("division", 1.0, 1.0, 1.0)])
+    backend.append_rows([("division", 2.0, 1.0, 2.0)])
+    assert [record[5] for record in backend.iter_records()] == [1, 2]
+    assert backend.fingerprint() != before and other.fingerprint() == backend.fingerprint()
+    backend.close()
+    other.close()
+
+# Segmented backend
+
+
+@pytest.fixture
+def segment_reads(monkeypatch):
+    """Record the path of every sealed segment that is read."""
+    reads = []
+    read_segment = history_segments._read_segment
+
+    def recording(path):
+        reads.append(path)
+        return read_segment(path)
+    monkeypatch.setattr(history_segments, "_read_segment", recording)
+    return reads
+
+
+def _segmented(tmp_path, max_rows=10):
+    """A facade over a segments:// history with small segments."""
+    return HistoryFacade(f"segments://{tmp_path / 'history'}", backend_options={"max_rows": max_rows})
+
+
+def test_segments_rotate_compress_and_summarise(tmp_path):
+    """Full segments are sealed as .csv.gz with a JSON summary and no index; rows stay in order."""
+    facade = _segmented(tmp_path)
+    _fill(facade, 35)
+
+    names = sorted(path.name for path in (tmp_path / "history").iterdir() if ".lock" not in path.name)
+    assert names == ["current.csv"] + [f"segment-00000{n}.{ext}" for n in (1, 2, 3) for ext in ("csv.gz", "json")]
+    summary = json.loads((tmp_path / "history" / "segment-000002.json").read_text())
+    assert summary == {"rows": 10, "operations": {"addition": 5, "division": 5},
+                       "min_result": 10.0, "max_result": 19.0, "last_sequence": 20}
+    assert facade.load_history()["result"].tolist() == [float(i) for i in range(35)]
+    assert [row[3] for row in facade.iter_rows()] == [float(i) for i in range(35)]
+
+
+def test_segment_tail_reads_only_newest_segment(tmp_path, segment_reads):
+    """Tail reads stop at the newest segment that has enough rows."""
+    facade = _segmented(tmp_path)
+    _fill(facade, 35)
+    backend = facade.backend
+
+    assert [row[3] for row in backend.tail(3)] == [32.0, 33.0, 34.0]
+    assert segment_reads == []
+    assert [row[3] for row in backend.tail(4, offset=3)] == [28.0, 29.0, 30.0, 31.0]
+    assert [path.rsplit("/", 1)[1] for path in segment_reads] == ["segment-000003.csv.gz"]
+    assert [row[3] for row in backend.tail(2, operation="division")] == [31.0, 33.0]
+
+
+def test_segment_summaries_skip_segments(tmp_path, segment_reads):
+    """Counts come from summaries and filtered reads skip segments that cannot match."""
+    facade = _segmented(tmp_path)
+    _fill(facade, 35)
+
+    assert facade.count() == 35
+    assert facade.count("division") == 17
+    assert segment_reads == []
+    assert [row[3] for row in facade.iter_rows(min_result=18.0, max_result=21.0)] == [18.0, 19.0, 20.0, 21.0]
+    assert len(segment_reads) == 2
+
+
+def test_segment_left_uncompressed_by_a_crash_is_read(tmp_path):
+    """A sealed segment without its .gz and summary is still part of the history."""
+    directory = tmp_path / "history"
+    directory.mkdir()
+    _write_rows(directory / "segment-000001.csv", 4)
+    facade = _segmented(tmp_path)
+    facade.append_operation("addition", 9.0, 9.0, 18.0)
+
+    assert facade.count() == 5
+    assert [row[3] for row in facade.iter_rows()] == [0.0, 1.0, 2.0, 3.0, 18.0]
+
+
+def _segmented_worker(location, worker, count):
+    """Append rows from one process into small rotating segments."""
+    facade = HistoryFacade(location, batch_size=3, backend_options={"max_rows": 50})
+    for i in range(count):
+        facade.append_operation("addition", float(worker), float(i), float(worker * count + i))
+    facade.close()
+
+
+def test_segment_rotation_with_concurrent_processes(tmp_path):
+    """Writers in several processes rotate segments without losing rows."""
+    location = f"segments://{tmp_path / 'history'}"
+    writers, count = 6, 100
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_segmented_worker, args=(location, worker, count))
+                 for worker in range(writers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    facade = HistoryFacade(location)
+    assert sorted(row[3] for row in facade.iter_rows()) == [float(i) for i in range(writers * count)]
+    assert facade.count() == writers * count
+    assert [record[5] for record in facade.backend.iter_records()] == list(range(1, writers * count + 1))
+    assert isinstance(facade.backend, SegmentedHistoryBackend)
+
+
+# Aggregates
+
+
+def test_aggregates_match_pandas(location):
+    """Running aggregates agree with a full pandas computation."""
+    facade = HistoryFacade(location, batch_size=7)
+    for i in range(40):
+        facade.append_operation("addition" if i % 3 else "division", float(i), 2.0, i * 1.5 - 10)
+    facade.append_columns("multplication", [1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [4.0, 10.0, 18.0])
+
+    aggregates = facade.aggregates()
+    expected = facade.load_history().groupby("operation")["result"].agg(["count", "sum", "mean", "var", "min", "max"])
+    for operation, row in expected.iterrows():
+        stats = aggregates[operation]
+        assert stats.count == row["count"]
+        assert stats.total == pytest.approx(row["sum"])
+        assert stats.mean == pytest.approx(row["mean"])
+        assert stats.variance == pytest.approx(row["var"])
+        assert (stats.minimum, stats.maximum) == (row["min"], row["max"])
+
+
+def test_aggregates_sidecar_is_reused_or_rebuilt(tmp_path, monkeypatch):
+    """A valid sidecar answers without reading the history; a missing or stale one is rebuilt."""
+    csv_file = str(tmp_path / "history.csv")
+    facade = HistoryFacade(csv_file)
+    facade.append_operation("addition", 1.0, 2.0, 3.0)
+    facade.aggregates()
+    facade.append_operation("addition", 2.0, 2.0, 4.0)
+    facade.close()
+
+    reads = []
+    monkeypatch.setattr(CsvHistoryBackend, "iter_rows", lambda self: reads.append(1) or iter(()))
+    reopened = HistoryFacade(csv_file)
+    reopened.append_operation("addition", 3.0, 2.0, 5.0)
+    assert reopened.aggregates()["addition"].count == 3
+    assert reads == []
+    monkeypatch.undo()
+
+    # Rows written behind the facade's back make the sidecar stale.
+    with open(csv_file, "a", encoding="utf-8") as handle:
+        handle.write("division,1.0,2.0,0.5\n")
+    assert HistoryFacade(csv_file).aggregates()["division"].count == 1
+
+    (tmp_path / "history.csv.aggregates.json").unlink()
+    rebuilt = HistoryFacade(csv_file).aggregates()
+    assert rebuilt["addition"].total == 12.0
+    assert (tmp_path / "history.csv.aggregates.json").exists()
+
+
+
+def test_aggregates_are_tracked_from_a_new_history(tmp_path, monkeypatch):
+    """Appends to a new history keep the aggregates and close saves them, so a reopened facade need not read it."""
+    csv_file = str(tmp_path / "history.csv")
+    facade = HistoryFacade(csv_file)
+    facade.append_operation("addition", 1.0, 2.0, 3.0)
+    facade.append_operation("division", 1.0, 4.0, 0.25)
+    facade.close()
+    assert (tmp_path / "history.csv.aggregates.json").exists()
+
+    reads = []
+    monkeypatch.setattr(CsvHistoryBackend, "aggregate", lambda self: reads.append(1) or {})
+    aggregates = HistoryFacade(csv_file).aggregates()
+    assert reads == []
+    assert aggregates["addition"].total == 3.0 and aggregates["division"].count == 1
+
+def test_append_without_sidecar_does_not_read_history(tmp_path, monkeypatch):
+    """Without a valid sidecar the aggregates are left stale; ``aggregates`` rebuilds them, not the append."""
+    csv_file = str(tmp_path / "history.csv")
+    HistoryFacade(csv_file).backend.append_rows([("addition", 1.0, 2.0, 3.0)])
+    reads = []
+    aggregate = CsvHistoryBackend.aggregate
+    monkeypatch.setattr(CsvHistoryBackend, "aggregate", lambda self: reads.append(1) or aggregate(self))
+
+    facade = HistoryFacade(csv_file)
+    facade.append_operation("addition", 2.0, 2.0, 4.0)
+    assert reads == []
+    assert facade.aggregates()["addition"].count == 2
+    assert reads == [1]
+
+
+def test_aggregates_see_a_write_that_lands_before_the_lock(tmp_path):
+    """A row another writer adds just before an append takes the lock makes the aggregates stale."""
+    csv_file = str(tmp_path / "history.csv")
+    facade = HistoryFacade(csv_file)
+    facade.append_operation("addition", 1.0, 1.0, 2.0)
+    other = HistoryFacade(csv_file)
+    locked = facade.backend._locked
+
+    def interleaved(shared=False):
+        if not shared:
+            facade.backend._locked = locked
+            other.backend.append_rows([("addition", 1.0, 2.0, 3.0)])
+        return locked(shared)
+    facade.backend._locked = interleaved
+    facade.append_operation("addition", 0.0, 0.0, 0.0)
+    facade.close()
+
+    stats = HistoryFacade(csv_file).aggregates()["addition"]
+    assert (stats.count, stats.total) == (3, 5.0)
+
+
+def test_clear_history_resets_aggregates(tmp_path):
+    """Clearing the history empties the aggregates too."""
+    facade = HistoryFacade(str(tmp_path / "history.csv"))
+    facade.append_operation("addition", 1.0, 2.0, 3.0)
+    facade.clear_history()
+    assert facade.aggregates() == {}
+
+
+# Queries
+
+
+def test_query_matches_pandas(location):
+    """Filtered queries return the newest matching rows, oldest first, on every backend."""
+    facade = HistoryFacade(location, batch_size=7)
+    for i in range(60):
+        facade.append_operation(("addition", "division", "multplication")[i % 3], float(i), 2.0, float(i % 10))
+
+    df = facade.load_history()[FIELDNAMES]
+    expected = df[(df["operation"] == "division") & (df["result"] >= 4) & (df["operand1"] < 50)]
+    rows = facade.query("division", [("result", ">=", 4.0), ("operand1", "<", 50.0)], limit=3)
+    assert rows == [tuple(row) for row in expected.tail(3).itertuples(index=False)]
+    assert len(facade.query("division", [("result", ">=", 4.0)])) == len(df[(df["operation"] == "division")
+                                                                             & (df["result"] >= 4)])
+    assert facade.query("subtraction") == []
+    assert facade.query(conditions=[("result", "=", 9.0)], limit=1) == [("multplication", 59.0, 2.0, 9.0)]
+
+
+def test_query_index_is_kept_up_to_date(tmp_path):
+    """The CSV index follows appends, catches up on rows written without it and is rebuilt on clear."""
+    csv_file = str(tmp_path / "history.csv")
+    facade = HistoryFacade(csv_file)
+    facade.append_operation("addition", 1.0, 2.0, 3.0)
+    assert facade.query("addition") == [("addition", 1.0, 2.0, 3.0)]
+    index_size = (tmp_path / "history.csv.index").stat().st_size
+    facade.append_operation("division", 1.0, 2.0, 0.5)
+    assert (tmp_path / "history.csv.index").stat().st_size > index_size
+
+    with open(csv_file, "a", encoding="utf-8") as handle:
+        handle.write("division,3.0,2.0,1.5\n")
+    assert facade.query("division", [("result", ">", 1.0)]) == [("division", 3.0, 2.0, 1.5)]
+
+    (tmp_path / "history.csv.index").unlink()
+    assert len(facade.query()) == 3
+
+    facade.clear_history()
+    assert facade.query() == []
+    facade.append_operation("multplication", 2.0, 2.0, 4.0)
+    assert facade.query() == [("multplication", 2.0, 2.0, 4.0)]
+
+
+# Chunked loading
+
+
+def test_iter_chunks_declares_dtypes(location):
+    """Chunks cover the history in order with categorical operations and the requested float dtype."""
+    facade = HistoryFacade(location, batch_size=4)
+    for i in range(10):
+        facade.append_operation("addition" if i % 2 else "division", float(i), 2.0, i + 2.0)
+
+    chunks = list(facade.iter_chunks(chunksize=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    df = pd.concat([chunk.astype({"operation": str}) for chunk in chunks], ignore_index=True)
+    expected = facade.load_history()
+    assert df["operation"].tolist() == expected["operation"].tolist()
+    assert df["result"].tolist() == expected["result"].tolist()
+    assert all(isinstance(chunk["operation"].dtype, pd.CategoricalDtype) for chunk in chunks)
+    assert chunks[0]["operand1"].dtype == "float64"
+
+    chunks = list(facade.iter_chunks(usecols=["result", "operation"], float_dtype="float32"))
+    assert len(chunks) == 1
+    assert list(chunks[0].columns) == ["operation", "result"]
+    assert chunks[0]["result"].dtype == "float32"
+
+    with pytest.raises(ValueError, match="Unknown history columns: total"):
+        list(facade.iter_chunks(usecols=["total"]))
+
+
+def test_iter_chunks_respects_memory_budget(tmp_path):
+    """Without a chunk size, chunks are sized to the memory budget."""
+    facade = HistoryFacade(str(tmp_path / "history.csv"), memory_budget=100 * 1024)
+    facade.append_columns("addition", [float(i) for i in range(5000)], [1.0] * 5000, [i + 1.0 for i in range(5000)])
+
+    rows = history_backends.rows_per_chunk(100 * 1024, history_backends.history_dtypes())
+    sizes = [len(chunk) for chunk in facade.iter_chunks()]
+    assert sum(sizes) == 5000
+    assert max(sizes) == rows < 5000
+    assert max(len(chunk) for chunk in facade.iter_chunks(usecols=["result"])) > rows
+    assert list(HistoryFacade(str(tmp_path / "empty.csv")).iter_chunks()) == []
+
+
+# Binary columns
+
+
+def test_binary_columns_are_fixed_width_and_mapped(tmp_path):
+    """Each column is a flat little-endian array; tail, filters and aggregates run over the mapped arrays."""
+    backend = open_backend(f"binary://{tmp_path / 'history'}")
+    assert isinstance(backend, BinaryHistoryBackend)
+    backend.append_rows([("addition", 1.0, 2.0, 3.0), ("division", 1.0, 4.0, 0.25)])
+    backend.append_columns("addition", [5.0, 6.0], [1.0, 1.0], [6.0, 7.0])
+
+    assert (tmp_path / "history" / "result.f8").read_bytes() == np.array([3.0, 0.25, 6.0, 7.0], "<f8").tobytes()
+    assert (tmp_path / "history" / "operation.u2").read_bytes() == np.array([0, 1, 0, 0], "<u2").tobytes()
+    assert backend.tail(2, 1, "addition") == [("addition", 1.0, 2.0, 3.0), ("addition", 5.0, 1.0, 6.0)]
+    assert backend.query(conditions=[("result", "<", 5.0)]) == [("addition", 1.0, 2.0, 3.0),
+                                                                 ("division", 1.0, 4.0, 0.25)]
+    expected = aggregate_rows(backend.iter_rows())
+    aggregates = backend.aggregate()
+    assert aggregates.keys() == expected.keys()
+    for name, stats in aggregates.items():
+        assert stats.as_dict() == pytest.approx(expected[name].as_dict())
+
+
+def test_binary_tail_scans_backwards_in_blocks(tmp_path, monkeypatch):
+    """A filtered tail finds matches spread over several blocks."""
+    monkeypatch.setattr(BinaryHistoryBackend, "BLOCK_ROWS", 4)
+    backend = BinaryHistoryBackend(str(tmp_path / "history"))
+    backend.append_rows([("division" if i % 5 == 0 else "addition", float(i), 1.0, float(i)) for i in range(30)])
+    assert [row[1] for row in backend.tail(3, 1, "division")] == [10.0, 15.0, 20.0]
+    assert [row[1] for row in backend.tail(10, 0, "division")] == [0.0, 5.0, 10.0, 15.0, 20.0, 25.0]
+    assert [row[1] for row in backend.iter_rows()] == [float(i) for i in range(30)]
+
+
+def test_binary_ignores_and_overwrites_rows_past_the_committed_length(tmp_path):
+    """Column data left behind by a crash before ``length`` moved is never read."""
+    backend = BinaryHistoryBackend(str(tmp_path / "history"))
+    backend.append_rows([("addition", 1.0, 2.0, 3.0)])
+    with open(tmp_path / "history" / "result.f8", "ab") as handle:
+        handle.write(np.array([99.0], "<f8").tobytes())
+    assert backend.tail(5) == [("addition", 1.0, 2.0, 3.0)]
+    backend.append_rows([("addition", 2.0, 2.0, 4.0)])
+    assert [row[3] for row in backend.iter_rows()] == [3.0, 4.0]
+
+
+def test_convert_history_round_trip(tmp_path):
+    """A CSV history converts to binary columns and back without changing a row."""
+    csv_file = str(tmp_path / "history.csv")
+    facade = HistoryFacade(csv_file)
+    facade.append_operations([("addition", 1.5, 2.0, 3.5), ("division", 1.0, 3.0, 1 / 3), ("we,ird", 0.1, 0.2, 0.3)])
+    facade.close()
+
+    binary = f"binary://{tmp_path / 'history'}"
+    assert convert_history(csv_file, binary, batch_rows=2) == 3
+    assert convert_history(binary, str(tmp_path / "copy.csv")) == 3
+    pd.testing.assert_frame_equal(HistoryFacade(str(tmp_path / "copy.csv")).load_history(),
+                                  HistoryFacade(csv_file).load_history())
+    with pytest.raises(ValueError):
+        convert_history(csv_file, csv_file)
+
+
+# Timestamps, sequence numbers and merging
+
+
+def test_legacy_csv_is_read_and_appended_to_in_place(tmp_path):
+    """A file without timestamp and sequence columns reads as before and is not rewritten by an append."""
+    csv_file = tmp_path / "history.csv"
+    _write_rows(csv_file, 3)
+    legacy = csv_file.read_text(encoding="utf-8")
+    facade = HistoryFacade(str(csv_file))
+    assert facade.tail(1) == [("addition", 2.0, 1.0, 2.0)]
+    assert list(facade.backend.iter_records()) == [("addition", 0.0, 1.0, 0.0, None, 1),
+                                                   ("division", 1.0, 1.0, 1.0, None, 2),
+                                                   ("addition", 2.0, 1.0, 2.0, None, 3)]
+    df = facade.load_history()
+    assert df["timestamp"].isna().all() and df["sequence"].tolist() == [1, 2, 3]
+
+    facade.append_operation("subtraction", 5.0, 1.0, 4.0)
+    facade.append_operation("addition", 1.0, 1.0, 2.0)
+    text = csv_file.read_text(encoding="utf-8")
+    assert text.startswith(legacy)
+    assert text[len(legacy):].splitlines()[1].endswith(",5")
+    records = list(facade.backend.iter_records())
+    assert [record[5] for record in records] == [1, 2, 3, 4, 5]
+    assert records[3][4] is not None and records[2][4] is None
+    df = facade.load_history()
+    assert df["sequence"].tolist() == [1, 2, 3, 4, 5] and df["timestamp"].isna().tolist() == [True] * 3 + [False] * 2
+    assert pd.concat(facade.iter_chunks(chunksize=2))["result"].tolist() == [0.0, 1.0, 2.0, 4.0, 2.0]
+    assert facade.query("subtraction") == [("subtraction", 5.0, 1.0, 4.0)]
+
+
+def test_sequences_continue_across_segments_and_instances(tmp_path):
+    """Each instance continues the sequence of the history it opens, including after sealing."""
+    location = f"segments://{tmp_path / 'history'}"
+    _fill(HistoryFacade(location, backend_options={"max_rows": 10}), 15)
+    _fill(HistoryFacade(location, backend_options={"max_rows": 10}), 10)
+    records = list(open_backend(location).iter_records())
+    assert [record[5] for record in records] == list(range(1, 26))
+    assert [record[3] for record in records] == [float(i % 15) if i < 15 else float(i - 15) for i in range(25)]
+    assert open_backend(location).load_dataframe()["sequence"].tolist() == list(range(1, 26))
+
+
+def test_sqlite_table_without_timestamps_is_migrated(tmp_path):
+    """An SQLite history created before timestamps gets the column and keeps its rows."""
+    import sqlite3
+    path = tmp_path / "history.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE history (id INTEGER PRIMARY KEY, operation TEXT NOT NULL, "
+                           "operand1 REAL, operand2 REAL, result REAL)")
+        connection.execute("INSERT INTO history (operation, operand1, operand2, result) VALUES ('addition', 1, 2, 3)")
+    connection.close()
+
+    facade = HistoryFacade(f"sqlite://{path}")
+    facade.append_operation("division", 8.0, 4.0, 2.0)
+    records = list(facade.backend.iter_records())
+    assert [record[:4] for record in records] == [("addition", 1.0, 2.0, 3.0), ("division", 8.0, 4.0, 2.0)]
+    assert records[0][4:] == (None, 1) and records[1][4] is not None and records[1][5] == 2
+
+
+def test_binary_history_without_timestamps(tmp_path):
+    """Binary columns written before timestamps read without them and are padded on the next append."""
+    directory = tmp_path / "history"
+    facade = HistoryFacade(f"binary://{directory}")
+    _fill(facade, 3)
+    (directory / "timestamp.f8").unlink()
+
+    backend = open_backend(f"binary://{directory}")
+    assert [record[4:] for record in backend.iter_records()] == [(None, 1), (None, 2), (None, 3)]
+    backend.append_rows([("addition", 1.0, 1.0, 2.0)])
+    records = list(backend.iter_records())
+    assert [record[4] is None for record in records] == [True, True, True, False]
+    assert records[3][5] == 4
+    assert backend.load_dataframe()["timestamp"].isna().tolist() == [True, True, True, False]
+
+
+def test_merge_histories_in_time_order(tmp_path, location):
+    """Histories of every backend merge by timestamp, unstamped rows first and ties in input order."""
+    first = open_backend(str(tmp_path / "first.csv"))
+    first.append_rows([("addition", 1.0, 0.0, 1.0, 10.0), ("addition", 3.0, 0.0, 3.0, 30.0)])
+    second = open_backend(location)
+    second.append_rows([("division", 0.0, 1.0, 0.0, None), ("division", 2.0, 1.0, 2.0, 20.0),
+                        ("division", 3.0, 1.0, 3.0, 30.0), ("division", 4.0, 1.0, 4.0, 40.0)])
+    second.close()
+    target = str(tmp_path / "merged.csv")
+
+    assert merge_histories([str(tmp_path / "first.csv"), location], target, batch_rows=2) == 6
+    records = list(open_backend(target).iter_records())
+    assert [record[:2] for record in records] == [("division", 0.0), ("addition", 1.0), ("division", 2.0),
+                                                  ("addition", 3.0), ("division", 3.0), ("division", 4.0)]
+    assert [record[4] for record in records] == [None, 10.0, 20.0, 30.0, 30.0, 40.0]
+    assert [record[5] for record in records] == list(range(1, 7))
+
+    with pytest.raises(ValueError):
+        merge_histories([location], target)
+    with pytest.raises(ValueError):
+        merge_histories([location, target], target)
+
+
+
+def test_merge_histories_of_a_history_shared_by_instances(tmp_path):
+    """Instances sharing a file stamp rows as they write them, so the file stays in time order and merges."""
+    shared = str(tmp_path / "shared.csv")
+    first, second = HistoryFacade(shared, batch_size=2), HistoryFacade(shared, batch_size=2)
+    other = HistoryFacade(str(tmp_path / "other.csv"))
+    first.append_operation("addition", 1.0, 0.0, 1.0)
+    other.append_operation("division", 1.0, 1.0, 1.0)
+    time.sleep(0.01)
+    second.append_operations([("addition", 2.0, 0.0, 2.0), ("addition", 3.0, 0.0, 3.0)])
+    other.append_operation("division", 2.0, 1.0, 2.0)
+    time.sleep(0.01)
+    first.append_operation("addition", 4.0, 0.0, 4.0)
+    other.append_operation("division", 3.0, 1.0, 3.0)
+
+    timestamps = [record[4] for record in open_backend(shared).iter_records()]
+    assert timestamps == sorted(timestamps)
+    target = str(tmp_path / "merged.csv")
+    assert merge_histories([shared, str(tmp_path / "other.csv")], target) == 7
+    records = list(open_backend(target).iter_records())
+    assert [record[4] for record in records] == sorted(record[4] for record in records)
+    assert [record[1] for record in records if record[0] == "addition"] == [2.0, 3.0, 1.0, 4.0]
+
+def test_merge_histories_streams_its_inputs(tmp_path):
+    """Merging holds one record per input and one batch, however long the inputs are."""
+    import tracemalloc
+    sources = []
+    for host in range(3):
+        sources.append(str(tmp_path / f"host{host}.csv"))
+        open_backend(sources[-1]).append_rows([("addition", float(i), 1.0, float(i + 1), i * 3.0 + host)
+                                               for i in range(20000)])
+    tracemalloc.start()
+    try:
+        assert merge_histories(sources, str(tmp_path / "merged.csv"), batch_rows=500) == 60000
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Holding the 60000 records at once would take well over 10 MB.
+    assert peak < 2 * 1024 * 1024
+    timestamps = [record[4] for record in open_backend(str(tmp_path / "merged.csv")).iter_records()]
+    assert timestamps == [float(i) for i in range(60000)]
@@ -0,0 +1,81 @@
+"""Tests for queued logging and calculation sampling."""
+
+import io
+import logging
+from logging.handlers import QueueHandler
+from app.log_pipeline import CALCULATION, CalculationSampler, start_queue_logging, stop_queue_logging
+
+
+class CountingHandler(logging.Handler):
+    """Collects formatted messages and counts flushes."""
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.flushes = 0
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.flush()
+
+    def flush(self):
+        self.flushes += 1
+
+
+def make_record(msg, args=(), level=logging.INFO, extra=None):
+    """Build a LogRecord with optional ``extra`` attributes."""
+    record = logging.LogRecord("root", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra or {})
+    return record
+
+
+def test_sampler_keeps_evenly_spaced_calculation_records():
+    """Only per-calculation INFO records are sampled; the first is always kept."""
+    sampler = CalculationSampler(0.25)
+    kept = [sampler.filter(make_record("calc", extra=CALCULATION)) for _ in range(8)]
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert sampler.filter(make_record("other"))
+    assert sampler.filter(make_record("calc", level=logging.ERROR, extra=CALCULATION))
+
+
+def test_queue_logging_batches_flushes_and_restores_handlers():
+    """Queued records reach the handler in order with one flush per batch."""
+    logger = logging.getLogger("test_log_pipeline")
+    logger.propagate = False
+    handler = CountingHandler()
+    logger.addHandler(handler)
+    listener = start_queue_logging(logger, batch_size=1000)
+    assert len(logger.handlers) == 1 and isinstance(logger.handlers[0], QueueHandler)
+    values = [1.0]
+    for i in range(500):
+        logger.warning("value %s", i)
+    logger.warning("list %s", values)
+    values.append(2.0)
+
+    stop_queue_logging(listener, logger)
+
+    assert logger.handlers == [handler]
+    assert handler.messages[:2] == ["value 0", "value 1"]
+    assert handler.messages[-1] == "list [1.0]"
+    assert len(handler.messages) == 501
+    assert handler.flushes < 501
+    logger.removeHandler(handler)
+
+
+def test_app_drains_log_queue_after_batch(make_app, monkeypatch, tmp_path):
+    """CALC_LOG_QUEUE starts a listener that run_batch stops on the way out."""
+    monkeypatch.setattr(logging.getLogger(), "filters", [])
+    monkeypatch.setenv("CALC_LOG_QUEUE", "1")
+    monkeypatch.setenv("CALC_LOG_SAMPLE_RATE", "0.5")
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+
+    app = make_app()
+    assert app.log_listener is not None
+    assert any(isinstance(f, CalculationSampler) for f in root.filters)
+    source = tmp_path / "commands.txt"
+    source.write_text("addition 1 2\n")
+    assert app.run_batch(str(source), io.StringIO()) == 0
+
+    assert app.log_listener is None
+    assert not any(isinstance(h, QueueHandler) for h in root.handlers)
+    assert set(root.handlers) == set(handlers)
@@ -0,0 +1,31 @@
+"""Tests for profiling mode and the profile command."""
+
+from app.commands import CommandHandler
+
+
+def test_profile_setting_reports_plugin_loading_and_commands(app_factory, tmp_path):
+    """With CALC_PROFILE each command line gets a hotspot and allocation report."""
+    app = app_factory(CALC_PROFILE="1")
+    app.command_handler.execute_command("addition 2 3")
+    app.profiler.stop()
+
+    reports = sorted(path.name for path in (tmp_path / "profiles").iterdir())
+    assert reports == ["00001-load_plugins.txt", "00002-addition_2_3.txt"]
+    report = (tmp_path / "profiles" / reports[1]).read_text()
+    assert "command: addition 2 3" in report
+    assert "functions by cumulative time" in report
+    assert "allocation sites" in report
+
+
+def test_profile_command_toggles_profiling(app_factory, capfd, tmp_path):
+    """'profile on' wraps execute_command and 'profile off' restores it."""
+    app = app_factory(CALC_PROFILE="false")
+    assert not app.profiler.active
+    app.command_handler.execute_command("profile on")
+    assert app.profiler.active
+    app.command_handler.execute_command("subtraction 5 1")
+    app.command_handler.execute_command("profile off")
+    assert app.command_handler.execute_command.__func__ is CommandHandler.execute_command
+    out, _ = capfd.readouterr()
+    assert "Profiling is on" in out and "Profiling is off" in out
+    assert len(list((tmp_path / "profiles").iterdir())) == 2
@@ -0,0 +1,127 @@
+"""Tests for the asyncio socket server."""
+
+import asyncio
+import threading
+from app.commands import Command
+from app.server import CalculatorServer, parse_address
+
+
+async def _request(reader, writer, line):
+    """Send one command line and return the reply lines before the '.' terminator."""
+    writer.write((line + "\n").encode())
+    await writer.drain()
+    lines = []
+    while (reply := (await reader.readline()).decode().rstrip("\n")) != ".":
+        lines.append(reply)
+    return lines
+
+
+def test_parse_address():
+    """Addresses are either unix:PATH or HOST:PORT."""
+    assert parse_address("unix:/tmp/calc.sock") == ("unix", "/tmp/calc.sock")
+    assert parse_address("127.0.0.1:9000") == ("tcp", ("127.0.0.1", 9000))
+    assert parse_address(":9000") == ("tcp", ("127.0.0.1", 9000))
+
+
+def test_server_handles_concurrent_clients(app, tmp_path):
+    """Clients are served concurrently, keep their own '_' and share one history writer."""
+    app.load_plugins()
+    socket_path = str(tmp_path / "calc.sock")
+
+    async def scenario():
+        server = CalculatorServer(app.command_handler, app.history, flush_interval=0.01)
+        await server.start(f"unix:{socket_path}")
+        first = await asyncio.open_unix_connection(socket_path)
+        second = await asyncio.open_unix_connection(socket_path)
+
+        assert await _request(*first, "addition 2 3") == ["Result: 5.0"]
+        assert await _request(*second, "multiplication 4 4") == ["Result: 16.0"]
+        assert await _request(*first, "multiplication _ 10") == ["Result: 50.0"]
+        assert await _request(*second, "subtraction") == [
+            "Missing arguments: give every operand inline, e.g. addition 3 4"]
+        replies = await asyncio.gather(_request(*first, "addition 1 1"), _request(*second, "addition 2 2"))
+        assert replies == [["Result: 2.0"], ["Result: 4.0"]]
+        await asyncio.sleep(0.05)
+        assert (tmp_path / "history.csv").exists()
+
+        for _, writer in (first, second):
+            writer.write(b"exit\n")
+            await writer.drain()
+        assert await first[0].read() == b""
+        await server.stop()
+
+    asyncio.run(scenario())
+    rows = [row.rsplit(",", 2)[0] for row in (tmp_path / "history.csv").read_text().splitlines()[1:]]
+    assert rows[:3] == ["addition,2.0,3.0,5.0", "multplication,4.0,4.0,16.0", "multplication,5.0,10.0,50.0"]
+    assert sorted(rows[3:]) == ["addition,1.0,1.0,2.0", "addition,2.0,2.0,4.0"]
+
+
+def test_server_clients_have_their_own_sessions(app, tmp_path):
+    """'last', '!N' and recent only see the calculations of the client that made them."""
+    app.load_plugins()
+    socket_path = str(tmp_path / "calc.sock")
+
+    async def scenario():
+        server = CalculatorServer(app.command_handler, app.history, flush_interval=0.01)
+        await server.start(f"unix:{socket_path}")
+        first = await asyncio.open_unix_connection(socket_path)
+        second = await asyncio.open_unix_connection(socket_path)
+
+        assert await _request(*first, "addition 100 1") == ["Result: 101.0"]
+        assert await _request(*second, "addition last 0") == ["No result last in this session."]
+        assert await _request(*second, "addition 1 2; multiplication !1 2") == ["Result: 3.0", "Result: 6.0"]
+        assert await _request(*first, "subtraction last 1") == ["Result: 100.0"]
+        recent = "\n".join(await _request(*second, "recent"))
+        assert "!2" in recent and "!3" not in recent and "101.0" not in recent
+        assert len(app.session) == 0
+
+        for _, writer in (first, second):
+            writer.close()
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+class _WaitCommand(Command):
+    """Blocks until ``released`` is set, like a slow calculation."""
+    def __init__(self, released):
+        self.released = released
+
+    def execute(self):
+        print("released" if self.released.wait(5) else "timed out")
+
+
+def test_server_slow_command_does_not_block_other_clients(app, tmp_path):
+    """Lines run off the event loop, and every history write, reads' flushes included, runs on the writer."""
+    app.load_plugins()
+    socket_path = str(tmp_path / "calc.sock")
+    released = threading.Event()
+    app.command_handler.register_command("wait", _WaitCommand(released))
+    flushed_on = set()
+    flush = app.history.flush
+
+    def recording_flush():
+        flushed_on.add(threading.current_thread().name)
+        return flush()
+    app.history.flush = recording_flush
+
+    async def scenario():
+        server = CalculatorServer(app.command_handler, app.history, flush_interval=10)
+        await server.start(f"unix:{socket_path}")
+        first = await asyncio.open_unix_connection(socket_path)
+        second = await asyncio.open_unix_connection(socket_path)
+
+        waiting = asyncio.ensure_future(_request(*first, "wait"))
+        assert await _request(*second, "addition 2 3") == ["Result: 5.0"]
+        assert await _request(*second, "showhistory") != []
+        assert not waiting.done()
+        released.set()
+        assert await waiting == ["released"]
+
+        for _, writer in (first, second):
+            writer.close()
+        await server.stop()
+
+    asyncio.run(scenario())
+    assert flushed_on and all(name.startswith("history-writer") for name in flushed_on)
+    assert "addition,2.0,3.0,5.0" in (tmp_path / "history.csv").read_text()
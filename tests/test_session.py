@@ -0,0 +1,43 @@
+"""Tests for the in-session calculation ring buffer."""
+
+import pytest
+from app.session import SessionHistory
+
+
+def test_ring_buffer_keeps_the_newest_entries():
+    """Once full, each new calculation replaces the oldest one."""
+    session = SessionHistory(capacity=3)
+    for i in range(5):
+        session.record("addition" if i % 2 else "division", float(i), 1.0, i + 1.0)
+    assert len(session) == 3
+    assert session.recent() == [(3, "division", 2.0, 1.0, 3.0), (2, "addition", 3.0, 1.0, 4.0),
+                                (1, "division", 4.0, 1.0, 5.0)]
+    assert session.recent(1) == [(1, "division", 4.0, 1.0, 5.0)]
+    assert session.operations == ["division", "addition"]
+
+
+def test_recall_tokens():
+    """'last' is the newest result and '!N' the Nth newest; anything else is a LookupError."""
+    session = SessionHistory(capacity=5)
+    with pytest.raises(LookupError, match="No result last in this session."):
+        session.recall("last")
+    session.record("addition", 1.0, 2.0, 3.0)
+    session.record("multplication", 3.0, 4.0, 12.0)
+    assert session.recall("last") == 12.0
+    assert session.recall("!1") == 12.0
+    assert session.recall("!2") == 3.0
+    for token in ("!3", "!0", "!x", "first"):
+        with pytest.raises(LookupError):
+            session.recall(token)
+
+
+def test_memory_is_preallocated():
+    """The columns are fixed-size arrays, so recording never grows them."""
+    session = SessionHistory(capacity=4)
+    sizes = [len(session.results), len(session.codes)]
+    for i in range(100):
+        session.record("addition", float(i), 1.0, i + 1.0)
+    assert [len(session.results), len(session.codes)] == sizes == [4, 4]
+    assert not hasattr(session, "__dict__")
+    with pytest.raises(ValueError):
+        SessionHistory(capacity=0)
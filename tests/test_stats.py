@@ -0,0 +1,49 @@
+"""Tests for command and history latency stats."""
+
+import json
+from app.commands import CommandHandler
+from app.stats import Histogram
+
+
+def test_histogram_percentiles():
+    """Percentiles land within one bucket (about 6%) of the exact value."""
+    histogram = Histogram()
+    for microseconds in range(1, 1001):
+        histogram.record(microseconds * 1000, failed=microseconds % 100 == 0)
+    summary = histogram.summary()
+    assert summary['calls'] == 1000 and summary['errors'] == 10
+    assert 0.5 * 0.94 <= summary['p50_ms'] <= 0.5
+    assert 0.99 * 0.94 <= summary['p99_ms'] <= 0.99
+    assert summary['max_ms'] == 1.0
+
+
+def test_stats_count_commands_errors_and_history_io(app_factory, capfd, tmp_path):
+    """Each step is counted per command, failures as errors, and history I/O separately."""
+    app = app_factory(CALC_STATS="1")
+    app.command_handler.execute_command("addition 1 2; division 1 0")
+    app.command_handler.execute_command("showhistory 1")
+    app.command_handler.execute_command("nope")
+    app.command_handler.execute_command("stats")
+    out, _ = capfd.readouterr()
+    assert "p99_ms" in out
+
+    app.close()
+    stats = json.loads((tmp_path / "stats.json").read_text())
+    assert stats['commands']['addition']['calls'] == 1
+    assert stats['commands']['division']['errors'] == 1
+    assert stats['commands']['nope']['errors'] == 1
+    assert stats['history']['tail']['calls'] == 1
+    assert stats['history']['flush']['calls'] >= 1
+
+
+def test_stats_disabled_leaves_handler_untouched(app_factory, capfd, tmp_path):
+    """Without CALC_STATS nothing is wrapped, recorded or written."""
+    app = app_factory(CALC_STATS="")
+    assert app.stats is None
+    assert app.command_handler.execute_step.__func__ is CommandHandler.execute_step
+    assert 'flush' not in vars(app.history)
+    app.command_handler.execute_command("stats")
+    out, _ = capfd.readouterr()
+    assert "Stats are disabled" in out
+    app.close()
+    assert not (tmp_path / "stats.json").exists()